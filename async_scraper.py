@@ -0,0 +1,359 @@
+"""
+知识星球内容爬取 - asyncio 引擎
+翻页、下载链接解析与媒体下载均以协程方式运行在同一个事件循环中，
+回调约定（on_log / on_progress / on_finished）与 Scraper 完全一致
+"""
+import asyncio
+import hashlib
+import json
+import time
+
+try:
+    import aiohttp
+except ImportError:  # aiohttp 为可选依赖，仅 async 引擎需要
+    aiohttp = None
+
+from rate_limit import RETRY_STATUS, RequestFailed
+from scraper import Scraper, ScraperConfig
+
+
+class AsyncScraper(Scraper):
+    """基于 asyncio + aiohttp 的知识星球爬取器"""
+
+    def __init__(self, config: ScraperConfig, **kwargs):
+        if aiohttp is None:
+            raise RuntimeError('async 引擎需要安装 aiohttp: pip install aiohttp')
+        super().__init__(config, **kwargs)
+        self._aio_session = None
+        self._semaphore = None
+
+    # ---- API 请求 ----
+
+    async def _retry(self, endpoint, attempt, reason, retry_after=None, cancel=None):
+        """与 RequestScheduler 相同的退避策略，等待期间不阻塞事件循环
+
+        cancel 为可选的 threading.Event，被设置后（包括退避等待期间）不再重试，抛出 RequestFailed
+        """
+        scheduler = self.scheduler
+        if attempt == scheduler.max_attempts:
+            raise RequestFailed('{}，已重试 {} 次'.format(reason, scheduler.max_attempts))
+        if cancel is not None and cancel.is_set():
+            raise RequestFailed('已停止')
+        delay = scheduler.backoff_delay(attempt, retry_after)
+        scheduler.log_retry(endpoint, attempt, reason, delay)
+        if cancel is None:
+            await asyncio.sleep(delay)
+            return
+        deadline = time.monotonic() + delay
+        while time.monotonic() < deadline:
+            if cancel.is_set():
+                raise RequestFailed('已停止')
+            await asyncio.sleep(min(0.2, deadline - time.monotonic()))
+
+    async def _get_json(self, endpoint, url, params=None, timeout=30, cancel=None):
+        for attempt in range(1, self.scheduler.max_attempts + 1):
+            await asyncio.sleep(self.scheduler.throttle_delay(endpoint))
+            if cancel is not None and cancel.is_set():
+                raise RequestFailed('已停止')
+            retry_after = None
+            try:
+                async with self._semaphore:
+                    start = time.monotonic()
+                    async with self._aio_session.get(url, params=params, allow_redirects=False,
+                                                     timeout=aiohttp.ClientTimeout(total=timeout)) as r:
+                        self.scheduler.record_response(endpoint, r.status, time.monotonic() - start)
+                        self.events.debug('请求: {url} [状态码:{status}]', url=r.url, status=r.status)
+                        status = r.status
+                        retry_after = self.scheduler.retry_after(r)
+                        text = await r.text()
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                self.scheduler.record_error(endpoint)
+                reason = str(e) or type(e).__name__
+            else:
+                if status in RETRY_STATUS:
+                    reason = 'HTTP {}'.format(status)
+                else:
+                    try:
+                        with self.scheduler.stage_seconds.time(stage='json'):
+                            d = json.loads(text)
+                    except ValueError as e:
+                        reason = '解析JSON失败: {}, 响应内容: {}'.format(e, text[:500])
+                    else:
+                        if d.get('succeeded'):
+                            return d
+                        reason = '接口返回失败: {}'.format(d)
+            await self._retry(endpoint, attempt, reason, retry_after, cancel)
+
+    async def _download_once(self, url, part_path, timeout, offset, digest, kind, expected_size=None):
+        """下载到 .part，offset 大于 0 时用 Range 续传，写入的分块同时更新 digest
+
+        返回 (.part 的总字节数, digest)；服务器返回 416 且无法确认 .part 已完整时丢弃 .part 并返回 None
+        """
+        headers = {'Range': 'bytes={}-'.format(offset)} if offset else {}
+        async with self._semaphore:
+            start = time.monotonic()
+            try:
+                response = await self._aio_session.get(
+                    url, headers=headers, timeout=aiohttp.ClientTimeout(sock_connect=30, sock_read=timeout))
+            except (aiohttp.ClientError, asyncio.TimeoutError):
+                self.scheduler.record_error('cdn')
+                raise
+            self.scheduler.record_response('cdn', response.status, time.monotonic() - start)
+            async with response:
+                if offset and response.status == 416:
+                    if self.range_complete(response.headers.get('Content-Range'), offset, expected_size):
+                        return offset, digest
+                    self.log('⚠️ 断点文件与服务器上的文件不符（HTTP 416），重新下载: {}'.format(part_path))
+                    self.discard_part(part_path)
+                    return None
+                response.raise_for_status()
+                if offset and response.status != 206:
+                    self.log('⚠️ 服务器不支持断点续传，重新下载: {}'.format(part_path))
+                    offset, digest = 0, hashlib.sha256()
+                size = offset
+                disk_seconds = 0.0
+                try:
+                    with open(part_path, 'ab' if offset else 'wb') as file:
+                        async for chunk in response.content.iter_chunked(self.config.chunk_size):
+                            write_start = time.monotonic()
+                            file.write(chunk)
+                            disk_seconds += time.monotonic() - write_start
+                            self._downloaded_bytes.inc(len(chunk), kind=kind)
+                            digest.update(chunk)
+                            size += len(chunk)
+                finally:
+                    self._disk_seconds.inc(disk_seconds, kind=kind)
+        return size, digest
+
+    async def _resume_state(self, part_path, expected_size):
+        """续传的起点：(.part 字节数, 以 .part 内容初始化的 sha256)；读取 .part 放到线程中，不阻塞事件循环"""
+        size = self.part_offset(part_path, expected_size)
+        if not size:
+            return 0, hashlib.sha256()
+        return size, await asyncio.to_thread(self.part_digest, part_path)
+
+    async def _download(self, url, filepath, timeout, resume=False, expected_size=None, kind='files'):
+        """下载并原子重命名，返回 (字节数, sha256)；resume 时保留 .part 并按 Range 续传"""
+        part_path = self.part_path(filepath)
+        size, digest = await self._resume_state(part_path, expected_size) if resume else (0, hashlib.sha256())
+        started = time.monotonic()
+        try:
+            for attempt in range(1, self.scheduler.max_attempts + 1):
+                await asyncio.sleep(self.scheduler.throttle_delay('cdn'))
+                try:
+                    result = await self._download_once(url, part_path, timeout, size, digest, kind, expected_size)
+                    if result is not None:
+                        size, digest = result
+                        break
+                    size, digest = 0, hashlib.sha256()
+                    continue
+                except aiohttp.ClientResponseError as e:
+                    if e.status not in RETRY_STATUS:
+                        raise
+                    reason = 'HTTP {}'.format(e.status)
+                except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                    reason = str(e) or type(e).__name__
+                size, digest = await self._resume_state(part_path, expected_size) if resume else (0, hashlib.sha256())
+                await self._retry('cdn', attempt, reason)
+            self.finish_part(part_path, filepath, size, expected_size)
+        except BaseException:
+            if not resume:
+                self.discard_part(part_path)
+            raise
+        self._download_seconds.observe(time.monotonic() - started, kind=kind)
+        return size, digest.hexdigest()
+
+    async def _paginate(self, end_time, start_time=None):
+        params = {
+            'scope': 'all',
+            'count': '30',
+        }
+        while not self.is_draining:
+            if end_time is not None:
+                params['end_time'] = end_time
+            try:
+                with self._stage_seconds.time(stage='fetch'):
+                    d = await self._get_json('topics', self.base_url, params=params, cancel=self._drain_event)
+            except RequestFailed as e:
+                # 停止翻页打断的重试不算分片失败，游标留在断点中
+                if not self.is_draining:
+                    self._window_failed(start_time, e)
+                break
+
+            end_time, media = self.process_topics_page(d['resp_data']['topics'], start_time)
+            # 媒体队列已满时在此等待，翻页速度受下载速度约束
+            for q, info in media:
+                await q.put(info)
+            if end_time is None:
+                break
+
+    async def fetch_images_async(self, img_info):
+        filepath = self.image_path(img_info)
+        if self.media_manifest.is_done('images', img_info['image_id'], filepath):
+            self._skipped_media += 1
+            self.checkpoint.media_done('images', img_info['image_id'], self._counts())
+            return
+        if 'original' in img_info:
+            try:
+                size, sha256 = await self._download(img_info['original']['url'], filepath, timeout=60,
+                                                    kind='images')
+                self.media_manifest.record('images', img_info['image_id'], filepath, size, sha256)
+                self.events.debug('图片已保存: {path} ({size} bytes)', path=filepath, size=size)
+            except Exception as e:
+                self.events.error('❌ 图片下载失败 [image_id={image_id}]: {error}',
+                                  image_id=img_info['image_id'], error=e, exc_info=True)
+                self._media_failed('images')
+                return
+
+        self._image_count += 1
+        self._items.inc(kind='images')
+        self.checkpoint.media_done('images', img_info['image_id'], self._counts())
+        self.on_progress('images', self._image_count)
+        if self.events.enabled('debug'):
+            self.events.debug('剩余图片: {remaining}', remaining=self.image_q.qsize())
+
+    async def _resolve_download_url(self, file_info, refresh=False):
+        """协程版 resolve_download_url，与线程引擎共用签名链接缓存"""
+        file_id = file_info['file_id']
+        if refresh:
+            self.url_cache.invalidate(file_id)
+        else:
+            url = self.url_cache.get(file_id)
+            if url is not None:
+                return url
+
+        self.events.debug('获取文件下载链接: file_id={file_id}, name={name}', file_id=file_id,
+                          name=file_info.get('name', ''))
+        try:
+            d = await self._get_json('download_url', self.file_download_url_api(file_info), timeout=30)
+        except RequestFailed as e:
+            self.log('❌ 获取文件下载链接失败: {}'.format(e))
+            return None
+        url = d['resp_data']['download_url']
+        self.url_cache.put(file_id, url)
+        return url
+
+    async def fetch_files_async(self, file_info):
+        if self._file_done(file_info):
+            return
+
+        url = await self._resolve_download_url(file_info)
+        if url is None:
+            self._media_failed('files')
+            return
+
+        filepath = self.file_path(file_info)
+        try:
+            try:
+                size, sha256 = await self._download(url, filepath, timeout=120,
+                                                    resume=True, expected_size=file_info.get('size'))
+            except aiohttp.ClientResponseError as e:
+                # 签名过期时 CDN 返回 403/410，重新获取链接后再试一次
+                if e.status not in (403, 410):
+                    raise
+                self.log('⚠️ 下载链接已失效（HTTP {}），重新获取: file_id={}'.format(e.status, file_info['file_id']))
+                url = await self._resolve_download_url(file_info, refresh=True)
+                if url is None:
+                    raise
+                size, sha256 = await self._download(url, filepath, timeout=120,
+                                                    resume=True, expected_size=file_info.get('size'))
+            self.media_manifest.record('files', file_info['file_id'], filepath, size, sha256)
+            self.events.debug('文件已保存: {path} ({size} bytes)', path=filepath, size=size)
+        except Exception as e:
+            self.events.error('❌ 文件下载失败 [{path}]: {error}', path=filepath, error=e, exc_info=True)
+            self.url_cache.invalidate(file_info['file_id'])
+            self._media_failed('files')
+            return
+        self.url_cache.invalidate(file_info['file_id'])
+
+        self._file_count += 1
+        self._items.inc(kind='files')
+        self.checkpoint.media_done('files', file_info['file_id'], self._counts())
+        self.on_progress('files', self._file_count)
+        if self.events.enabled('debug'):
+            self.events.debug('剩余文件: {remaining}', remaining=self.file_q.qsize())
+
+    # ---- 协程工作者 ----
+
+    async def _media_worker(self, q, handler, name):
+        while True:
+            job = await q.get()
+            try:
+                await handler(job)
+            except Exception as e:
+                self.events.error('❌ {stage}协程异常: {error}', stage=name, error=e, exc_info=True)
+            q.task_done()
+
+    async def _wait_stopped(self):
+        while not self.is_stopped:
+            self._report_queue_depths()
+            await asyncio.sleep(0.2)
+
+    def stage_queues(self):
+        # 解析、渲染与写入在翻页协程中依次完成，只有媒体队列
+        queues = []
+        if self.config.enable_images:
+            queues.append(('images', self.image_q))
+        if self.config.enable_files:
+            queues.append(('files', self.file_q))
+        return queues
+
+    async def _feed_resume_media(self):
+        for q, info in self._resume_media:
+            await q.put(info)
+
+    async def _crawl(self, windows):
+        await asyncio.gather(self._feed_resume_media(),
+                             *[self._paginate(window_end, window_start)
+                               for window_end, window_start in windows])
+        await self.image_q.join()
+        await self.file_q.join()
+
+    async def _run_async(self):
+        concurrency = max(1, self.config.concurrency)
+        self._semaphore = asyncio.Semaphore(concurrency)
+        self.image_q = asyncio.Queue(maxsize=max(1, self.config.media_queue_size))
+        self.file_q = asyncio.Queue(maxsize=max(1, self.config.media_queue_size))
+
+        connector = aiohttp.TCPConnector(limit=concurrency)
+        async with aiohttp.ClientSession(headers=self.headers, connector=connector) as session:
+            self._aio_session = session
+
+            workers = []
+            if self.config.enable_images:
+                for _ in range(concurrency):
+                    workers.append(asyncio.ensure_future(
+                        self._media_worker(self.image_q, self.fetch_images_async, '图片')))
+            if self.config.enable_files:
+                for _ in range(concurrency):
+                    workers.append(asyncio.ensure_future(
+                        self._media_worker(self.file_q, self.fetch_files_async, '文件')))
+
+            crawl = asyncio.ensure_future(self._crawl(self._prepare_windows()))
+            watcher = asyncio.ensure_future(self._wait_stopped())
+            await asyncio.wait([crawl, watcher], return_when=asyncio.FIRST_COMPLETED)
+
+            for task in workers + [crawl, watcher]:
+                task.cancel()
+            await asyncio.gather(*workers, crawl, watcher, return_exceptions=True)
+            if crawl.done() and not crawl.cancelled() and crawl.exception() is not None:
+                raise crawl.exception()
+
+    # ---- 主入口 ----
+
+    def _run(self):
+        """运行爬取任务（内部启动独立事件循环）"""
+        try:
+            self._log_start()
+            self._open_stores()
+            self.log('引擎: async, 并发请求数: {}'.format(max(1, self.config.concurrency)))
+            asyncio.run(self._run_async())
+            self._report_queue_depths()
+            self._report_finished()
+        except Exception as e:
+            self.events.error('❌ 爬取出错: {error}', error=e, exc_info=True)
+            self._save_checkpoint_quietly()
+            self.on_finished(False, str(e))
+        finally:
+            self._close_stores()
+            self.session.close()
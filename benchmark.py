@@ -0,0 +1,210 @@
+"""
+吞吐基准测试
+启动本地 mock_server，对多组 ScraperConfig 分别运行 Scraper.run，报告 topics/s、MB/s 与峰值内存。
+每组配置在独立的子进程中运行，峰值内存互不影响；不访问网络，可在 CI 中比较性能变化：
+
+    python benchmark.py --topics 2000 --output result.json
+    python benchmark.py --baseline result.json --tolerance 0.2   # 低于基线 20% 时退出码为 1
+"""
+import argparse
+import dataclasses
+import json
+import multiprocessing
+import queue
+import shutil
+import sys
+import tempfile
+import time
+
+try:
+    import resource
+except ImportError:  # Windows 没有 resource 模块，不统计峰值内存
+    resource = None
+
+from mock_server import MockServer, add_mock_arguments, mock_config_from_args
+from scraper import ScraperConfig, create_scraper
+
+# 默认对比的配置：(名称, 覆盖的 ScraperConfig 字段)
+CONFIGS = [
+    ('thread', {}),
+    ('thread-shards4', {'shards': 4}),
+    ('thread-adaptive', {'adaptive_concurrency': True}),
+    ('thread-archive-sqlite', {'archive_raw': True, 'enable_sqlite': True}),
+    ('async', {'engine': 'async'}),
+]
+
+# 与基线比较的指标（越大越好）
+COMPARED = ('topics_per_sec', 'mb_per_sec')
+
+
+def peak_rss_mb():
+    """当前进程的峰值常驻内存（MB），无法获取时返回 None"""
+    if resource is None:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux 单位为 KB，macOS 为字节
+    return rss / (1024 * 1024) if sys.platform == 'darwin' else rss / 1024
+
+
+def run_once(config, results):
+    """子进程入口：运行一次爬取并把结果放入 results 队列"""
+    finished = {}
+    logs = []
+    scraper = create_scraper(config, on_log=logs.append,
+                             on_finished=lambda success, msg: finished.update(success=success, msg=msg))
+    started = time.monotonic()
+    scraper.run()
+    elapsed = time.monotonic() - started
+
+    metrics = scraper.metrics
+    downloaded = metrics.counter('zsxq_downloaded_bytes_total').total()
+    items = metrics.counter('zsxq_items_total')
+    errors = [line for line in logs if line.startswith('❌')]
+    results.put({
+        'success': finished.get('success', False),
+        'message': finished.get('msg', ''),
+        'seconds': round(elapsed, 3),
+        'topics': items.value(kind='topics'),
+        'images': items.value(kind='images'),
+        'files': items.value(kind='files'),
+        'topics_per_sec': round(items.value(kind='topics') / elapsed, 2) if elapsed > 0 else 0,
+        'mb_per_sec': round(downloaded / 1024 / 1024 / elapsed, 2) if elapsed > 0 else 0,
+        'retries': metrics.counter('zsxq_retries_total').total(),
+        'peak_rss_mb': round(peak_rss_mb(), 1) if resource is not None else None,
+        'errors': errors[:5],
+    })
+
+
+def run_config(name, config, context):
+    """在子进程中运行一组配置；子进程异常退出时返回失败结果"""
+    process_results = context.Queue()
+    process = context.Process(target=run_once, args=(config, process_results), name='benchmark-' + name)
+    process.start()
+    try:
+        while True:
+            try:
+                return process_results.get(timeout=1)
+            except queue.Empty:
+                if not process.is_alive():
+                    return {'success': False, 'message': '子进程异常退出（退出码 {}）'.format(process.exitcode),
+                            'seconds': 0, 'topics': 0, 'images': 0, 'files': 0, 'topics_per_sec': 0,
+                            'mb_per_sec': 0, 'retries': 0, 'peak_rss_mb': None, 'errors': []}
+    finally:
+        process.join()
+
+
+def parse_overrides(items):
+    """把 --set key=value 解析为 ScraperConfig 字段，按字段的默认值类型转换"""
+    fields = {f.name: f for f in dataclasses.fields(ScraperConfig)}
+    overrides = {}
+    for item in items:
+        key, _, value = item.partition('=')
+        if key not in fields:
+            raise ValueError('ScraperConfig 没有字段: {}'.format(key))
+        default = fields[key].default
+        if isinstance(default, bool):
+            overrides[key] = value.lower() in ('1', 'true', 'yes', 'on')
+        elif isinstance(default, (int, float)):
+            overrides[key] = type(default)(value)
+        else:
+            overrides[key] = value
+    return overrides
+
+
+def compare(results, baseline, tolerance):
+    """返回比基线慢超过 tolerance 的 [(配置名, 指标, 当前值, 基线值)]"""
+    regressions = []
+    for name, result in results.items():
+        base = baseline.get(name)
+        if not base or not result['success']:
+            continue
+        for key in COMPARED:
+            if base.get(key) and result[key] < base[key] * (1 - tolerance):
+                regressions.append((name, key, result[key], base[key]))
+    return regressions
+
+
+def print_table(results):
+    header = '{:<24}{:>8}{:>8}{:>8}{:>10}{:>12}{:>10}{:>10}{:>8}'.format(
+        '配置', 'topics', '图片', '文件', '秒', 'topics/s', 'MB/s', 'RSS MB', '重试')
+    print(header)
+    for name, r in results.items():
+        print('{:<24}{:>8}{:>8}{:>8}{:>10.2f}{:>12.1f}{:>10.1f}{:>10}{:>8}'.format(
+            name, r['topics'], r['images'], r['files'], r['seconds'], r['topics_per_sec'], r['mb_per_sec'],
+            '-' if r['peak_rss_mb'] is None else r['peak_rss_mb'], r['retries']))
+        if not r['success']:
+            print('    ❌ {}'.format(r['message']))
+            for line in r['errors']:
+                print('    {}'.format(line))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='基于本地 mock API 的爬取吞吐基准测试')
+    add_mock_arguments(parser)
+    parser.add_argument('--only', type=str, default='',
+                        help='只运行指定配置（逗号分隔）：' + ', '.join(name for name, _ in CONFIGS))
+    parser.add_argument('--set', action='append', default=[], metavar='KEY=VALUE',
+                        help='覆盖所有配置的 ScraperConfig 字段，可重复，如 --set image_workers=4')
+    parser.add_argument('--repeat', type=int, default=1, help='每组配置运行次数，取 topics/s 最高的一次')
+    parser.add_argument('--output', type=str, default='', help='把结果写入 JSON 文件')
+    parser.add_argument('--baseline', type=str, default='', help='与之前 --output 的结果比较')
+    parser.add_argument('--tolerance', type=float, default=0.2, help='允许低于基线的比例，超出时退出码为 1')
+    args = parser.parse_args()
+
+    mock_config = mock_config_from_args(args)
+    overrides = parse_overrides(args.set)
+    only = set(filter(None, args.only.split(',')))
+    configs = [(name, values) for name, values in CONFIGS if not only or name in only]
+    if not configs:
+        parser.error('没有匹配的配置: {}'.format(args.only))
+
+    server = MockServer(mock_config)
+    api_base = server.start()
+    start_time, end_time = server.data.time_range()
+    print('mock API: {}，{} 条 topics，每条 {} 张图片 / {} 个文件'.format(
+        api_base, mock_config.topics, mock_config.images_per_topic, mock_config.files_per_topic))
+
+    # spawn 启动的子进程不继承父进程内存，峰值内存只反映爬取本身
+    context = multiprocessing.get_context('spawn')
+    results = {}
+    try:
+        for name, values in configs:
+            best = None
+            for _ in range(max(1, args.repeat)):
+                output_dir = tempfile.mkdtemp(prefix='zsxq-bench-')
+                try:
+                    fields = dict(group='1', start_time=start_time, end_time=end_time,
+                                  enable_images=mock_config.images_per_topic > 0,
+                                  enable_files=mock_config.files_per_topic > 0,
+                                  output_dir=output_dir, api_base=api_base)
+                    fields.update(values)
+                    fields.update(overrides)
+                    result = run_config(name, ScraperConfig(**fields), context)
+                finally:
+                    shutil.rmtree(output_dir, ignore_errors=True)
+                if best is None or result['topics_per_sec'] > best['topics_per_sec']:
+                    best = result
+            results[name] = best
+    finally:
+        server.stop()
+
+    print_table(results)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+        print('结果已保存: {}'.format(args.output))
+
+    failed = [name for name, r in results.items() if not r['success']]
+    if args.baseline:
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.tolerance)
+        for name, key, value, base in regressions:
+            print('⚠️ {} 的 {} 为 {}，低于基线 {}（容差 {:.0%}）'.format(name, key, value, base, args.tolerance))
+        if regressions:
+            return 1
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
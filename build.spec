@@ -15,7 +15,10 @@ a = Analysis(
     pathex=[],
     binaries=[],
     datas=[('xq_icon.png', '.')],
-    hiddenimports=['scraper'],
+    hiddenimports=['scraper', 'async_scraper', 'checkpoint', 'topic_index', 'markdown_writer', 'media_manifest',
+                   'concurrency', 'rate_limit', 'url_cache', 'raw_archive', 'renderer',
+                   'sqlite_store', 'workers', 'metrics', 'profiler', 'log_buffer', 'progress', 'events',
+                   'multi_group', 'watch', 'watermark'],
     hookspath=[],
     hooksconfig={},
     runtime_hooks=[],
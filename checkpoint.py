@@ -0,0 +1,121 @@
+"""
+爬取断点记录
+在 output_dir 中持久化翻页游标与未完成的媒体任务，用于崩溃或停止后继续爬取
+"""
+import json
+import os
+import threading
+import time
+
+
+class Checkpoint:
+    """线程安全的断点文件，以原子替换的方式写入 JSON"""
+
+    FILENAME = '.checkpoint.json'
+    # 没有翻页进展时（如只剩媒体下载），最多间隔多少秒写一次断点
+    SAVE_INTERVAL = 2.0
+
+    def __init__(self, output_dir):
+        self.path = os.path.join(output_dir, self.FILENAME)
+        self._lock = threading.Lock()
+        self._last_save = 0.0
+        self.state = self._empty_state()
+
+    @staticmethod
+    def _empty_state():
+        return {
+            'group': '',
+            'start_time': '',
+            'end_time': '',
+            # 各分片窗口的下一页 end_time，键为窗口下界（无下界时为空字符串）
+            'cursors': {},
+            'pages': 0,
+            'counts': {'topics': 0, 'images': 0, 'files': 0},
+            # 已投递但尚未完成的媒体任务，键为 image_id / file_id
+            'images': {},
+            'files': {},
+        }
+
+    def exists(self):
+        return os.path.exists(self.path)
+
+    def load(self):
+        """读取断点文件，失败时返回 False"""
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                state = json.load(f)
+        except (OSError, ValueError):
+            return False
+        with self._lock:
+            self.state = self._empty_state()
+            self.state.update(state)
+        return True
+
+    def reset(self, config, windows):
+        """以新的爬取任务初始化断点"""
+        with self._lock:
+            self.state = self._empty_state()
+            self.state['group'] = config.group
+            self.state['start_time'] = config.start_time
+            self.state['end_time'] = config.end_time
+            for window_end, window_start in windows:
+                self.state['cursors'][window_start or ''] = window_end
+        self.save()
+
+    def windows(self):
+        """返回断点中尚未完成的 (end_time, start_time) 分片列表"""
+        with self._lock:
+            return [(end_time, start_time or None)
+                    for start_time, end_time in sorted(self.state['cursors'].items(), reverse=True)]
+
+    def is_complete(self):
+        """所有分片已翻页完毕且没有未完成的媒体任务"""
+        with self._lock:
+            return not self.state['cursors'] and not self.state['images'] and not self.state['files']
+
+    def pending_count(self):
+        """尚未完成的图片与文件总数"""
+        with self._lock:
+            return len(self.state['images']) + len(self.state['files'])
+
+    def pending_media(self, kind):
+        with self._lock:
+            return list(self.state[kind].values())
+
+    def page_done(self, start_time, next_end_time, counts):
+        """记录一页已处理完成；next_end_time 为 None 表示该分片已翻页完毕"""
+        with self._lock:
+            key = start_time or ''
+            if next_end_time is None:
+                self.state['cursors'].pop(key, None)
+            else:
+                self.state['cursors'][key] = next_end_time
+            self.state['pages'] += 1
+            self.state['counts'] = counts
+        self.save()
+
+    def add_media(self, kind, media_id, info):
+        with self._lock:
+            self.state[kind][str(media_id)] = info
+
+    def media_done(self, kind, media_id, counts):
+        with self._lock:
+            self.state[kind].pop(str(media_id), None)
+            self.state['counts'] = counts
+        if time.monotonic() - self._last_save >= self.SAVE_INTERVAL:
+            self.save()
+
+    def save(self):
+        with self._lock:
+            data = json.dumps(self.state, ensure_ascii=False)
+            tmp_path = self.path + '.tmp'
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                f.write(data)
+            os.replace(tmp_path, self.path)
+            self._last_save = time.monotonic()
+
+    def remove(self):
+        """任务全部完成后删除断点文件"""
+        with self._lock:
+            if os.path.exists(self.path):
+                os.remove(self.path)
@@ -0,0 +1,106 @@
+"""
+媒体下载并发控制
+固定模式下并发数即工作线程数；自适应模式按 AIMD 调整：
+延迟与错误率正常时逐步加一，遇到 429/5xx 时减半
+"""
+import threading
+from collections import deque
+
+# 视为服务端限流/过载、需要退避的状态码
+THROTTLE_STATUS = (429, 500, 502, 503, 504)
+
+
+class _Slot:
+    """一次下载占用的并发名额，退出时把结果反馈给限流器"""
+
+    def __init__(self, limiter):
+        self.limiter = limiter
+        self.status = None
+        self.latency = None
+
+    def observe(self, status, latency):
+        """记录响应状态码与首字节延迟；重试过程中出现过的限流状态码会被保留"""
+        if self.status not in THROTTLE_STATUS:
+            self.status = status
+        self.latency = latency
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.limiter.release(self.status, self.latency, exc_type is None)
+        return False
+
+
+class AdaptiveLimiter:
+    """线程安全的可变并发上限"""
+
+    # 延迟超过平滑基线的倍数即视为不健康
+    LATENCY_FACTOR = 2.0
+    # 错误率统计窗口与阈值
+    ERROR_WINDOW = 20
+    ERROR_RATE = 0.2
+
+    def __init__(self, name, initial, maximum, adaptive=False, on_change=None):
+        self.name = name
+        self.adaptive = adaptive
+        self.minimum = 1
+        self.maximum = max(initial, maximum) if adaptive else initial
+        self.limit = max(self.minimum, initial)
+        self.on_change = on_change or (lambda name, limit, reason: None)
+        self._cond = threading.Condition()
+        self._in_flight = 0
+        self._healthy = 0
+        self._ewma = None
+        self._recent = deque(maxlen=self.ERROR_WINDOW)
+
+    def slot(self, stop_event=None):
+        """阻塞直到有空闲名额；stop_event 被设置时立即返回"""
+        with self._cond:
+            while self._in_flight >= self.limit:
+                if stop_event is not None and stop_event.is_set():
+                    break
+                self._cond.wait(0.5)
+            self._in_flight += 1
+        return _Slot(self)
+
+    def release(self, status, latency, ok):
+        with self._cond:
+            self._in_flight -= 1
+            if self.adaptive:
+                self._adjust(status, latency, ok)
+            self._cond.notify_all()
+
+    def _set_limit(self, limit, reason):
+        limit = max(self.minimum, min(self.maximum, limit))
+        if limit != self.limit:
+            self.limit = limit
+            self.on_change(self.name, limit, reason)
+
+    def _adjust(self, status, latency, ok):
+        if status in THROTTLE_STATUS:
+            self._recent.append(False)
+            self._healthy = 0
+            self._set_limit(self.limit // 2, 'HTTP {}'.format(status))
+            return
+
+        self._recent.append(ok)
+        errors = self._recent.count(False)
+        if len(self._recent) >= self.ERROR_WINDOW // 2 and errors > self.ERROR_RATE * len(self._recent):
+            self._healthy = 0
+            self._recent.clear()
+            self._set_limit(self.limit - 1, '错误率过高')
+            return
+        if not ok or latency is None:
+            return
+
+        healthy = self._ewma is None or latency <= self.LATENCY_FACTOR * self._ewma
+        self._ewma = latency if self._ewma is None else 0.8 * self._ewma + 0.2 * latency
+        if not healthy:
+            self._healthy = 0
+            return
+        # 每连续成功一"轮"（等于当前并发数）就加一
+        self._healthy += 1
+        if self._healthy >= self.limit:
+            self._healthy = 0
+            self._set_limit(self.limit + 1, '延迟与错误率正常')
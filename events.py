@@ -0,0 +1,247 @@
+"""
+结构化日志事件
+工作线程只把 (级别, 模板, 参数, 字段) 放入队列，格式化与输出（GUI、终端、文件）由后台线程完成，
+低于阈值的级别在调用处直接丢弃，不做任何格式化；输出跟不上时丢弃 debug / info 事件而不阻塞爬取
+"""
+import json
+import logging
+import queue
+import sys
+import threading
+import time
+import traceback
+
+# 日志级别，数值越大越重要
+LEVELS = {'debug': 10, 'info': 20, 'warn': 30, 'error': 40}
+# 对应的 logging 级别
+LOGGING_LEVELS = {'debug': logging.DEBUG, 'info': logging.INFO, 'warn': logging.WARNING, 'error': logging.ERROR}
+
+_CLOSE = object()
+
+
+def infer_level(msg):
+    """未指定级别时按消息前缀推断"""
+    if msg.startswith('❌'):
+        return 'error'
+    if msg.startswith('⚠️'):
+        return 'warn'
+    return 'info'
+
+
+class LogEvent:
+    """一条日志事件；message 与 traceback 在首次访问时才格式化"""
+
+    __slots__ = ('created', 'level', 'template', 'args', 'fields', 'exc_info', 'prefix', 'context', '_message')
+
+    def __init__(self, created, level, template, args, fields, exc_info=None, prefix='', context=None):
+        self.created = created
+        self.level = level
+        self.template = template
+        self.args = args
+        self.fields = fields
+        self.exc_info = exc_info
+        self.prefix = prefix  # 子日志器（bind）加在消息前的前缀，不参与格式化
+        self.context = context or {}  # 子日志器附加的字段
+        self._message = None
+
+    @property
+    def message(self):
+        if self._message is None:
+            if self.args or self.fields:
+                try:
+                    self._message = self.template.format(*self.args, **self.fields)
+                except (IndexError, KeyError, ValueError):
+                    self._message = '{} {} {}'.format(self.template, self.args, self.fields)
+            else:
+                self._message = self.template
+            self._message = self.prefix + self._message
+        return self._message
+
+    @property
+    def traceback(self):
+        if not self.exc_info:
+            return ''
+        return ''.join(traceback.format_exception(*self.exc_info))
+
+    def text(self, with_traceback=False):
+        """纯文本形式；with_traceback 时在消息后附上异常堆栈"""
+        if with_traceback and self.exc_info:
+            return self.message + '\n' + self.traceback.rstrip('\n')
+        return self.message
+
+    def to_dict(self):
+        data = {
+            'ts': time.strftime('%Y-%m-%dT%H:%M:%S', time.localtime(self.created)) +
+                  '.{:03d}'.format(int(self.created * 1000) % 1000),
+            'level': self.level,
+            'msg': self.message,
+        }
+        for key, value in list(self.context.items()) + list(self.fields.items()):
+            data.setdefault(key, value if isinstance(value, (int, float, bool, type(None))) else str(value))
+        if self.exc_info:
+            data['traceback'] = self.traceback
+        return data
+
+    def to_json(self):
+        return json.dumps(self.to_dict(), ensure_ascii=False)
+
+
+class EventLogger:
+    """带级别过滤、惰性格式化与后台输出线程的日志器
+
+    sink(event) 在后台线程中依次调用；close() 之后的事件改为在调用线程中同步输出
+    """
+
+    def __init__(self, sink, level='info', queue_size=10000):
+        self.sink = sink
+        self.threshold = LEVELS.get(level, LEVELS['info'])
+        self._queue = queue.Queue(maxsize=max(1, queue_size))
+        self._lock = threading.Lock()
+        self._thread = None
+        self._closed = False
+        self._dropped = 0
+
+    def enabled(self, level):
+        return LEVELS[level] >= self.threshold
+
+    def log(self, level, template, *args, exc_info=False, **fields):
+        """记录一条事件；level 为 None 时按消息前缀推断，exc_info 为 True 时附带当前异常"""
+        self._emit(level, template, args, fields, exc_info)
+
+    def _emit(self, level, template, args, fields, exc_info, prefix='', context=None):
+        level = level or infer_level(template)
+        if LEVELS[level] < self.threshold:
+            return
+        event = LogEvent(time.time(), level, template, args, fields, sys.exc_info() if exc_info else None,
+                         prefix, context)
+        if self._closed:
+            self._deliver(event)
+            return
+        self._ensure_thread()
+        if LEVELS[level] >= LEVELS['warn']:
+            self._queue.put(event)  # 警告与错误不丢弃
+            return
+        try:
+            self._queue.put_nowait(event)
+        except queue.Full:
+            with self._lock:
+                self._dropped += 1
+
+    def debug(self, template, *args, **fields):
+        self.log('debug', template, *args, **fields)
+
+    def info(self, template, *args, **fields):
+        self.log('info', template, *args, **fields)
+
+    def warn(self, template, *args, **fields):
+        self.log('warn', template, *args, **fields)
+
+    def error(self, template, *args, **fields):
+        self.log('error', template, *args, **fields)
+
+    def bind(self, prefix='', **context):
+        """返回共用本日志器队列与输出线程的子日志器，其消息带 prefix 前缀，JSON 中带 context 字段"""
+        return BoundLogger(self, prefix, context)
+
+    def _ensure_thread(self):
+        if self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='event-logger', daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while True:
+            event = self._queue.get()
+            try:
+                if event is _CLOSE:
+                    return
+                self._deliver(event)
+                with self._lock:
+                    dropped, self._dropped = self._dropped, 0
+                if dropped:
+                    self._deliver(LogEvent(time.time(), 'warn', '⚠️ 日志输出过慢，已丢弃 {} 条日志', (dropped,), {}))
+            finally:
+                self._queue.task_done()
+
+    def _deliver(self, event):
+        try:
+            self.sink(event)
+        except Exception:
+            pass  # 输出失败不影响爬取
+
+    def flush(self, timeout=5.0):
+        """等待已排队的事件输出完毕，最多等待 timeout 秒"""
+        deadline = time.monotonic() + timeout
+        while self._thread is not None and self._queue.unfinished_tasks and time.monotonic() < deadline:
+            time.sleep(0.01)
+
+    def close(self, timeout=5.0):
+        """输出剩余事件并结束后台线程"""
+        self.flush(timeout)
+        self._closed = True
+        if self._thread is not None:
+            self._queue.put(_CLOSE)
+            self._thread.join(timeout)
+            self._thread = None
+
+
+class BoundLogger:
+    """EventLogger.bind() 返回的子日志器，接口与 EventLogger 相同"""
+
+    def __init__(self, parent, prefix, context):
+        self.parent = parent
+        self.prefix = prefix
+        self.context = context
+
+    def enabled(self, level):
+        return self.parent.enabled(level)
+
+    def log(self, level, template, *args, exc_info=False, **fields):
+        self.parent._emit(level, template, args, fields, exc_info, self.prefix, self.context)
+
+    def debug(self, template, *args, **fields):
+        self.log('debug', template, *args, **fields)
+
+    def info(self, template, *args, **fields):
+        self.log('info', template, *args, **fields)
+
+    def warn(self, template, *args, **fields):
+        self.log('warn', template, *args, **fields)
+
+    def error(self, template, *args, **fields):
+        self.log('error', template, *args, **fields)
+
+    def flush(self, timeout=5.0):
+        self.parent.flush(timeout)
+
+    def close(self, timeout=5.0):
+        """子日志器不拥有输出线程，由父日志器关闭"""
+
+
+def logging_sink(logger, with_traceback=True):
+    """把事件转交给 logging；事件对象放在 record.event 中，供 JsonFormatter 使用"""
+    def sink(event):
+        logger.log(LOGGING_LEVELS[event.level], event.text(with_traceback), extra={'event': event})
+    return sink
+
+
+class JsonFormatter(logging.Formatter):
+    """把 logging 记录格式化为 JSON Lines（结构化事件保留其字段）"""
+
+    LEVEL_NAMES = {logging.DEBUG: 'debug', logging.INFO: 'info', logging.WARNING: 'warn',
+                   logging.ERROR: 'error', logging.CRITICAL: 'error'}
+
+    def format(self, record):
+        event = getattr(record, 'event', None)
+        if event is not None:
+            data = event.to_dict()
+        else:
+            data = {'ts': self.formatTime(record, '%Y-%m-%dT%H:%M:%S') + '.{:03d}'.format(int(record.msecs)),
+                    'level': self.LEVEL_NAMES.get(record.levelno, 'info'),
+                    'msg': record.getMessage()}
+            if record.exc_info:
+                data['traceback'] = self.formatException(record.exc_info)
+        data['logger'] = record.name
+        return json.dumps(data, ensure_ascii=False)
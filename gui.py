@@ -10,7 +10,11 @@ import sys
 import json
 from datetime import datetime, timedelta
 
-from scraper import ScraperConfig, Scraper, parse_time_arg
+from events import LEVELS
+from log_buffer import LogBuffer
+from progress import format_duration
+from scraper import ScraperConfig, create_scraper, parse_time_arg
+from workers import STOP_ABORT, STOP_DRAIN
 
 # ---- 配置持久化 ----
 CONFIG_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'zsxq_config.json')
@@ -36,6 +40,17 @@ def save_config_to_file(config_dict):
         pass
 
 
+# 流水线队列在界面上的显示名
+QUEUE_NAMES = {'render': '渲染', 'write': '写入', 'images': '图片', 'files': '文件', 'downloads': '下载'}
+
+# 日志窗口：保留的行数（更早的写入 output_dir/gui.log）、刷新间隔（毫秒）与级别过滤选项
+LOG_CAPACITY = 5000
+LOG_FLUSH_MS = 100
+LOG_FILTERS = {'全部': 'debug', '信息': 'info', '警告': 'warn', '错误': 'error'}
+# 运行中刷新进度面板的间隔（毫秒）
+STATUS_REFRESH_MS = 1000
+
+
 # ---- 主题色彩 ----
 class Theme:
     # 浅色主题 - 高对比度，文字清晰
@@ -67,11 +82,16 @@ class App:
         self.root = root
         self.scraper = None
         self.is_running = False
+        self._stop_mode = STOP_DRAIN  # 停止按钮下次点击使用的停止方式
+        self._status_job = None  # 进度面板的定时刷新任务
+        # 工作线程只向缓冲追加日志，界面每 LOG_FLUSH_MS 毫秒批量取出显示
+        self.log_buffer = LogBuffer(LOG_CAPACITY)
 
         self._setup_window()
         self._setup_styles()
         self._build_ui()
         self._load_config()
+        self.root.after(LOG_FLUSH_MS, self._flush_log)
 
     def _setup_window(self):
         self.root.title('知识星球爬取工具')
@@ -250,6 +270,37 @@ class App:
 
         return entry
 
+    def _make_check(self, parent, text, variable):
+        """在一行中追加一个复选框"""
+        cb = tk.Checkbutton(parent, text=text,
+                            variable=variable,
+                            bg=Theme.BG_CARD, fg=Theme.FG,
+                            selectcolor=Theme.BG_INPUT,
+                            activebackground=Theme.BG_CARD,
+                            activeforeground=Theme.FG,
+                            font=('SF Pro Text', 11))
+        cb.pack(side=tk.LEFT, padx=(0, 20))
+        return cb
+
+    def _make_inline_field(self, parent, label, default=''):
+        """在一行中追加一个带标签的短输入框"""
+        tk.Label(parent, text=label,
+                 bg=Theme.BG_CARD, fg=Theme.FG,
+                 font=('SF Pro Text', 11)).pack(side=tk.LEFT)
+
+        entry = tk.Entry(parent, width=6,
+                         bg=Theme.BG_INPUT, fg=Theme.FG,
+                         insertbackground=Theme.FG,
+                         font=('SF Mono', 11),
+                         relief='flat',
+                         highlightbackground=Theme.BORDER,
+                         highlightcolor=Theme.HIGHLIGHT,
+                         highlightthickness=1,
+                         bd=4)
+        entry.insert(0, default)
+        entry.pack(side=tk.LEFT, padx=(8, 20))
+        return entry
+
     def _build_connection_card(self, parent):
         card = self._make_card(parent, '🔗 连接设置')
 
@@ -315,7 +366,31 @@ class App:
                                   activebackground=Theme.BG_CARD,
                                   activeforeground=Theme.FG,
                                   font=('SF Pro Text', 11))
-        cb_files.pack(side=tk.LEFT)
+        cb_files.pack(side=tk.LEFT, padx=(0, 20))
+
+        self.var_archive = tk.BooleanVar(value=False)
+        self._make_check(opts_row, '  归档原始数据', self.var_archive)
+
+        self.var_sqlite = tk.BooleanVar(value=False)
+        self._make_check(opts_row, '  写入 SQLite', self.var_sqlite)
+
+        # 爬取引擎
+        engine_row = tk.Frame(card, bg=Theme.BG_CARD)
+        engine_row.pack(fill=tk.X, pady=2)
+
+        self.var_async = tk.BooleanVar(value=False)
+        self._make_check(engine_row, '  异步引擎 (aiohttp)', self.var_async)
+        self.entry_concurrency = self._make_inline_field(engine_row, '并发数', '16')
+        self.entry_shards = self._make_inline_field(engine_row, '分片数', '1')
+
+        # 下载并发
+        workers_row = tk.Frame(card, bg=Theme.BG_CARD)
+        workers_row.pack(fill=tk.X, pady=2)
+
+        self.entry_image_workers = self._make_inline_field(workers_row, '图片线程', '2')
+        self.entry_file_workers = self._make_inline_field(workers_row, '文件线程', '1')
+        self.var_adaptive = tk.BooleanVar(value=False)
+        self._make_check(workers_row, '  自适应并发', self.var_adaptive)
 
         # 输出目录
         dir_row = tk.Frame(card, bg=Theme.BG_CARD)
@@ -389,6 +464,18 @@ class App:
                                    padx=24, pady=8)
         self.btn_start.pack(side=tk.RIGHT)
 
+        # 继续按钮（从断点恢复）
+        self.btn_resume = tk.Button(btn_frame, text='⏯ 继续上次',
+                                    command=lambda: self._start_scraper(resume=True),
+                                    bg=Theme.BG_SECONDARY, fg=Theme.FG,
+                                    activebackground=Theme.BG_CARD,
+                                    activeforeground=Theme.FG,
+                                    font=('SF Pro Text', 12),
+                                    relief='flat', bd=0,
+                                    cursor='hand2',
+                                    padx=18, pady=8)
+        self.btn_resume.pack(side=tk.RIGHT, padx=(0, 8))
+
     def _build_progress(self, parent):
         progress_frame = tk.Frame(parent, bg=Theme.BG)
         progress_frame.pack(fill=tk.X, pady=(0, 6))
@@ -424,6 +511,18 @@ class App:
                                     font=('SF Mono', 10))
         self.label_files.pack(side=tk.LEFT)
 
+        # 速率与预计剩余时间
+        self.label_rates = tk.Label(progress_frame, text='',
+                                    bg=Theme.BG, fg=Theme.FG_SECONDARY,
+                                    font=('SF Mono', 9))
+        self.label_rates.pack(anchor='w', pady=(2, 0))
+
+        # 流水线各阶段排队长度
+        self.label_queues = tk.Label(progress_frame, text='',
+                                     bg=Theme.BG, fg=Theme.FG_SECONDARY,
+                                     font=('SF Mono', 9))
+        self.label_queues.pack(anchor='w', pady=(2, 0))
+
     def _build_log(self, parent):
         log_frame = tk.Frame(parent, bg=Theme.BG)
         log_frame.pack(fill=tk.BOTH, expand=True, pady=(4, 0))
@@ -451,10 +550,24 @@ class App:
         self.log_text.tag_configure('info', foreground='#a8e6cf')
         self.log_text.tag_configure('error', foreground='#ff8b94')
         self.log_text.tag_configure('warn', foreground='#ffd93d')
+        self.log_text.tag_configure('debug', foreground='#8a8aa8')
         self.log_text.tag_configure('timestamp', foreground='#6a6a8a')
 
+        log_bar = tk.Frame(log_frame, bg=Theme.BG)
+        log_bar.pack(fill=tk.X, pady=(4, 0))
+
+        # 级别过滤
+        tk.Label(log_bar, text='显示级别',
+                 bg=Theme.BG, fg=Theme.FG_SECONDARY,
+                 font=('SF Pro Text', 9)).pack(side=tk.LEFT)
+        self.var_log_level = tk.StringVar(value='信息')
+        level_menu = ttk.Combobox(log_bar, textvariable=self.var_log_level,
+                                  values=list(LOG_FILTERS), state='readonly', width=6)
+        level_menu.pack(side=tk.LEFT, padx=(6, 0))
+        level_menu.bind('<<ComboboxSelected>>', lambda e: self._rerender_log())
+
         # 清空日志按钮
-        btn_clear = tk.Button(log_frame, text='🗑 清空日志',
+        btn_clear = tk.Button(log_bar, text='🗑 清空日志',
                               command=self._clear_log,
                               bg=Theme.BG_SECONDARY, fg=Theme.FG,
                               activebackground=Theme.BG_CARD,
@@ -463,22 +576,53 @@ class App:
                               relief='flat', bd=0,
                               cursor='hand2',
                               padx=8, pady=2)
-        btn_clear.pack(anchor='e', pady=(4, 0))
+        btn_clear.pack(side=tk.RIGHT)
 
     # ---- 工具方法 ----
 
-    def _append_log(self, msg, tag='info'):
-        """线程安全地追加日志"""
-        def _do():
-            self.log_text.configure(state=tk.NORMAL)
-            timestamp = datetime.now().strftime('%H:%M:%S')
-            self.log_text.insert(tk.END, '[{}] '.format(timestamp), 'timestamp')
-            self.log_text.insert(tk.END, msg + '\n', tag)
+    def _append_log(self, msg, tag=None):
+        """线程安全地追加日志（只写入缓冲，由 _flush_log 批量显示）；tag 为空时按内容推断级别"""
+        self.log_buffer.append(msg, tag)
+
+    def _flush_log(self):
+        """定时把缓冲中新增的日志一次性插入日志窗口"""
+        try:
+            lines = self.log_buffer.drain()
+            if lines:
+                self._insert_log_lines(lines)
+        finally:
+            self.root.after(LOG_FLUSH_MS, self._flush_log)
+
+    def _insert_log_lines(self, lines, replace=False):
+        minimum = LEVELS[LOG_FILTERS.get(self.var_log_level.get(), 'info')]
+        args = []
+        for line in lines:
+            if LEVELS[line.level] >= minimum:
+                args.extend(('[{}] '.format(line.timestamp()), 'timestamp', line.msg + '\n', line.level))
+        if not args and not replace:
+            return
+        # 用户向上翻看日志时不自动滚动到底部
+        follow = replace or self.log_text.yview()[1] >= 0.999
+        self.log_text.configure(state=tk.NORMAL)
+        if replace:
+            self.log_text.delete('1.0', tk.END)
+        if args:
+            self.log_text.insert(tk.END, *args)
+        # 日志窗口最多保留 LOG_CAPACITY 行
+        excess = int(self.log_text.index('end-1c').split('.')[0]) - 1 - LOG_CAPACITY
+        if excess > 0:
+            self.log_text.delete('1.0', '{}.0'.format(excess + 1))
+        self.log_text.configure(state=tk.DISABLED)
+        if follow:
             self.log_text.see(tk.END)
-            self.log_text.configure(state=tk.DISABLED)
-        self.root.after(0, _do)
+
+    def _rerender_log(self):
+        """切换显示级别后按新的级别重新显示缓冲中保留的日志"""
+        self.log_buffer.drain()
+        self._insert_log_lines(self.log_buffer.lines(), replace=True)
 
     def _clear_log(self):
+        self.log_buffer.clear()
         self.log_text.configure(state=tk.NORMAL)
         self.log_text.delete('1.0', tk.END)
         self.log_text.configure(state=tk.DISABLED)
@@ -489,30 +633,54 @@ class App:
             self.entry_output.delete(0, tk.END)
             self.entry_output.insert(0, directory)
 
-    def _update_progress(self, category, count):
-        """线程安全地更新进度统计"""
-        def _do():
-            if category == 'topics':
-                self.label_topics.configure(text='Topics: {}'.format(count))
-            elif category == 'images':
-                self.label_images.configure(text='Images: {}'.format(count))
-            elif category == 'files':
-                self.label_files.configure(text='Files: {}'.format(count))
-        self.root.after(0, _do)
+    def _refresh_status(self):
+        """运行期间按固定间隔轮询 Scraper.progress_snapshot() 刷新进度面板"""
+        if self.scraper is None:
+            return
+        status = self.scraper.progress_snapshot()
+        self.label_topics.configure(text='Topics: {}'.format(status['topics']))
+        self.label_images.configure(text='Images: {}'.format(status['images']))
+        self.label_files.configure(text='Files: {}'.format(status['files']))
+        self.label_rates.configure(text='{:.1f} topics/s  下载 {:.2f} MB/s  待下载 {}  预计剩余 {}'.format(
+            status['topics_per_sec'], status['mb_per_sec'], status['pending_media'], format_duration(status['eta'])))
+        if status['queues']:
+            self.label_queues.configure(text='队列  ' + '  '.join(
+                '{}: {}'.format(QUEUE_NAMES.get(name, name), depth) for name, depth in status['queues'].items()))
+
+        covered = status['coverage']
+        if self.is_running:
+            if covered is not None:
+                # 能估算覆盖比例时改为确定进度
+                if str(self.progress.cget('mode')) != 'determinate':
+                    self.progress.stop()
+                    self.progress.configure(mode='determinate', maximum=100)
+                self.progress.configure(value=covered * 100)
+                self.label_status.configure(text='⏳ 正在爬取... 已覆盖 {:.1f}%'.format(covered * 100))
+            self._status_job = self.root.after(STATUS_REFRESH_MS, self._refresh_status)
 
     def _set_running(self, running):
         """切换运行状态 UI"""
         def _do():
             self.is_running = running
+            if self._status_job is not None:
+                self.root.after_cancel(self._status_job)
+                self._status_job = None
             if running:
                 self.btn_start.configure(state=tk.DISABLED, bg='#b8b5d4')
-                self.btn_stop.configure(state=tk.NORMAL)
+                self.btn_resume.configure(state=tk.DISABLED)
+                self.btn_stop.configure(state=tk.NORMAL, text='⏹ 停止')
+                self._stop_mode = STOP_DRAIN
+                self.progress.configure(mode='indeterminate', value=0)
                 self.progress.start(15)
                 self.label_status.configure(text='⏳ 正在爬取...', fg='#e67e22')
+                self._status_job = self.root.after(STATUS_REFRESH_MS, self._refresh_status)
             else:
                 self.btn_start.configure(state=tk.NORMAL, bg=Theme.BG_BUTTON)
-                self.btn_stop.configure(state=tk.DISABLED)
+                self.btn_resume.configure(state=tk.NORMAL)
+                self.btn_stop.configure(state=tk.DISABLED, text='⏹ 停止')
                 self.progress.stop()
+                # 显示最终的计数
+                self._refresh_status()
         self.root.after(0, _do)
 
     # ---- 配置管理 ----
@@ -527,10 +695,20 @@ class App:
             'enable_images': self.var_images.get(),
             'enable_files': self.var_files.get(),
             'output_dir': self.entry_output.get().strip(),
+            'engine': 'async' if self.var_async.get() else 'thread',
+            'concurrency': self.entry_concurrency.get().strip(),
+            'shards': self.entry_shards.get().strip(),
+            'image_workers': self.entry_image_workers.get().strip(),
+            'file_workers': self.entry_file_workers.get().strip(),
+            'adaptive_concurrency': self.var_adaptive.get(),
+            'archive_raw': self.var_archive.get(),
+            'enable_sqlite': self.var_sqlite.get(),
         }
 
     def _save_config(self):
-        config = self._get_current_config()
+        # 保留仅由命令行/配置文件使用的字段
+        config = load_saved_config()
+        config.update(self._get_current_config())
         save_config_to_file(config)
         self._append_log('配置已保存', 'info')
 
@@ -563,6 +741,26 @@ class App:
         if 'output_dir' in saved:
             self.entry_output.delete(0, tk.END)
             self.entry_output.insert(0, saved['output_dir'])
+        if 'engine' in saved:
+            self.var_async.set(saved['engine'] == 'async')
+        if 'concurrency' in saved:
+            self.entry_concurrency.delete(0, tk.END)
+            self.entry_concurrency.insert(0, str(saved['concurrency']))
+        if 'shards' in saved:
+            self.entry_shards.delete(0, tk.END)
+            self.entry_shards.insert(0, str(saved['shards']))
+        if 'image_workers' in saved:
+            self.entry_image_workers.delete(0, tk.END)
+            self.entry_image_workers.insert(0, str(saved['image_workers']))
+        if 'file_workers' in saved:
+            self.entry_file_workers.delete(0, tk.END)
+            self.entry_file_workers.insert(0, str(saved['file_workers']))
+        if 'adaptive_concurrency' in saved:
+            self.var_adaptive.set(saved['adaptive_concurrency'])
+        if 'archive_raw' in saved:
+            self.var_archive.set(saved['archive_raw'])
+        if 'enable_sqlite' in saved:
+            self.var_sqlite.set(saved['enable_sqlite'])
 
         self._append_log('已加载上次保存的配置', 'info')
 
@@ -593,6 +791,15 @@ class App:
             messagebox.showerror('时间范围错误', '开始时间不能晚于结束时间')
             return None
 
+        try:
+            concurrency = int(config['concurrency'])
+            shards = int(config['shards'])
+            image_workers = int(config['image_workers'])
+            file_workers = int(config['file_workers'])
+        except ValueError:
+            messagebox.showerror('配置错误', '并发数、分片数和线程数必须是整数')
+            return None
+
         return ScraperConfig(
             group=config['group'],
             cookies=config['cookies'],
@@ -601,23 +808,39 @@ class App:
             enable_images=config['enable_images'],
             enable_files=config['enable_files'],
             output_dir=config['output_dir'],
+            engine=config['engine'],
+            concurrency=concurrency,
+            shards=shards,
+            image_workers=image_workers,
+            file_workers=file_workers,
+            adaptive_concurrency=config['adaptive_concurrency'],
+            max_workers=int(load_saved_config().get('max_workers', 16)),
+            archive_raw=config['archive_raw'],
+            enable_sqlite=config['enable_sqlite'],
         )
 
-    def _start_scraper(self):
+    def _start_scraper(self, resume=False):
         if self.is_running:
             return
 
         config = self._validate_config()
         if not config:
             return
+        config.resume = resume
+        # 只有显示全部日志时才让爬取器产生逐个请求/媒体的 debug 日志；其余级别保留 info 以便切换过滤
+        config.log_level = 'debug' if LOG_FILTERS.get(self.var_log_level.get()) == 'debug' else 'info'
 
         # 重置计数器
         self.label_topics.configure(text='Topics: 0')
         self.label_images.configure(text='Images: 0')
         self.label_files.configure(text='Files: 0')
+        self.label_rates.configure(text='')
+        self.label_queues.configure(text='')
+        # 超出日志窗口保留行数的旧日志写入输出目录
+        self.log_buffer.spill_path = os.path.join(config.output_dir, 'gui.log')
 
         self._set_running(True)
-        self._append_log('开始爬取...', 'info')
+        self._append_log('从断点继续爬取...' if resume else '开始爬取...', 'info')
 
         def on_finished(success, msg):
             def _do():
@@ -630,14 +853,18 @@ class App:
                     self._append_log('❌ {}'.format(msg), 'error')
             self.root.after(0, _do)
 
-        self.scraper = Scraper(
-            config,
-            on_log=lambda msg: self._append_log(msg),
-            on_progress=lambda cat, cnt: self._update_progress(cat, cnt),
-            on_finished=on_finished,
-            on_duplicate=self._on_duplicate,
-            on_file_exists=self._on_file_exists,
-        )
+        try:
+            self.scraper = create_scraper(
+                config,
+                on_event=lambda event: self.log_buffer.append(event.text(), event.level, event.created),
+                on_finished=on_finished,
+                on_duplicate=self._on_duplicate,
+                on_file_exists=self._on_file_exists,
+            )
+        except RuntimeError as e:
+            self.scraper = None
+            on_finished(False, str(e))
+            return
 
         thread = threading.Thread(target=self.scraper.run, daemon=True)
         thread.start()
@@ -676,9 +903,17 @@ class App:
         return result[0]
 
     def _stop_scraper(self):
-        if self.scraper:
-            self.scraper.stop()
-            self._append_log('已发送停止信号...', 'warn')
+        """第一次点击停止翻页并处理完已排队的任务（drain），第二次点击立即停止（abort）"""
+        if not self.scraper:
+            return
+        mode = self._stop_mode
+        self.scraper.stop(mode)
+        if mode == STOP_DRAIN:
+            self._stop_mode = STOP_ABORT
+            self.btn_stop.configure(text='⏹ 立即停止')
+            self._append_log('已停止翻页，正在处理已排队的任务，再次点击立即停止', 'warn')
+        else:
+            self._append_log('已发送立即停止信号...', 'warn')
 
 
 def main():
@@ -0,0 +1,93 @@
+"""
+GUI 日志缓冲
+工作线程只把日志放入内存（加锁追加，不触碰 Tk），界面按固定帧率批量取出显示。
+只保留最近 capacity 行供界面显示与按级别重新过滤，更早的行在取出时批量写入溢出日志文件
+"""
+import os
+import threading
+import time
+from collections import deque
+
+# 逐条请求、逐个媒体的高频日志，归为 debug
+DEBUG_PREFIXES = ('请求:', '剩余图片', '剩余文件', '图片已保存', '文件已保存', '获取文件下载链接')
+
+
+def classify(msg):
+    """根据日志内容推断级别（用于未带级别的文本日志）"""
+    if msg.startswith('❌') or msg.startswith('Traceback'):
+        return 'error'
+    if msg.startswith('⚠️'):
+        return 'warn'
+    if msg.startswith(DEBUG_PREFIXES):
+        return 'debug'
+    return 'info'
+
+
+class LogLine:
+    __slots__ = ('created', 'level', 'msg')
+
+    def __init__(self, created, level, msg):
+        self.created = created
+        self.level = level
+        self.msg = msg
+
+    def timestamp(self, with_date=False):
+        fmt = '%Y-%m-%d %H:%M:%S' if with_date else '%H:%M:%S'
+        return time.strftime(fmt, time.localtime(self.created))
+
+
+class LogBuffer:
+    """线程安全的日志环形缓冲"""
+
+    def __init__(self, capacity=5000, spill_path=None):
+        self.capacity = max(1, capacity)
+        self.spill_path = spill_path
+        self._lock = threading.Lock()
+        self._lines = deque()  # 最近 capacity 行
+        self._pending = deque()  # 尚未被界面取走的行
+        self._spilled = []  # 被挤出环形缓冲、尚未写入溢出文件的行
+
+    def append(self, msg, level=None, created=None):
+        line = LogLine(created or time.time(), level or classify(msg), msg)
+        with self._lock:
+            if len(self._lines) >= self.capacity:
+                self._spilled.append(self._lines.popleft())
+            self._lines.append(line)
+            self._pending.append(line)
+            # 界面长时间未取走时只保留仍在环形缓冲中的行
+            if len(self._pending) > self.capacity:
+                self._pending.popleft()
+
+    def drain(self):
+        """取出新增的行（在界面线程调用），并把被挤出的旧行写入溢出文件"""
+        with self._lock:
+            batch = list(self._pending)
+            self._pending.clear()
+            spilled, self._spilled = self._spilled, []
+        self._write_spill(spilled)
+        return batch
+
+    def lines(self):
+        """当前保留的全部行（用于切换过滤级别后重新显示）"""
+        with self._lock:
+            return list(self._lines)
+
+    def clear(self):
+        """清空缓冲，清掉的行同样写入溢出文件"""
+        with self._lock:
+            spilled = self._spilled + list(self._lines)
+            self._spilled = []
+            self._lines.clear()
+            self._pending.clear()
+        self._write_spill(spilled)
+
+    def _write_spill(self, lines):
+        if not lines or not self.spill_path:
+            return
+        try:
+            os.makedirs(os.path.dirname(os.path.abspath(self.spill_path)), exist_ok=True)
+            with open(self.spill_path, 'a', encoding='utf-8') as f:
+                f.write(''.join('{} {:<5} {}\n'.format(line.timestamp(with_date=True), line.level.upper(), line.msg)
+                                for line in lines))
+        except OSError:
+            pass  # 溢出文件写入失败不影响界面
@@ -4,10 +4,17 @@
 import argparse
 import json
 import logging
+import multiprocessing
 import os
+import threading
+import time
 from datetime import datetime, timedelta
 
-from scraper import ScraperConfig, Scraper, parse_time_arg
+from events import LEVELS, LOGGING_LEVELS, JsonFormatter
+from progress import format_status
+from scraper import ScraperConfig, create_scraper, parse_group, parse_time_arg
+from watch import Watcher
+from workers import STOP_ABORT, STOP_DRAIN
 
 # 配置文件路径
 CONFIG_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'zsxq_config.json')
@@ -50,6 +57,7 @@ logger = logging.getLogger()
 
 
 if __name__ == '__main__':
+    multiprocessing.freeze_support()
     parser = argparse.ArgumentParser(description='知识星球内容爬取工具')
     parser.add_argument('--start-time', type=str, default=DEFAULT_START_TIME,
                         help='爬取的起始时间（包含），格式：YYYY-MM-DD 或 YYYY-MM-DDTHH:MM:SS')
@@ -59,17 +67,131 @@ if __name__ == '__main__':
                         help='不爬取图片')
     parser.add_argument('--no-files', action='store_true', default=DEFAULT_NO_FILES,
                         help='不爬取文件')
+    parser.add_argument('--engine', choices=['thread', 'async'], default=_cfg.get('engine', 'thread'),
+                        help='爬取引擎：thread（多线程，默认）或 async（asyncio，需要 aiohttp）')
+    parser.add_argument('--concurrency', type=int, default=_cfg.get('concurrency', 16),
+                        help='async 引擎的最大并发请求数')
+    parser.add_argument('--shards', type=int, default=_cfg.get('shards', 1),
+                        help='将时间范围按天拆分为 N 个分片并行翻页（需同时设置起止时间）')
+    parser.add_argument('--resume', action='store_true', default=False,
+                        help='从输出目录中的断点继续上次未完成的爬取')
+    parser.add_argument('--chunk-size', type=int, default=_cfg.get('chunk_size', 64 * 1024),
+                        help='图片/文件流式下载的块大小（字节）')
+    parser.add_argument('--image-workers', type=int, default=_cfg.get('image_workers', 2),
+                        help='图片下载线程数')
+    parser.add_argument('--file-workers', type=int, default=_cfg.get('file_workers', 1),
+                        help='文件下载线程数')
+    parser.add_argument('--adaptive-concurrency', action='store_true',
+                        default=_cfg.get('adaptive_concurrency', False),
+                        help='根据延迟、错误率和 429/5xx 自动调整下载并发')
+    parser.add_argument('--max-workers', type=int, default=_cfg.get('max_workers', 16),
+                        help='自适应模式下每类媒体的最大并发数')
+    parser.add_argument('--topics-rps', type=float, default=_cfg.get('topics_rps', 0),
+                        help='topics 接口每秒请求数上限，0 表示不限')
+    parser.add_argument('--download-url-rps', type=float, default=_cfg.get('download_url_rps', 0),
+                        help='文件下载链接接口每秒请求数上限，0 表示不限')
+    parser.add_argument('--cdn-rps', type=float, default=_cfg.get('cdn_rps', 0),
+                        help='图片/文件 CDN 每秒请求数上限，0 表示不限')
+    parser.add_argument('--max-attempts', type=int, default=_cfg.get('max_attempts', 8),
+                        help='单个请求的最大尝试次数（指数退避 + 随机抖动）')
+    parser.add_argument('--url-ttl', type=int, default=_cfg.get('url_ttl', 300),
+                        help='文件签名下载链接的缓存有效期（秒）')
+    parser.add_argument('--archive-raw', action='store_true', default=_cfg.get('archive_raw', False),
+                        help='按月归档 topics 原始 JSON 到 output_dir/raw（gzip 压缩的 NDJSON）')
+    parser.add_argument('--page-queue-size', type=int, default=_cfg.get('page_queue_size', 8),
+                        help='渲染/写入阶段之间最多排队的页数')
+    parser.add_argument('--media-queue-size', type=int, default=_cfg.get('media_queue_size', 1000),
+                        help='图片/文件下载队列的长度上限')
+    parser.add_argument('--sqlite', action='store_true', default=_cfg.get('enable_sqlite', False),
+                        help='同时写入 output_dir/topics.db（SQLite + FTS5 全文索引），可用 search 子命令检索')
+    parser.add_argument('--metrics-file', type=str, default=_cfg.get('metrics_file', ''),
+                        help='运行指标输出文件：.json 结尾写 JSON，否则写 Prometheus 文本格式')
+    parser.add_argument('--metrics-interval', type=float, default=_cfg.get('metrics_interval', 15),
+                        help='运行期间写入指标文件的间隔（秒）')
+    parser.add_argument('--api-base', type=str, default=_cfg.get('api_base', ScraperConfig.api_base),
+                        help='API 地址，默认 https://api.zsxq.com（基准测试时可指向本地 mock_server.py）')
+    parser.add_argument('--profile', action='store_true', default=False,
+                        help='性能剖析：cProfile + tracemalloc + 各阶段耗时，结果写入 output_dir/profile')
+    parser.add_argument('--status-interval', type=float, default=_cfg.get('status_interval', 10),
+                        help='每隔多少秒输出一行进度（覆盖比例、速率、队列积压、预计剩余时间），0 表示不输出')
+    parser.add_argument('--groups', type=str, default=','.join(str(g) for g in _cfg.get('groups', [])),
+                        help='同时爬取多个星球（逗号分隔，可写作 星球ID:权重），共用连接池、限速与下载线程，'
+                             '按权重轮流调度，各星球输出到 output/<星球ID>')
+    parser.add_argument('--log-level', choices=list(LEVELS), default=_cfg.get('log_level', 'info'),
+                        help='日志级别：debug 输出逐个请求/媒体的日志与异常堆栈，默认 info')
+    parser.add_argument('--log-format', choices=['text', 'json'], default=_cfg.get('log_format', 'text'),
+                        help='日志格式：text 或 json（每行一个 JSON 对象，便于定时任务日志检索）')
     parser.add_argument('--gui', action='store_true', default=False,
                         help='启动图形界面模式')
+
+    subparsers = parser.add_subparsers(dest='command')
+    render_parser = subparsers.add_parser('render', help='从原始数据归档离线重新生成 topics/*.md（不访问网络）')
+    render_parser.add_argument('--output-dir', type=str,
+                               default=_cfg.get('output_dir') or ScraperConfig.output_dir,
+                               help='爬取时的输出目录（需包含 raw 归档）')
+    render_parser.add_argument('--workers', type=int, default=0,
+                               help='渲染进程数，默认等于 CPU 核数')
+    render_parser.add_argument('--since', type=str, default='',
+                               help='只重新渲染该日期及之后的日文件（含时间时按所在日期整天渲染），格式同 --start-time')
+    render_parser.add_argument('--until', type=str, default='',
+                               help='只重新渲染该日期及之前的日文件（含时间时按所在日期整天渲染），格式同 --end-time')
+
+    watch_parser = subparsers.add_parser(
+        'watch', help='常驻运行，定时只抓取新 topics（翻页到上次已抓取的最新 topic 为止），其余参数同爬取模式')
+    watch_parser.add_argument('--interval', type=float, default=_cfg.get('watch_interval', 300),
+                              help='两轮检查之间的间隔（秒）')
+
+    search_parser = subparsers.add_parser('search', help='在 topics.db 中全文检索（需先使用 --sqlite 爬取）')
+    search_parser.add_argument('query', type=str, help='关键词，多个关键词以空格分隔且需全部命中')
+    search_parser.add_argument('--output-dir', type=str,
+                               default=_cfg.get('output_dir') or ScraperConfig.output_dir,
+                               help='爬取时的输出目录（需包含 topics.db）')
+    search_parser.add_argument('--limit', type=int, default=20, help='最多显示的结果数')
+    search_parser.add_argument('--since', type=str, default='',
+                               help='只检索该时间之后的 topics，格式同 --start-time')
+    search_parser.add_argument('--until', type=str, default='',
+                               help='只检索该时间之前的 topics，格式同 --end-time')
     args = parser.parse_args()
 
+    # debug 只作用于爬取器的日志，不打开第三方库（urllib3、asyncio）的调试输出
+    logging.getLogger('scraper').setLevel(LOGGING_LEVELS[args.log_level])
+    logger.setLevel(max(logging.INFO, LOGGING_LEVELS[args.log_level]))
+    if args.log_format == 'json':
+        for handler in logger.handlers:
+            handler.setFormatter(JsonFormatter())
+
     if args.gui:
         from gui import main as gui_main
         gui_main()
+    elif args.command == 'render':
+        from renderer import render_archive
+        started = time.time()
+        days, topics = render_archive(args.output_dir, workers=args.workers,
+                                      start_time=parse_time_arg(args.since),
+                                      end_time=parse_time_arg(args.until), on_log=logger.info)
+        logger.info('渲染完成！共 {} 个日文件, {} 条 topics, 用时 {:.1f} 秒'.format(
+            days, topics, time.time() - started))
+    elif args.command == 'search':
+        from sqlite_store import SqliteStore
+        store = SqliteStore(args.output_dir)
+        if not os.path.exists(store.path):
+            logger.error('未找到数据库: {}（请先使用 --sqlite 爬取）'.format(store.path))
+            exit(1)
+        store.open()
+        started = time.time()
+        results = store.search(args.query, limit=args.limit, start_time=parse_time_arg(args.since),
+                               end_time=parse_time_arg(args.until))
+        store.close()
+        for item in results:
+            print('{}  {}  topics/{}.md  [{}]'.format(item['create_time'], item['author'], item['day'],
+                                                     item['topic_id']))
+            print('    {}'.format(item['snippet']))
+        logger.info('共 {} 条结果，用时 {:.3f} 秒'.format(len(results), time.time() - started))
     else:
         # 命令行模式
         start_time = parse_time_arg(args.start_time)
-        end_time = parse_time_arg(args.end_time)
+        # watch 模式总是从最新一页开始，起始时间只在没有高水位记录时使用
+        end_time = parse_time_arg(args.end_time) if args.command != 'watch' else ''
 
         if start_time:
             logger.info('起始时间: {}'.format(start_time))
@@ -79,6 +201,13 @@ if __name__ == '__main__':
             logger.error('起始时间不能晚于结束时间！')
             exit(1)
 
+        groups = [g.strip() for g in args.groups.split(',') if g.strip()]
+        for spec in groups:
+            try:
+                parse_group(spec)
+            except ValueError as e:
+                parser.error(str(e))
+
         enable_images = not args.no_images
         enable_files = not args.no_files
         if not enable_images:
@@ -93,7 +222,51 @@ if __name__ == '__main__':
             end_time=end_time,
             enable_images=enable_images,
             enable_files=enable_files,
+            engine=args.engine,
+            concurrency=args.concurrency,
+            shards=args.shards,
+            resume=args.resume,
+            chunk_size=args.chunk_size,
+            image_workers=args.image_workers,
+            file_workers=args.file_workers,
+            adaptive_concurrency=args.adaptive_concurrency,
+            max_workers=args.max_workers,
+            topics_rps=args.topics_rps,
+            download_url_rps=args.download_url_rps,
+            cdn_rps=args.cdn_rps,
+            max_attempts=args.max_attempts,
+            url_ttl=args.url_ttl,
+            archive_raw=args.archive_raw,
+            enable_sqlite=args.sqlite,
+            page_queue_size=args.page_queue_size,
+            media_queue_size=args.media_queue_size,
+            metrics_file=args.metrics_file,
+            metrics_interval=args.metrics_interval,
+            api_base=args.api_base,
+            profile=args.profile,
+            log_level=args.log_level,
+            groups=groups,
         )
 
-        scraper = Scraper(config)
-        scraper.run()
+        if args.command == 'watch':
+            scraper = Watcher(config, args.interval)
+        else:
+            scraper = create_scraper(config)
+        # 在后台线程中运行，主线程处理 Ctrl+C：第一次停止翻页并处理完已排队的任务，第二次立即停止
+        worker = threading.Thread(target=scraper.run, daemon=True)
+        worker.start()
+        stop_mode = STOP_DRAIN
+        next_status = time.monotonic() + args.status_interval
+        while worker.is_alive():
+            try:
+                worker.join(0.5)
+                if args.status_interval > 0 and time.monotonic() >= next_status and worker.is_alive():
+                    next_status = time.monotonic() + args.status_interval
+                    status = scraper.progress_snapshot()
+                    if status is not None:
+                        logger.info('📊 ' + format_status(status))
+            except KeyboardInterrupt:
+                scraper.stop(stop_mode)
+                if stop_mode == STOP_DRAIN:
+                    logger.info('再次按 Ctrl+C 立即停止')
+                stop_mode = STOP_ABORT
@@ -0,0 +1,74 @@
+"""
+按日文件批量写入 Markdown
+一页 topics 按日期分组后每个日文件只写一次，并缓存少量打开的文件句柄（LRU）
+"""
+import os
+import threading
+from collections import OrderedDict
+
+TOPIC_SEPARATOR = '\n---\n\n'
+
+
+class MarkdownWriter:
+    """线程安全的日文件写入器"""
+
+    def __init__(self, topics_dir, max_open=8):
+        self.topics_dir = topics_dir
+        self.max_open = max(1, max_open)
+        self._lock = threading.Lock()
+        self._handles = OrderedDict()  # day -> 文件句柄，按最近使用排序
+        self._dir_ready = False
+
+    def path(self, day):
+        return os.path.join(self.topics_dir, '{}.md'.format(day))
+
+    def _handle(self, day):
+        f = self._handles.get(day)
+        if f is not None:
+            self._handles.move_to_end(day)
+            return f
+        if not self._dir_ready:
+            os.makedirs(self.topics_dir, exist_ok=True)
+            self._dir_ready = True
+        f = open(self.path(day), 'a', encoding='utf-8')
+        self._handles[day] = f
+        while len(self._handles) > self.max_open:
+            _, oldest = self._handles.popitem(last=False)
+            oldest.close()
+        return f
+
+    def write_page(self, entries):
+        """写入一页内容，entries 为按顺序排列的 (day, markdown) 列表
+
+        返回 {day: 写入条数}，同一日期的内容合并为一次写入，页末统一 flush
+        """
+        groups = OrderedDict()
+        for day, md_content in entries:
+            groups.setdefault(day, []).append(md_content + TOPIC_SEPARATOR)
+        with self._lock:
+            for day, chunks in groups.items():
+                self._handle(day).write(''.join(chunks))
+            for day in groups:
+                if day in self._handles:
+                    self._handles[day].flush()
+        return {day: len(chunks) for day, chunks in groups.items()}
+
+    def truncate(self, day):
+        """清空某个日文件（用户选择覆盖时）"""
+        with self._lock:
+            f = self._handles.pop(day, None)
+            if f is not None:
+                f.close()
+            with open(self.path(day), 'w', encoding='utf-8'):
+                pass
+
+    def flush(self):
+        with self._lock:
+            for f in self._handles.values():
+                f.flush()
+
+    def close(self):
+        with self._lock:
+            while self._handles:
+                _, f = self._handles.popitem(last=False)
+                f.close()
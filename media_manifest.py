@@ -0,0 +1,65 @@
+"""
+已下载媒体清单
+记录每个图片/文件的 id、相对路径、大小和 sha256，重复运行时据此跳过已完成的下载
+"""
+import json
+import os
+import threading
+
+
+class MediaManifest:
+    """以 JSON Lines 追加写入 output_dir/.media_manifest 的下载清单"""
+
+    FILENAME = '.media_manifest'
+
+    def __init__(self, output_dir):
+        self.output_dir = output_dir
+        self.path = os.path.join(output_dir, self.FILENAME)
+        self._lock = threading.Lock()
+        self._entries = {}  # (kind, id) -> 记录
+        self._file = None
+
+    def load(self):
+        """载入清单并打开追加句柄，返回记录数"""
+        with self._lock:
+            self._entries = {}
+            if os.path.exists(self.path):
+                with open(self.path, 'r', encoding='utf-8') as f:
+                    for line in f:
+                        try:
+                            entry = json.loads(line)
+                        except ValueError:
+                            continue  # 崩溃时可能残留半行
+                        self._entries[(entry['kind'], entry['id'])] = entry
+            self._file = open(self.path, 'a', encoding='utf-8')
+            return len(self._entries)
+
+    def is_done(self, kind, media_id, filepath):
+        """清单中有记录且磁盘上的文件大小一致时视为已完成"""
+        entry = self._entries.get((kind, str(media_id)))
+        if entry is None:
+            return False
+        try:
+            return os.path.getsize(filepath) == entry['size']
+        except OSError:
+            return False
+
+    def record(self, kind, media_id, filepath, size, sha256):
+        entry = {
+            'kind': kind,
+            'id': str(media_id),
+            'path': os.path.relpath(filepath, self.output_dir),
+            'size': size,
+            'sha256': sha256,
+        }
+        with self._lock:
+            self._entries[(kind, entry['id'])] = entry
+            if self._file is not None:
+                self._file.write(json.dumps(entry, ensure_ascii=False) + '\n')
+                self._file.flush()
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
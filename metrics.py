@@ -0,0 +1,229 @@
+"""
+运行指标
+MetricsRegistry 汇总请求延迟、状态码、重试、下载字节数、磁盘写入耗时、队列长度与各阶段耗时，
+snapshot() 返回当前快照；MetricsExporter 定时（及结束时）把快照写成 Prometheus 文本或 JSON 文件，
+用于区分变慢的原因是 API、CDN 还是本地磁盘
+"""
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+# 延迟类直方图的默认桶上界（秒）
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+def _label_key(labels):
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def _format_labels(key, extra=()):
+    items = list(key) + list(extra)
+    if not items:
+        return ''
+    escaped = ('{}="{}"'.format(k, v.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n'))
+               for k, v in items)
+    return '{' + ','.join(escaped) + '}'
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    type = ''
+
+    def __init__(self, registry, name, help_text):
+        self._lock = registry._lock
+        self.name = name
+        self.help = help_text
+        self._values = {}  # 标签 -> 值
+
+    def samples(self):
+        """返回 [(标签 dict, 值)]，调用方需持有锁"""
+        return [(dict(key), value) for key, value in sorted(self._values.items())]
+
+
+class Counter(_Metric):
+    """只增不减的计数"""
+    type = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = _label_key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        with self._lock:
+            return self._values.get(_label_key(labels), 0)
+
+    def total(self):
+        with self._lock:
+            return sum(self._values.values())
+
+
+class Gauge(_Metric):
+    """可任意设置的当前值"""
+    type = 'gauge'
+
+    def set(self, value, **labels):
+        with self._lock:
+            self._values[_label_key(labels)] = value
+
+
+class Histogram(_Metric):
+    """按桶统计的分布，值为 {'buckets': [各桶计数], 'sum': 总和, 'count': 次数}"""
+    type = 'histogram'
+
+    def __init__(self, registry, name, help_text, buckets=LATENCY_BUCKETS):
+        super().__init__(registry, name, help_text)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        key = _label_key(labels)
+        with self._lock:
+            item = self._values.get(key)
+            if item is None:
+                item = self._values[key] = {'buckets': [0] * len(self.buckets), 'sum': 0.0, 'count': 0}
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    item['buckets'][i] += 1
+                    break
+            item['sum'] += value
+            item['count'] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        """统计 with 块的耗时（出错时同样记录）"""
+        start = time.monotonic()
+        try:
+            yield
+        finally:
+            self.observe(time.monotonic() - start, **labels)
+
+    def samples(self):
+        result = []
+        for key, item in sorted(self._values.items()):
+            # 输出为累计计数，与 Prometheus 的 le 语义一致
+            cumulative, buckets = 0, {}
+            for bound, count in zip(self.buckets, item['buckets']):
+                cumulative += count
+                buckets[_format_value(bound)] = cumulative
+            buckets['+Inf'] = item['count']
+            result.append((dict(key), {'buckets': buckets, 'sum': item['sum'], 'count': item['count']}))
+        return result
+
+
+class MetricsRegistry:
+    """线程安全的指标集合；同名指标重复注册时返回已有的实例"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._metrics = {}
+        self.started = time.time()
+        self._started_monotonic = time.monotonic()
+
+    def _get(self, cls, name, help_text, **kwargs):
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = cls(self, name, help_text, **kwargs)
+            elif not isinstance(metric, cls):
+                raise ValueError('指标 {} 已注册为 {}'.format(name, metric.type))
+            return metric
+
+    def counter(self, name, help_text=''):
+        return self._get(Counter, name, help_text)
+
+    def gauge(self, name, help_text=''):
+        return self._get(Gauge, name, help_text)
+
+    def histogram(self, name, help_text='', buckets=LATENCY_BUCKETS):
+        return self._get(Histogram, name, help_text, buckets=buckets)
+
+    def uptime(self):
+        return time.monotonic() - self._started_monotonic
+
+    def snapshot(self):
+        """返回可 JSON 序列化的快照：{'timestamp', 'uptime_seconds', 'metrics': {名称: {...}}}"""
+        with self._lock:
+            metrics = {}
+            for name, metric in sorted(self._metrics.items()):
+                metrics[name] = {
+                    'type': metric.type,
+                    'help': metric.help,
+                    'samples': [{'labels': labels, 'value': value} for labels, value in metric.samples()],
+                }
+        return {'timestamp': time.time(), 'uptime_seconds': self.uptime(), 'metrics': metrics}
+
+    def to_prometheus(self):
+        """以 Prometheus 文本格式（可供 node_exporter textfile collector 读取）输出全部指标"""
+        lines = []
+        with self._lock:
+            for name, metric in sorted(self._metrics.items()):
+                lines.append('# HELP {} {}'.format(name, metric.help))
+                lines.append('# TYPE {} {}'.format(name, metric.type))
+                for labels, value in metric.samples():
+                    key = _label_key(labels)
+                    if metric.type == 'histogram':
+                        for bound, count in value['buckets'].items():
+                            lines.append('{}_bucket{} {}'.format(name, _format_labels(key, [('le', bound)]), count))
+                        lines.append('{}_sum{} {}'.format(name, _format_labels(key), _format_value(value['sum'])))
+                        lines.append('{}_count{} {}'.format(name, _format_labels(key), value['count']))
+                    else:
+                        lines.append('{}{} {}'.format(name, _format_labels(key), _format_value(value)))
+        return '\n'.join(lines) + '\n'
+
+    def to_json(self):
+        return json.dumps(self.snapshot(), ensure_ascii=False, indent=2)
+
+    def write(self, path):
+        """写入指标文件：扩展名为 .json 时写 JSON，否则写 Prometheus 文本；先写临时文件再原子替换"""
+        content = self.to_json() if path.lower().endswith('.json') else self.to_prometheus()
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write(content)
+        os.replace(tmp_path, path)
+
+
+class MetricsExporter:
+    """后台线程每隔 interval 秒写一次指标文件，close() 时再写最后一次
+
+    before_write 在每次写入前调用，可用于刷新派生指标（如速率、队列长度）
+    """
+
+    def __init__(self, registry, path, interval=15.0, before_write=None, on_log=None):
+        self.registry = registry
+        self.path = path
+        self.interval = max(1.0, interval)
+        self.before_write = before_write or (lambda: None)
+        self.on_log = on_log or (lambda msg: None)
+        self._stop_event = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._loop, daemon=True)
+        self._thread.start()
+
+    def _loop(self):
+        while not self._stop_event.wait(self.interval):
+            self.write()
+
+    def write(self):
+        try:
+            self.before_write()
+            self.registry.write(self.path)
+        except Exception as e:
+            self.on_log('❌ 写入指标文件失败: {}'.format(e))
+
+    def close(self):
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self.write()
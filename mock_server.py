@@ -0,0 +1,264 @@
+"""
+本地 mock 知识星球 API
+实现 /v2/groups/{id}/topics（end_time 翻页）、/v2/files/{id}/download_url 以及图片/文件内容，
+延迟、topics 数量、正文与媒体大小、错误率均可配置，供 benchmark.py 在无网络环境下测量吞吐。
+内容由参数确定性生成：相同参数下每次运行返回的数据完全一致
+"""
+import argparse
+import json
+import random
+import threading
+import time
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+TIME_FORMAT = '%Y-%m-%dT%H:%M:%S'
+TIME_SUFFIX = '+0800'
+
+
+@dataclass
+class MockConfig:
+    """mock 服务器参数"""
+    topics: int = 1000  # topics 总数
+    interval_minutes: int = 30  # 相邻 topics 的时间间隔（分钟），决定数据跨越的天数
+    latest: str = '2024-01-31T12:00:00'  # 最新一条 topic 的创建时间
+    text_size: int = 500  # 每条 topic 正文的字符数
+    images_per_topic: int = 1
+    files_per_topic: int = 0
+    image_size: int = 100 * 1024  # 图片大小（字节）
+    file_size: int = 1024 * 1024  # 文件大小（字节）
+    api_latency: float = 0.0  # topics / download_url 接口的响应延迟（秒）
+    cdn_latency: float = 0.0  # 图片/文件的首字节延迟（秒）
+    error_rate: float = 0.0  # 随机返回 503 的比例（所有接口）
+    seed: int = 0  # 错误注入的随机种子
+
+
+class MockData:
+    """按 MockConfig 生成的 topics，从新到旧排列"""
+
+    def __init__(self, config):
+        self.config = config
+        latest = datetime.strptime(config.latest, TIME_FORMAT)
+        self.create_times = []
+        for i in range(config.topics):
+            t = latest - timedelta(minutes=config.interval_minutes * i)
+            # 毫秒部分各不相同且不为 0；需要覆盖整秒边界时可直接修改 create_times
+            self.create_times.append('{}.{:03d}{}'.format(t.strftime(TIME_FORMAT), 500 + i % 500, TIME_SUFFIX))
+        self.added = 0  # prepend() 插入的 topics 数
+        self._blobs = {}
+        self._lock = threading.Lock()
+
+    def prepend(self, count):
+        """在最前面插入 count 条更新的 topics（模拟轮询之间发布的新帖），已有 topics 的 topic_id 不变"""
+        latest = datetime.strptime(self.create_times[0][:19], TIME_FORMAT)
+        for n in range(1, count + 1):
+            t = latest + timedelta(minutes=self.config.interval_minutes * n)
+            self.create_times.insert(0, '{}.{:03d}{}'.format(t.strftime(TIME_FORMAT), 500 - n % 500, TIME_SUFFIX))
+        self.added += count
+
+    def time_range(self):
+        """按天对齐、覆盖全部 topics 的 (start_time, end_time)，格式与 parse_time_arg 的结果一致"""
+        if not self.create_times:
+            return '', ''
+        last_day = datetime.strptime(self.create_times[0][:10], '%Y-%m-%d') + timedelta(days=1)
+        return ('{}T00:00:00.000{}'.format(self.create_times[-1][:10], TIME_SUFFIX),
+                '{}T00:00:00.000{}'.format(last_day.strftime('%Y-%m-%d'), TIME_SUFFIX))
+
+    def page(self, end_time, count):
+        """返回 create_time <= end_time 的前 count 条 topics 的下标"""
+        # create_times 从新到旧排列，二分查找第一条不晚于 end_time 的位置
+        lo, hi = 0, len(self.create_times)
+        if end_time:
+            while lo < hi:
+                mid = (lo + hi) // 2
+                if self.create_times[mid] > end_time:
+                    lo = mid + 1
+                else:
+                    hi = mid
+        return range(lo, min(lo + count, len(self.create_times)))
+
+    def topic(self, i, base_url):
+        config = self.config
+        topic_id = 10000000 + i - self.added
+        text = ('第 {} 条 mock topic。'.format(i) * (config.text_size // 10 + 1))[:config.text_size]
+        images = [{'image_id': topic_id * 100 + n, 'type': 'jpg',
+                   'original': {'url': '{}/blobs/images/{}'.format(base_url, topic_id * 100 + n)}}
+                  for n in range(config.images_per_topic)]
+        files = [{'file_id': topic_id * 100 + n, 'name': 'mock_{}_{}.pdf'.format(i, n), 'size': config.file_size}
+                 for n in range(config.files_per_topic)]
+        owner = {'user_id': 100 + i % 20, 'name': '用户{}'.format(i % 20)}
+        topic = {'topic_id': topic_id, 'create_time': self.create_times[i]}
+        if i % 4 == 3:
+            topic['type'] = 'q&a'
+            topic['question'] = {'owner': owner, 'text': text, 'images': images}
+            topic['answer'] = {'owner': {'user_id': 1, 'name': '星主'}, 'text': text[:config.text_size // 2],
+                               'files': files}
+        else:
+            topic['type'] = 'talk'
+            topic['talk'] = {'owner': owner, 'text': text, 'images': images, 'files': files}
+        return topic
+
+    def blob(self, size):
+        """大小为 size 的确定性内容（按大小缓存）"""
+        with self._lock:
+            data = self._blobs.get(size)
+            if data is None:
+                data = self._blobs[size] = (bytes(range(256)) * (size // 256 + 1))[:size]
+            return data
+
+
+class MockHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'  # 支持 keep-alive，与真实服务一致地复用连接
+    # 响应头与正文分两次写出，开启 Nagle 时会与客户端的延迟 ACK 叠加出约 40ms 的额外延迟
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        server = self.server
+        url = urlparse(self.path)
+        parts = url.path.strip('/').split('/')
+        server.count_request()
+        if server.should_fail():
+            self._send(503, b'')
+            return
+        if len(parts) == 4 and parts[:2] == ['v2', 'groups'] and parts[3] == 'topics':
+            self._topics(parse_qs(url.query))
+        elif len(parts) == 4 and parts[:2] == ['v2', 'files'] and parts[3] == 'download_url':
+            self._download_url(parts[2])
+        elif len(parts) == 3 and parts[0] == 'blobs' and parts[1] in ('images', 'files'):
+            self._blob(parts[1])
+        else:
+            self._send(404, b'')
+
+    def _send(self, status, body, content_type='application/octet-stream', headers=None):
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        if body:
+            self.wfile.write(body)
+
+    def _send_json(self, data):
+        self._send(200, json.dumps(data, ensure_ascii=False).encode('utf-8'), 'application/json; charset=utf-8')
+
+    def _topics(self, query):
+        server = self.server
+        time.sleep(server.config.api_latency)
+        end_time = query.get('end_time', [''])[0]
+        count = int(query.get('count', ['20'])[0])
+        topics = [server.data.topic(i, server.base_url) for i in server.data.page(end_time, count)]
+        self._send_json({'succeeded': True, 'resp_data': {'topics': topics}})
+
+    def _download_url(self, file_id):
+        server = self.server
+        time.sleep(server.config.api_latency)
+        self._send_json({'succeeded': True,
+                         'resp_data': {'download_url': '{}/blobs/files/{}'.format(server.base_url, file_id)}})
+
+    def _blob(self, kind):
+        server = self.server
+        time.sleep(server.config.cdn_latency)
+        size = server.config.image_size if kind == 'images' else server.config.file_size
+        body = server.data.blob(size)
+        # 支持 Range 续传
+        offset = 0
+        header = self.headers.get('Range', '')
+        if header.startswith('bytes='):
+            offset = int(header[len('bytes='):].split('-')[0] or 0)
+        if offset >= size > 0:
+            self._send(416, b'', headers={'Content-Range': 'bytes */{}'.format(size)})
+        elif offset:
+            self._send(206, body[offset:],
+                       headers={'Content-Range': 'bytes {}-{}/{}'.format(offset, size - 1, size)})
+        else:
+            self._send(200, body)
+
+
+class MockServer(ThreadingHTTPServer):
+    """在后台线程中运行的 mock API 服务器"""
+
+    daemon_threads = True
+
+    def __init__(self, config=None, host='127.0.0.1', port=0):
+        super().__init__((host, port), MockHandler)
+        self.config = config or MockConfig()
+        self.data = MockData(self.config)
+        self.base_url = 'http://{}:{}'.format(*self.server_address[:2])
+        self.requests = 0
+        self._lock = threading.Lock()
+        self._random = random.Random(self.config.seed)
+        self._thread = None
+
+    def count_request(self):
+        with self._lock:
+            self.requests += 1
+
+    def should_fail(self):
+        if self.config.error_rate <= 0:
+            return False
+        with self._lock:
+            return self._random.random() < self.config.error_rate
+
+    def start(self):
+        """启动后台线程并返回 API 地址（可直接作为 ScraperConfig.api_base）"""
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self._thread.start()
+        return self.base_url
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+
+def add_mock_arguments(parser):
+    """向 argparse 添加 MockConfig 的参数（mock_server.py 与 benchmark.py 共用）"""
+    defaults = MockConfig()
+    parser.add_argument('--topics', type=int, default=defaults.topics, help='topics 总数')
+    parser.add_argument('--interval-minutes', type=int, default=defaults.interval_minutes,
+                        help='相邻 topics 的时间间隔（分钟）')
+    parser.add_argument('--text-size', type=int, default=defaults.text_size, help='每条 topic 正文的字符数')
+    parser.add_argument('--images-per-topic', type=int, default=defaults.images_per_topic)
+    parser.add_argument('--files-per-topic', type=int, default=defaults.files_per_topic)
+    parser.add_argument('--image-size', type=int, default=defaults.image_size, help='图片大小（字节）')
+    parser.add_argument('--file-size', type=int, default=defaults.file_size, help='文件大小（字节）')
+    parser.add_argument('--api-latency', type=float, default=defaults.api_latency, help='API 响应延迟（秒）')
+    parser.add_argument('--cdn-latency', type=float, default=defaults.cdn_latency, help='图片/文件首字节延迟（秒）')
+    parser.add_argument('--error-rate', type=float, default=defaults.error_rate, help='随机返回 503 的比例')
+    parser.add_argument('--seed', type=int, default=defaults.seed, help='错误注入的随机种子')
+
+
+def mock_config_from_args(args):
+    return MockConfig(topics=args.topics, interval_minutes=args.interval_minutes, text_size=args.text_size,
+                      images_per_topic=args.images_per_topic, files_per_topic=args.files_per_topic,
+                      image_size=args.image_size, file_size=args.file_size, api_latency=args.api_latency,
+                      cdn_latency=args.cdn_latency, error_rate=args.error_rate, seed=args.seed)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='本地 mock 知识星球 API（配合 main.py --api-base 使用）')
+    parser.add_argument('--host', type=str, default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8000)
+    add_mock_arguments(parser)
+    args = parser.parse_args()
+
+    server = MockServer(mock_config_from_args(args), args.host, args.port)
+    start_time, end_time = server.data.time_range()
+    print('mock API 已启动: {}'.format(server.base_url))
+    print('数据范围: {} ~ {}（共 {} 条 topics）'.format(start_time, end_time, args.topics))
+    print('示例: python main.py --api-base {} --start-time {} --end-time {}'.format(
+        server.base_url, start_time[:10], end_time[:10]))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
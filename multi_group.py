@@ -0,0 +1,193 @@
+"""
+多星球爬取
+在一个进程中爬取 config.groups 中的多个星球：所有星球共用一个连接池、一套限速与重试、一组指标，
+以及翻页与媒体下载的工作线程；这些阶段的队列为 FairQueue，每个星球一条车道，按权重轮转出队，
+大星球积压再多也不会饿死小星球。渲染、写入与下载链接解析是单线程阶段，且会阻塞等待下游车道，
+每个星球各有一个线程，大星球的媒体车道排满时只有它自己的写入等待。
+每个星球的日文件、去重索引、断点等写入 output_dir/<星球ID>
+"""
+import os
+import threading
+from dataclasses import replace
+
+from scraper import SHARED_QUEUES, Scraper, parse_group
+from workers import FairQueue, STOP_ABORT
+
+
+class QueueTotal:
+    """多个队列的合计长度，用于报告各星球渲染/写入/下载链接解析队列的总积压"""
+
+    def __init__(self, queues):
+        self.queues = queues
+
+    def qsize(self):
+        return sum(q.qsize() for q in self.queues)
+
+
+class MultiGroupScraper(Scraper):
+    """多星球爬取器，回调参数与 Scraper 相同；on_progress 报告的是所有星球的合计
+
+    group_overrides 为 {星球ID: {ScraperConfig 字段: 值}}，用于各星球不同的设置（如 watch 模式的起始时间）
+    """
+
+    def __init__(self, config, group_overrides=None, **kwargs):
+        self.groups = []  # [(星球ID, 权重)]
+        for spec in config.groups:
+            group, weight = parse_group(spec)
+            if group not in dict(self.groups):
+                self.groups.append((group, weight))
+        super().__init__(config, **kwargs)
+        self._lock = threading.Lock()
+        self._group_counts = {}  # 星球ID -> {类别: 数量}
+        self.results = {}  # 星球ID -> (是否成功, 消息)
+        self.scrapers = {}
+        for group, weight in self.groups:
+            for name in SHARED_QUEUES:
+                getattr(self, name).set_weight(group, weight)
+            group_config = replace(config, group=group, groups=[],
+                                   output_dir=os.path.join(config.output_dir, group),
+                                   metrics_file='', profile=False)
+            group_config = replace(group_config, **(group_overrides or {}).get(group, {}))
+            self.scrapers[group] = Scraper(
+                group_config,
+                on_progress=lambda kind, count, group=group: self._group_progress(group, kind, count),
+                on_finished=lambda success, msg, group=group: self._group_finished(group, success, msg),
+                on_duplicate=self.on_duplicate,
+                on_file_exists=self.on_file_exists,
+                parent=self)
+        for name in ('render_q', 'write_q', 'file_q'):
+            setattr(self, name, QueueTotal([getattr(scraper, name) for scraper in self.scrapers.values()]))
+
+    def _pool_size(self):
+        # 每个星球 shards 个翻页线程，下载与链接解析线程各星球共用
+        return super()._pool_size() + max(1, self.config.shards) * (len(self.groups) - 1)
+
+    def _create_queues(self):
+        # 渲染/写入/下载链接解析的队列属于各星球，创建各星球的爬取器后换成合计长度
+        config = self.config
+        self.topic_q = FairQueue()
+        self.image_q = FairQueue(max(1, config.media_queue_size))
+        self.download_q = FairQueue(max(4, 4 * self.file_limiter.maximum))
+        self.render_q = self.write_q = self.file_q = None
+
+    def _stage_handler(self, method):
+        """共用队列的线程取出的任务为 (星球ID, 任务)，交给对应星球的爬取器处理"""
+        def handler(job):
+            group, item = job
+            getattr(self.scrapers[group], method)(item)
+        return handler
+
+    def _start_serial_stages(self, suffix=''):
+        for group, scraper in self.scrapers.items():
+            scraper._start_serial_stages('[{}]'.format(group))
+
+    def _join_serial_stages(self, names):
+        # 先通知所有星球的线程退出再逐个等待，各星球同时收尾
+        for name in names:
+            for group in self.scrapers:
+                self.workers.close(name + '[{}]'.format(group))
+            for group in self.scrapers:
+                self.workers.join(name + '[{}]'.format(group))
+
+    def _group_progress(self, group, kind, count):
+        with self._lock:
+            counts = self._group_counts.setdefault(group, {})
+            counts[kind] = count
+            total = sum(c.get(kind, 0) for c in self._group_counts.values())
+            if kind == 'topics':
+                self._topic_count = total
+            elif kind == 'images':
+                self._image_count = total
+            elif kind == 'files':
+                self._file_count = total
+        self.on_progress(kind, total)
+
+    def _group_finished(self, group, success, msg):
+        with self._lock:
+            self.results[group] = (success, msg)
+
+    # ---- 主入口 ----
+
+    def _log_start(self):
+        self.log('===== 开始爬取 {} 个星球 ====='.format(len(self.groups)))
+        self.log('星球: {}'.format(', '.join('{}(权重 {})'.format(group, weight) for group, weight in self.groups)))
+        if self.config.engine != 'thread':
+            self.log('⚠️ 多星球模式使用多线程引擎，已忽略 engine={}'.format(self.config.engine))
+        self.ensure_dir(self.config.output_dir)
+
+    def _open_stores(self):
+        # 各星球的存储由各自的爬取器打开，这里只启动共用的指标输出
+        if self.metrics_exporter is not None:
+            self.metrics_exporter.start()
+            self.log('运行指标: {}（每 {} 秒更新）'.format(self.metrics_exporter.path, self.metrics_exporter.interval))
+
+    def _close_stores(self):
+        for scraper in self.scrapers.values():
+            scraper._close_stores()
+        if self.metrics_exporter is not None:
+            self.metrics_exporter.close()
+
+    def _save_checkpoint_quietly(self):
+        for scraper in self.scrapers.values():
+            scraper._save_checkpoint_quietly()
+
+    def stop(self, mode=STOP_ABORT):
+        super().stop(mode)
+        if self.is_stopped:
+            for scraper in self.scrapers.values():
+                scraper.writer.flush()
+
+    def _run(self):
+        try:
+            self._log_start()
+            self._open_stores()
+            windows = {}
+            for group, scraper in self.scrapers.items():
+                scraper._log_start()
+                scraper._open_stores()
+                windows[group] = scraper._prepare_windows()
+
+            self._start_stages(sum(len(w) for w in windows.values()))
+            for group, scraper in self.scrapers.items():
+                scraper._enqueue_start(windows[group])
+            self._join_stages()
+
+            self._report_queue_depths()
+            for scraper in self.scrapers.values():
+                scraper._report_finished()
+            self._report_finished()
+
+        except Exception as e:
+            self.events.error('❌ 爬取出错: {error}', error=e, exc_info=True)
+            self._save_checkpoint_quietly()
+            self.workers.abort()
+            self.on_finished(False, str(e))
+        finally:
+            self._close_stores()
+            self.session.close()
+
+    def _report_finished(self):
+        failed = [(group, msg) for group, (success, msg) in self.results.items() if not success]
+        summary = '共爬取 {} 条 topics, {} 张图片, {} 个文件'.format(
+            self._topic_count, self._image_count, self._file_count)
+        if not failed:
+            self.log('{} 个星球全部完成！{}'.format(len(self.groups), summary))
+            self.on_finished(True, '完成！{} 个星球{}'.format(len(self.groups), summary))
+            return
+        for group, msg in failed:
+            self.log('⚠️ 星球 {} 未完成: {}'.format(group, msg))
+        self.on_finished(False, '{} 个星球未完成（{}），{}'.format(
+            len(failed), ', '.join(group for group, _ in failed), summary))
+
+    def progress_snapshot(self):
+        """所有星球的合计进度；覆盖比例取各星球的平均值，预计剩余时间取最慢的星球"""
+        snapshots = [scraper.progress_snapshot() for scraper in self.scrapers.values()]
+        status = super().progress_snapshot()
+        coverages = [s['coverage'] for s in snapshots if s['coverage'] is not None]
+        status['coverage'] = sum(coverages) / len(coverages) if coverages else None
+        status['pending_media'] = sum(s['pending_media'] for s in snapshots)
+        etas = [s['eta'] for s in snapshots]
+        status['eta'] = None if not etas or None in etas else max(etas)
+        status['groups'] = {group: {'coverage': s['coverage'], 'topics': s['topics'], 'eta': s['eta']}
+                            for group, s in zip(self.scrapers, snapshots)}
+        return status
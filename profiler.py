@@ -0,0 +1,143 @@
+"""
+性能剖析模式（ScraperConfig.profile / main.py --profile）
+用 cProfile 分别记录主线程和各阶段工作线程，用 tracemalloc 记录内存分配，
+结束时在 output_dir/profile 下写出：
+    main.prof / <阶段>.prof / all.prof  cProfile 数据（可用 snakeviz、pstats 查看）
+    profile_top.txt                     all.prof 按累计耗时排序的前若干个函数
+    alloc_top.txt                       内存分配最多的代码行，以及运行前后的增量
+    stages.txt                          各阶段（翻页、JSON 解析、过滤、渲染、写入、下载、日志等）的墙钟耗时
+"""
+import cProfile
+import io
+import os
+import pstats
+import threading
+import tracemalloc
+
+# 报告中列出的条目数
+TOP_FUNCTIONS = 40
+TOP_ALLOCATIONS = 30
+# tracemalloc 记录的调用栈深度，越深越慢
+TRACE_FRAMES = 1
+
+
+class RunProfiler:
+    """收集一次爬取的 cProfile、tracemalloc 与阶段耗时数据"""
+
+    DIRNAME = 'profile'
+
+    def __init__(self, output_dir, on_log=None):
+        self.dir = os.path.join(output_dir, self.DIRNAME)
+        self.on_log = on_log or (lambda msg: None)
+        self._lock = threading.Lock()
+        self._profiles = {}  # 名称 -> [cProfile.Profile]
+        self._baseline = None
+
+    def _add(self, name, profile):
+        with self._lock:
+            self._profiles.setdefault(name, []).append(profile)
+
+    def call(self, name, func, *args, **kwargs):
+        """在当前线程中以 cProfile 运行 func，数据归入 name"""
+        profile = cProfile.Profile()
+        try:
+            profile.enable()
+        except ValueError:
+            # Python 3.12+ 的 cProfile 基于 sys.monitoring，同一时间只能启用一个，
+            # 且会同时记录所有线程，主线程的 profile 已经包含该线程的数据
+            return func(*args, **kwargs)
+        try:
+            return func(*args, **kwargs)
+        finally:
+            profile.disable()
+            self._add(name, profile)
+
+    def wrap(self, name, func):
+        """返回在 cProfile 下运行 func 的函数，用作工作线程的 target"""
+        def wrapper(*args, **kwargs):
+            return self.call(name, func, *args, **kwargs)
+        return wrapper
+
+    def start(self):
+        tracemalloc.start(TRACE_FRAMES)
+        self._baseline = tracemalloc.take_snapshot()
+        self.on_log('性能剖析已开启，结果将写入: {}'.format(self.dir))
+
+    def finish(self, snapshot):
+        """停止 tracemalloc 并写出全部报告；snapshot 为 Scraper.metrics_snapshot() 的结果"""
+        try:
+            os.makedirs(self.dir, exist_ok=True)
+            self._write_allocations()
+            self._write_profiles()
+            self._write_stages(snapshot)
+            self.on_log('性能剖析结果已保存: {}'.format(self.dir))
+        except Exception as e:
+            self.on_log('❌ 写入性能剖析结果失败: {}'.format(e))
+        finally:
+            if tracemalloc.is_tracing():
+                tracemalloc.stop()
+
+    def _path(self, filename):
+        return os.path.join(self.dir, filename)
+
+    def _write_profiles(self):
+        with self._lock:
+            profiles = {name: list(items) for name, items in self._profiles.items()}
+        combined = None
+        for name, items in sorted(profiles.items()):
+            stats = pstats.Stats(*items)
+            stats.dump_stats(self._path('{}.prof'.format(name)))
+            if combined is None:
+                combined = pstats.Stats(*items)
+            else:
+                combined.add(*items)
+        if combined is None:
+            return
+        combined.dump_stats(self._path('all.prof'))
+        buffer = io.StringIO()
+        combined.stream = buffer
+        combined.sort_stats('cumulative').print_stats(TOP_FUNCTIONS)
+        with open(self._path('profile_top.txt'), 'w', encoding='utf-8') as f:
+            f.write(buffer.getvalue())
+
+    def _write_allocations(self):
+        if not tracemalloc.is_tracing():
+            return
+        current, peak = tracemalloc.get_traced_memory()
+        snapshot = tracemalloc.take_snapshot().filter_traces((
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, '<frozen importlib._bootstrap>'),
+            tracemalloc.Filter(False, '<frozen importlib._bootstrap_external>'),
+        ))
+        lines = ['当前已分配: {:.1f} MB, 峰值: {:.1f} MB'.format(current / 1024 / 1024, peak / 1024 / 1024), '',
+                 '== 分配最多的代码行（结束时仍存活）==']
+        lines.extend(str(stat) for stat in snapshot.statistics('lineno')[:TOP_ALLOCATIONS])
+        if self._baseline is not None:
+            lines.extend(['', '== 相对开始时的增量 =='])
+            lines.extend(str(stat) for stat in snapshot.compare_to(self._baseline, 'lineno')[:TOP_ALLOCATIONS])
+        with open(self._path('alloc_top.txt'), 'w', encoding='utf-8') as f:
+            f.write('\n'.join(lines) + '\n')
+
+    def _write_stages(self, snapshot):
+        metrics = snapshot['metrics']
+        rows = []
+
+        def add_rows(metric_name, label, prefix):
+            for sample in metrics.get(metric_name, {}).get('samples', []):
+                value = sample['value']
+                rows.append(('{}{}'.format(prefix, sample['labels'].get(label, '')), value['count'], value['sum']))
+
+        add_rows('zsxq_stage_seconds', 'stage', '')
+        add_rows('zsxq_request_seconds', 'endpoint', 'request:')
+        add_rows('zsxq_download_seconds', 'kind', 'download:')
+        for sample in metrics.get('zsxq_disk_write_seconds_total', {}).get('samples', []):
+            rows.append(('disk:{}'.format(sample['labels'].get('kind', '')), None, sample['value']))
+
+        lines = ['运行时长: {:.2f} 秒'.format(snapshot['uptime_seconds']),
+                 '多线程运行时各阶段耗时互相重叠，合计可能超过运行时长', '',
+                 '{:<24}{:>10}{:>12}{:>12}'.format('阶段', '次数', '合计(秒)', '平均(毫秒)')]
+        for name, count, total in sorted(rows, key=lambda row: row[2], reverse=True):
+            mean = '{:.2f}'.format(total / count * 1000) if count else '-'
+            lines.append('{:<24}{:>10}{:>12.3f}{:>12}'.format(name, '-' if count is None else count, total, mean))
+        with open(self._path('stages.txt'), 'w', encoding='utf-8') as f:
+            f.write('\n'.join(lines) + '\n')
@@ -0,0 +1,87 @@
+"""
+爬取进度估算
+翻页从 end_time 向 start_time 倒序进行，各分片当前游标到下界的距离即剩余的时间范围，
+据此得到覆盖比例；速率取最近一段时间的滑动窗口，ETA 按覆盖进度与媒体积压分别估算后取较大者
+"""
+import threading
+import time
+from collections import deque
+from datetime import datetime
+
+# 计算速率的滑动窗口（秒）
+RATE_WINDOW = 10.0
+
+
+def parse_api_time(value):
+    """解析 API 时间 'YYYY-MM-DDTHH:MM:SS.mmm+0800'（忽略时区，所有时间同为 +0800）"""
+    return datetime.strptime(value[:23], '%Y-%m-%dT%H:%M:%S.%f')
+
+
+def coverage(windows, start_time, end_time, now=None):
+    """返回已覆盖的时间范围比例（0~1），无起始时间时无法估算，返回 None
+
+    windows 为尚未翻页完毕的 [(游标 end_time, 下界 start_time)]，游标为 None 表示从最新开始
+    """
+    if not start_time:
+        return None
+    start = parse_api_time(start_time)
+    end = parse_api_time(end_time) if end_time else (now or datetime.now())
+    total = (end - start).total_seconds()
+    if total <= 0:
+        return None
+    remaining = 0.0
+    for cursor, lower in windows:
+        upper = min(end, parse_api_time(cursor)) if cursor else end
+        lower = max(start, parse_api_time(lower)) if lower else start
+        remaining += max(0.0, (upper - lower).total_seconds())
+    return min(1.0, max(0.0, 1.0 - remaining / total))
+
+
+class RateMeter:
+    """多个累计计数在最近 window 秒内的平均速率"""
+
+    def __init__(self, window=RATE_WINDOW):
+        self.window = window
+        self._samples = deque()  # (时间, {名称: 累计值})
+        self._lock = threading.Lock()
+
+    def update(self, values, now=None):
+        """记录一次累计值，返回 {名称: 每秒增量}"""
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            self._samples.append((now, dict(values)))
+            while len(self._samples) > 2 and now - self._samples[1][0] >= self.window:
+                self._samples.popleft()
+            first_time, first = self._samples[0]
+        elapsed = now - first_time
+        if elapsed <= 0:
+            return {name: 0.0 for name in values}
+        return {name: (value - first.get(name, 0)) / elapsed for name, value in values.items()}
+
+
+def format_duration(seconds):
+    if seconds is None:
+        return '--'
+    seconds = int(seconds)
+    if seconds >= 3600:
+        return '{}小时{}分'.format(seconds // 3600, seconds % 3600 // 60)
+    if seconds >= 60:
+        return '{}分{}秒'.format(seconds // 60, seconds % 60)
+    return '{}秒'.format(seconds)
+
+
+def format_status(status, queue_names=None):
+    """把 Scraper.progress_snapshot() 的结果格式化为一行状态文本"""
+    queue_names = queue_names or {}
+    parts = []
+    if status['coverage'] is not None:
+        parts.append('进度 {:.1f}%'.format(status['coverage'] * 100))
+    parts.append('topics {} ({:.1f}/s)'.format(status['topics'], status['topics_per_sec']))
+    parts.append('图片 {} / 文件 {}'.format(status['images'], status['files']))
+    parts.append('下载 {:.2f} MB/s'.format(status['mb_per_sec']))
+    backlog = ' '.join('{} {}'.format(queue_names.get(name, name), depth)
+                       for name, depth in status['queues'].items() if depth)
+    if backlog:
+        parts.append('队列 ' + backlog)
+    parts.append('剩余 ' + format_duration(status['eta']))
+    return ' | '.join(parts)
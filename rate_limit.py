@@ -0,0 +1,171 @@
+"""
+请求调度：按接口类别的令牌桶限速 + 指数退避重试（带随机抖动）
+所有工作线程共享同一个 RequestScheduler
+"""
+import random
+import threading
+import time
+
+import requests
+
+from events import EventLogger
+from metrics import MetricsRegistry
+
+# 接口类别：topics 翻页、文件下载链接、图片/文件 CDN
+ENDPOINTS = ('topics', 'download_url', 'cdn')
+# 需要退避重试的状态码
+RETRY_STATUS = (429, 500, 502, 503, 504)
+# 令牌桶等待超过该秒数时在日志中提示
+THROTTLE_LOG_THRESHOLD = 1.0
+
+
+class RequestFailed(Exception):
+    """重试次数用尽后仍未成功"""
+
+
+class TokenBucket:
+    """线程安全的令牌桶，rate <= 0 表示不限速"""
+
+    def __init__(self, rate, burst=None):
+        self.rate = rate
+        self.capacity = burst if burst is not None else max(1.0, rate)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self):
+        """预订一个令牌，返回需要等待的秒数（不阻塞，可用于协程）"""
+        if self.rate <= 0:
+            return 0.0
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            self._tokens -= 1
+            if self._tokens >= 0:
+                return 0.0
+            return -self._tokens / self.rate
+
+
+class RequestScheduler:
+    """集中处理限速与重试的请求调度器"""
+
+    def __init__(self, session, rates, max_attempts=8, base_delay=1.0, max_delay=60.0,
+                 events=None, stop_event=None, metrics=None):
+        self.session = session
+        self.buckets = {endpoint: TokenBucket(rates.get(endpoint, 0)) for endpoint in ENDPOINTS}
+        self.max_attempts = max(1, max_attempts)
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        # 结构化日志（events.EventLogger），未指定时不输出
+        self.events = events or EventLogger(lambda event: None, 'error')
+        self.stop_event = stop_event or threading.Event()
+        # 两种引擎共用的请求指标，按接口类别（endpoint）区分
+        metrics = metrics or MetricsRegistry()
+        self.latency = metrics.histogram('zsxq_request_seconds', '请求发出到收到响应头的耗时（秒）')
+        self.responses = metrics.counter('zsxq_responses_total', '按状态码统计的响应数')
+        self.errors = metrics.counter('zsxq_request_errors_total', '网络错误（连接失败、超时等）次数')
+        self.retries = metrics.counter('zsxq_retries_total', '退避重试次数')
+        self.throttled = metrics.counter('zsxq_throttle_seconds_total', '令牌桶限速累计等待时间（秒）')
+        self.stage_seconds = metrics.histogram('zsxq_stage_seconds', '各阶段单次处理的耗时（秒）')
+
+    def backoff_delay(self, attempt, retry_after=None):
+        """第 attempt 次失败后的等待秒数：指数增长、封顶，并乘以 [0.5, 1) 的随机抖动"""
+        if retry_after is not None:
+            return min(self.max_delay, retry_after)
+        delay = min(self.max_delay, self.base_delay * (2 ** (attempt - 1)))
+        return delay * random.uniform(0.5, 1.0)
+
+    @staticmethod
+    def retry_after(response):
+        try:
+            return float(response.headers.get('Retry-After'))
+        except (TypeError, ValueError):
+            return None
+
+    def throttle_delay(self, endpoint):
+        """预订令牌并返回需等待的秒数，等待较长时记录日志"""
+        delay = self.buckets[endpoint].reserve()
+        if delay > 0:
+            self.throttled.inc(delay, endpoint=endpoint)
+        if delay >= THROTTLE_LOG_THRESHOLD:
+            self.events.info('⏳ {endpoint} 限速等待 {delay:.1f} 秒', endpoint=endpoint, delay=delay)
+        return delay
+
+    def record_response(self, endpoint, status, latency):
+        self.latency.observe(latency, endpoint=endpoint)
+        self.responses.inc(endpoint=endpoint, status=status)
+
+    def record_error(self, endpoint):
+        self.errors.inc(endpoint=endpoint)
+
+    def log_retry(self, endpoint, attempt, reason, delay):
+        self.retries.inc(endpoint=endpoint)
+        self.events.warn('⚠️ {endpoint} 请求失败（{reason}），{delay:.1f} 秒后重试 [{attempt}/{max_attempts}]',
+                         endpoint=endpoint, reason=reason, delay=delay, attempt=attempt,
+                         max_attempts=self.max_attempts)
+
+    def _sleep(self, seconds):
+        """可被停止信号打断的等待，被打断时返回 False"""
+        return not self.stop_event.wait(seconds)
+
+    def _attempt(self, endpoint, url, observe, kwargs):
+        """发送一次请求，返回 (response, 失败原因, Retry-After)；需要重试时 response 为 None"""
+        if not self._sleep(self.throttle_delay(endpoint)):
+            raise RequestFailed('已停止')
+        start = time.monotonic()
+        try:
+            response = self.session.get(url, **kwargs)
+        except requests.RequestException as e:
+            self.record_error(endpoint)
+            return None, str(e), None
+        latency = time.monotonic() - start
+        self.record_response(endpoint, response.status_code, latency)
+        if observe is not None:
+            observe(response.status_code, latency)
+        if response.status_code in RETRY_STATUS:
+            response.close()
+            return None, 'HTTP {}'.format(response.status_code), self.retry_after(response)
+        return response, None, None
+
+    def _retry(self, endpoint, attempt, reason, retry_after=None, cancel=None):
+        """记录失败并等待退避时间；重试次数用尽或被停止时抛出 RequestFailed
+
+        cancel 为可选的 threading.Event，被设置后不再重试（用于停止翻页但不中断其他请求）
+        """
+        if attempt == self.max_attempts:
+            raise RequestFailed('{}，已重试 {} 次'.format(reason, self.max_attempts))
+        if cancel is not None and cancel.is_set():
+            raise RequestFailed('已停止')
+        delay = self.backoff_delay(attempt, retry_after)
+        self.log_retry(endpoint, attempt, reason, delay)
+        if not self._sleep(delay):
+            raise RequestFailed('已停止')
+
+    def get(self, endpoint, url, observe=None, **kwargs):
+        """发送 GET 请求，网络错误和 429/5xx 会按退避策略重试
+
+        observe(status, latency) 在每次收到响应头时回调；重试用尽时抛出 RequestFailed
+        """
+        for attempt in range(1, self.max_attempts + 1):
+            response, reason, retry_after = self._attempt(endpoint, url, observe, kwargs)
+            if response is not None:
+                return response
+            self._retry(endpoint, attempt, reason, retry_after)
+
+    def get_json(self, endpoint, url, cancel=None, **kwargs):
+        """请求 API 并返回 succeeded 为真的 JSON；JSON 解析失败或 succeeded 为假同样退避重试"""
+        for attempt in range(1, self.max_attempts + 1):
+            r, reason, retry_after = self._attempt(endpoint, url, None, kwargs)
+            if r is not None:
+                self.events.debug('请求: {url} [状态码:{status}]', url=r.url, status=r.status_code)
+                try:
+                    with self.stage_seconds.time(stage='json'):
+                        d = r.json()
+                except ValueError as e:
+                    reason = '解析JSON失败: {}, 响应内容: {}'.format(e, r.text[:500])
+                else:
+                    if d.get('succeeded'):
+                        return d
+                    reason = '接口返回失败: {}'.format(d)
+            self._retry(endpoint, attempt, reason, retry_after, cancel)
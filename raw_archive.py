@@ -0,0 +1,147 @@
+"""
+原始 API 响应归档
+把每页 topics 的原始 JSON 按月追加到 output_dir/raw/YYYY-MM.ndjson.gz（NDJSON，gzip 压缩），
+输出格式变化时可离线重新生成，无需重新爬取。
+每次写入是一个独立的 gzip member，index.tsv 记录 "topic_id<TAB>create_time<TAB>月份<TAB>member 偏移"，
+按 topic_id 或时间读取时可直接定位到 member，不必解压整个文件
+"""
+import gzip
+import json
+import os
+import threading
+import zlib
+from collections import OrderedDict
+
+
+class RawArchive:
+    """按月分区、只追加的 topics 原始数据归档"""
+
+    DIRNAME = 'raw'
+    INDEX_FILENAME = 'index.tsv'
+
+    def __init__(self, output_dir):
+        self.dir = os.path.join(output_dir, self.DIRNAME)
+        self.index_path = os.path.join(self.dir, self.INDEX_FILENAME)
+        self._lock = threading.Lock()
+        self._index = {}  # topic_id -> (create_time, 月份, member 偏移)
+        self._index_file = None
+
+    def month_path(self, month):
+        return os.path.join(self.dir, '{}.ndjson.gz'.format(month))
+
+    @staticmethod
+    def topic_month(create_time):
+        return create_time[:7]
+
+    def load(self, readonly=False):
+        """载入索引，返回已归档的 topic 数；非只读时同时打开追加句柄"""
+        with self._lock:
+            self._index = {}
+            if os.path.exists(self.index_path):
+                with open(self.index_path, 'r', encoding='utf-8') as f:
+                    for line in f:
+                        parts = line.rstrip('\n').split('\t')
+                        if len(parts) != 4:
+                            continue  # 崩溃时可能残留半行
+                        topic_id, create_time, month, offset = parts
+                        self._index[topic_id] = (create_time, month, int(offset))
+            if not readonly:
+                os.makedirs(self.dir, exist_ok=True)
+                self._index_file = open(self.index_path, 'a', encoding='utf-8')
+            return len(self._index)
+
+    def __contains__(self, topic_id):
+        return str(topic_id) in self._index
+
+    def __len__(self):
+        return len(self._index)
+
+    def append_page(self, topics):
+        """归档一页 topics（已归档过的 topic 跳过），返回新写入的条数
+
+        先写数据再写索引：中途崩溃最多留下未被索引的 member，不会出现指向不存在数据的索引
+        """
+        with self._lock:
+            groups = OrderedDict()
+            for topic in topics:
+                topic_id = str(topic['topic_id'])
+                if topic_id in self._index:
+                    continue
+                groups.setdefault(self.topic_month(topic.get('create_time', '')), []).append(topic)
+
+            written = 0
+            for month, month_topics in groups.items():
+                path = self.month_path(month)
+                with open(path, 'ab') as f:
+                    offset = f.tell()
+                    with gzip.GzipFile(fileobj=f, mode='wb') as gz:
+                        for topic in month_topics:
+                            gz.write((json.dumps(topic, ensure_ascii=False) + '\n').encode('utf-8'))
+                for topic in month_topics:
+                    topic_id = str(topic['topic_id'])
+                    create_time = topic.get('create_time', '')
+                    self._index[topic_id] = (create_time, month, offset)
+                    if self._index_file is not None:
+                        self._index_file.write('{}\t{}\t{}\t{}\n'.format(topic_id, create_time, month, offset))
+                written += len(month_topics)
+            if self._index_file is not None:
+                self._index_file.flush()
+            return written
+
+    def entries(self):
+        """遍历索引，产出 (topic_id, create_time, 归档文件路径, member 偏移)"""
+        for topic_id, (create_time, month, offset) in self._index.items():
+            yield topic_id, create_time, self.month_path(month), offset
+
+    def get(self, topic_id):
+        """按 topic_id 读取原始 topic，未归档时返回 None"""
+        item = self._index.get(str(topic_id))
+        if item is None:
+            return None
+        _, month, offset = item
+        for topic in self.read_member(self.month_path(month), offset):
+            if str(topic['topic_id']) == str(topic_id):
+                return topic
+        return None
+
+    def iter_topics(self, start_time=None, end_time=None):
+        """按月份和 member 顺序遍历已归档的 topics，可用 create_time 的 [start_time, end_time) 过滤
+
+        只解压索引中包含目标时间段 topics 的 member
+        """
+        members = OrderedDict()
+        for create_time, month, offset in sorted(self._index.values(), key=lambda item: (item[1], item[2])):
+            if start_time and create_time < start_time:
+                continue
+            if end_time and create_time >= end_time:
+                continue
+            members[(month, offset)] = True
+        for month, offset in members:
+            for topic in self.read_member(self.month_path(month), offset):
+                create_time = topic.get('create_time', '')
+                if start_time and create_time < start_time:
+                    continue
+                if end_time and create_time >= end_time:
+                    continue
+                yield topic
+
+    @staticmethod
+    def read_member(path, offset):
+        """解压从 offset 开始的单个 gzip member，返回其中的 topics"""
+        decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+        chunks = []
+        with open(path, 'rb') as f:
+            f.seek(offset)
+            while not decompressor.eof:
+                block = f.read(64 * 1024)
+                if not block:
+                    break
+                chunks.append(decompressor.decompress(block))
+        data = b''.join(chunks).decode('utf-8')
+        return [json.loads(line) for line in data.splitlines() if line]
+
+    def close(self):
+        with self._lock:
+            if self._index_file is not None:
+                self._index_file.close()
+                self._index_file = None
@@ -0,0 +1,97 @@
+"""
+离线重新生成 Markdown
+从 output_dir/raw 的原始数据归档重新渲染 topics/*.md，不访问网络。
+按日期拆分任务并分发到多个进程；每个日文件的内容只取决于归档数据，与进程数无关
+"""
+import os
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+
+from markdown_writer import TOPIC_SEPARATOR
+from raw_archive import RawArchive
+from scraper import Scraper
+
+
+@lru_cache(maxsize=64)
+def _load_member(path, offset):
+    # 一页 topics 通常横跨一两天，同一进程内相邻日期会重复读取同一 member
+    return tuple(RawArchive.read_member(path, offset))
+
+
+def render_day(job):
+    """渲染一个日文件，返回 (日期, topic 数)；job 为 (日期, topic_id 集合, member 列表, topics 目录)"""
+    day, topic_ids, members, topics_dir = job
+    topics = {}
+    for path, offset in members:
+        for topic in _load_member(path, offset):
+            topic_id = str(topic['topic_id'])
+            if topic_id in topic_ids:
+                topics[topic_id] = topic
+    # 与爬取时一致：按创建时间从新到旧排列
+    ordered = sorted(topics.values(), key=lambda t: (t.get('create_time', ''), t['topic_id']), reverse=True)
+    content = ''.join(Scraper.topic_to_markdown(topic) + TOPIC_SEPARATOR for topic in ordered)
+
+    path = os.path.join(topics_dir, '{}.md'.format(day))
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        f.write(content)
+    os.replace(tmp_path, path)
+    return day, len(ordered)
+
+
+def render_jobs(output_dir, start_time=None, end_time=None):
+    """根据归档索引按日期划分渲染任务，按日期从新到旧排列
+
+    start_time / end_time 只用于选择日文件：边界所在的日期整天重新渲染，
+    日文件总是整体覆盖，按时间点筛选 topics 会丢掉边界日期中范围外的内容
+    """
+    archive = RawArchive(output_dir)
+    archive.load(readonly=True)
+    topics_dir = os.path.join(output_dir, 'topics')
+    first_day = Scraper.topic_day(start_time) if start_time else None
+    last_day = Scraper.topic_day(end_time) if end_time else None
+
+    topic_ids = defaultdict(set)
+    members = defaultdict(set)
+    for topic_id, create_time, path, offset in archive.entries():
+        day = Scraper.topic_day(create_time)
+        if first_day and day < first_day:
+            continue
+        if last_day and day > last_day:
+            continue
+        topic_ids[day].add(topic_id)
+        members[day].add((path, offset))
+    return [(day, frozenset(topic_ids[day]), sorted(members[day]), topics_dir)
+            for day in sorted(topic_ids, reverse=True)]
+
+
+def render_archive(output_dir, workers=None, start_time=None, end_time=None, on_log=None):
+    """重新生成归档中出现的每个日文件（整体覆盖），返回 (日文件数, topic 数)
+
+    只有归档中存在的 topics 会被写入；开启归档前爬取的日期请勿重新渲染
+    """
+    log = on_log or (lambda msg: None)
+    jobs = render_jobs(output_dir, start_time, end_time)
+    if not jobs:
+        log('未找到原始数据归档: {}'.format(os.path.join(output_dir, RawArchive.DIRNAME)))
+        return 0, 0
+    os.makedirs(jobs[0][3], exist_ok=True)
+
+    workers = max(1, workers or os.cpu_count() or 1)
+    log('开始重新渲染 {} 个日文件（{} 个进程）'.format(len(jobs), workers))
+    total = 0
+    if workers == 1:
+        results = map(render_day, jobs)
+    else:
+        executor = ProcessPoolExecutor(max_workers=workers)
+        # 任务已按日期排好，chunksize 让相邻日期落在同一进程，复用 member 缓存
+        results = executor.map(render_day, jobs, chunksize=max(1, len(jobs) // (workers * 4)))
+    try:
+        for day, count in results:
+            total += count
+            log('已渲染 {} 条 topics 到: {}.md'.format(count, day))
+    finally:
+        if workers > 1:
+            executor.shutdown()
+    return len(jobs), total
@@ -7,11 +7,14 @@ TOMORROW=$(date -d "tomorrow" +%Y-%m-%d)
 
 mkdir ./scraper_logs
 
-# 执行爬虫
+LOG_FILE=./scraper_logs/$(date +%Y-%m-%d).jsonl
+
+# 执行爬虫（JSON Lines 日志，可用 jq 按 level 等字段筛选）
 python3 main.py \
   --start-time "$YESTERDAY" \
   --end-time "$TOMORROW" \
   --no-images \
-  --no-files >> ./scraper_logs/$(date +%Y-%m-%d).log 2>&1
+  --no-files \
+  --log-format json >> "$LOG_FILE" 2>&1
 
-echo "爬取完成，时间：$(date '+%Y-%m-%d %H:%M:%S')" >> ./scraper_logs/$(date +%Y-%m-%d).log
+echo "{\"ts\": \"$(date '+%Y-%m-%dT%H:%M:%S')\", \"level\": \"info\", \"msg\": \"爬取完成\"}" >> "$LOG_FILE"
@@ -7,16 +7,37 @@ import time
 import threading
 import requests
 import json
+import hashlib
 import logging
 import os
 import re
-import traceback
-from datetime import datetime
-from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from dataclasses import dataclass, field, replace
+from contextlib import nullcontext
 from typing import Optional, Callable
 
+from checkpoint import Checkpoint
+from concurrency import AdaptiveLimiter
+from events import EventLogger, LogEvent, logging_sink
+from metrics import MetricsRegistry, MetricsExporter
+from profiler import RunProfiler
+from progress import RateMeter, coverage
+from rate_limit import RequestScheduler, RequestFailed
+from url_cache import SignedUrlCache
+from workers import WorkerManager, CancellableAdapter, STOP_ABORT, STOP_DRAIN, STOP_MODES
+from topic_index import TopicIndex
+from markdown_writer import MarkdownWriter
+from media_manifest import MediaManifest
+from raw_archive import RawArchive
+from sqlite_store import SqliteStore
+
 logger = logging.getLogger(__name__)
 
+# 流水线各阶段的输入队列（Scraper 的属性名）
+PIPELINE_QUEUES = ('topic_q', 'render_q', 'write_q', 'image_q', 'file_q', 'download_q')
+# 多星球模式下各星球共用、按星球公平调度的队列；其余队列及其单线程阶段（渲染、写入、下载链接解析）每个星球各有一份
+SHARED_QUEUES = ('topic_q', 'image_q', 'download_q')
+
 
 @dataclass
 class ScraperConfig:
@@ -28,6 +49,45 @@ class ScraperConfig:
     enable_images: bool = False
     enable_files: bool = False
     output_dir: str = './output'
+    engine: str = 'thread'  # thread | async
+    concurrency: int = 16  # async 引擎的最大并发请求数
+    shards: int = 1  # 按时间窗口分片并行翻页的数量
+    resume: bool = False  # 从 output_dir 中的断点继续上次未完成的爬取
+    append_existing: bool = False  # 已存在的日文件直接追加、不再询问（watch 模式每轮都会写入已有的日文件）
+    # 不从断点继续时，仍把断点中未完成的图片/文件并入本次下载（watch 模式每轮重试上一轮失败的媒体）
+    retry_pending_media: bool = False
+    chunk_size: int = 64 * 1024  # 媒体流式下载时每次写入磁盘的块大小（字节）
+    image_workers: int = 2  # 图片下载线程数（自适应模式下为初始并发数）
+    file_workers: int = 1  # 文件下载线程数（自适应模式下为初始并发数）
+    adaptive_concurrency: bool = False  # 根据延迟、错误率和 429/5xx 自动调整下载并发
+    max_workers: int = 16  # 自适应模式下每类媒体的最大并发数
+    topics_rps: float = 0  # topics 接口每秒请求数上限，0 表示不限
+    download_url_rps: float = 0  # 文件下载链接接口每秒请求数上限
+    cdn_rps: float = 0  # 图片/文件 CDN 每秒请求数上限
+    max_attempts: int = 8  # 单个请求的最大尝试次数（指数退避 + 随机抖动）
+    url_ttl: int = 300  # 文件签名下载链接的缓存有效期（秒），过期后重新获取
+    archive_raw: bool = False  # 按月归档 topics 原始 JSON（output_dir/raw，gzip 压缩的 NDJSON）
+    enable_sqlite: bool = False  # 同时写入 output_dir/topics.db（SQLite + FTS5 全文索引）
+    page_queue_size: int = 8  # 渲染/写入阶段之间最多排队的页数，写盘慢时翻页随之等待
+    media_queue_size: int = 1000  # 图片/文件队列上限，下载慢时写入阶段随之等待
+    metrics_file: str = ''  # 运行指标输出文件（.json 为 JSON，否则为 Prometheus 文本），为空则不输出
+    metrics_interval: float = 15  # 运行期间写入指标文件的间隔（秒），结束时总会再写一次
+    api_base: str = 'https://api.zsxq.com'  # API 地址，基准测试时指向本地 mock_server
+    profile: bool = False  # 性能剖析：cProfile + tracemalloc + 各阶段耗时，结果写入 output_dir/profile
+    log_level: str = 'info'  # 日志级别 debug | info | warn | error，逐个请求/媒体的日志为 debug
+    log_queue_size: int = 10000  # 后台日志线程最多排队的事件数，输出跟不上时丢弃 debug/info 事件
+    # 多星球模式：['星球ID' 或 '星球ID:权重', ...]，有多个时忽略 group，各星球输出到 output_dir/<星球ID>
+    groups: list = field(default_factory=list)
+
+
+@dataclass
+class TopicPage:
+    """流水线各阶段之间传递的一页 topics"""
+    start_time: Optional[str]  # 所属分片窗口的下界
+    next_end_time: Optional[str]  # 下一页游标，None 表示该分片已结束
+    topics: list = field(default_factory=list)  # 需要保存的新 topics
+    in_range: list = field(default_factory=list)  # 时间范围内的全部 topics（归档、SQLite 与媒体任务使用）
+    entries: list = field(default_factory=list)  # 渲染结果 [(日期, Markdown)]
 
 
 class Scraper:
@@ -38,46 +98,212 @@ class Scraper:
                  on_progress: Optional[Callable[[str, int], None]] = None,
                  on_finished: Optional[Callable[[bool, str], None]] = None,
                  on_duplicate: Optional[Callable[[str], bool]] = None,
-                 on_file_exists: Optional[Callable[[str], bool]] = None):
+                 on_file_exists: Optional[Callable[[str], bool]] = None,
+                 on_event: Optional[Callable[[LogEvent], None]] = None,
+                 parent: Optional['Scraper'] = None):
         self.config = config
-        self.on_log = on_log or (lambda msg: logger.info(msg))
+        # 多星球模式（multi_group.MultiGroupScraper）下各星球的爬取器共享 parent 的连接池、限速、
+        # 指标、日志与工作线程，流水线队列为 parent 中按星球公平调度的队列的车道
+        self.parent = parent
+        self.on_log = on_log
+        # on_event(LogEvent) 接收结构化日志事件，优先于 on_log(文本)；两者都未指定时交给 logging
+        self.on_event = on_event
         self.on_progress = on_progress or (lambda msg, count: None)
-        self.on_finished = on_finished or (lambda success, msg: None)
+        on_finished = on_finished or (lambda success, msg: None)
+
+        def finished(success, msg):
+            self.events.flush()  # 先让已排队的日志输出，再通知结束
+            on_finished(success, msg)
+        self.on_finished = finished
         # on_duplicate(create_time) -> True 表示用户选择退出, False 表示跳过继续
         self.on_duplicate = on_duplicate or (lambda ct: False)
         # on_file_exists(filepath) -> True 表示覆盖, False 表示追加
         self.on_file_exists = on_file_exists or (lambda fp: False)
 
-        self.base_url = 'https://api.zsxq.com/v2/groups/{}/topics'.format(config.group)
+        self.api_base = config.api_base.rstrip('/')
+        self.base_url = '{}/v2/groups/{}/topics'.format(self.api_base, config.group)
         self.headers = {
             'cookie': config.cookies,
             'user-agent': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_5) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/86.0.4240.198 Safari/537.36'
         }
 
-        self._stop_event = threading.Event()
+        if parent is None:
+            self.image_limiter = AdaptiveLimiter('图片', config.image_workers, config.max_workers,
+                                                 config.adaptive_concurrency, self._on_limit_change)
+            self.file_limiter = AdaptiveLimiter('文件', config.file_workers, config.max_workers,
+                                                config.adaptive_concurrency, self._on_limit_change)
+            self.session = self._create_session()
+            self._stop_event = threading.Event()
+            self._drain_event = threading.Event()
+            self.metrics = MetricsRegistry()
+        else:
+            self.image_limiter = parent.image_limiter
+            self.file_limiter = parent.file_limiter
+            self.session = parent.session
+            self._adapter = parent._adapter
+            self._stop_event = parent._stop_event
+            self._drain_event = parent._drain_event
+            self.metrics = parent.metrics
+        self._stage_seconds = self.metrics.histogram('zsxq_stage_seconds', '各阶段单次处理的耗时（秒）')
+        self._items = self.metrics.counter('zsxq_items_total', '已保存的 topics / 图片 / 文件数')
+        self._downloaded_bytes = self.metrics.counter('zsxq_downloaded_bytes_total', '从 CDN 下载的字节数')
+        self._download_seconds = self.metrics.histogram('zsxq_download_seconds', '单个图片/文件下载完成的总耗时（秒）')
+        self._disk_seconds = self.metrics.counter('zsxq_disk_write_seconds_total', '媒体写入磁盘的累计耗时（秒）')
+        self._queue_depth = self.metrics.gauge('zsxq_queue_depth', '各流水线阶段输入队列中排队的任务数')
+        self._topics_rate = self.metrics.gauge('zsxq_topics_per_second', '本次运行平均每秒保存的 topics 数')
+        self._failed_items = self.metrics.counter('zsxq_failed_media_total', '下载失败、留在断点中等待重试的图片/文件数')
+        self.profiler = RunProfiler(config.output_dir, self.log) if config.profile else None
+        if parent is None:
+            self.events = EventLogger(self._log_sink(), config.log_level, config.log_queue_size)
+        else:
+            self.events = parent.events.bind('[{}] '.format(config.group), group=config.group)
+        self.metrics_exporter = None
+        if config.metrics_file:
+            self.metrics_exporter = MetricsExporter(self.metrics, config.metrics_file, config.metrics_interval,
+                                                    before_write=self._refresh_metrics, on_log=self.log)
+        if parent is None:
+            self.workers = WorkerManager(self.events, should_skip=lambda: self.is_stopped,
+                                         after_job=self._report_queue_depths, profiler=self.profiler)
+            self.scheduler = RequestScheduler(
+                self.session,
+                {'topics': config.topics_rps, 'download_url': config.download_url_rps, 'cdn': config.cdn_rps},
+                max_attempts=config.max_attempts,
+                events=self.events,
+                stop_event=self._stop_event,
+                metrics=self.metrics)
+        else:
+            self.workers = parent.workers
+            self.scheduler = parent.scheduler
+        self._failed_windows = 0  # 重试用尽而放弃的分片数
+
         self._topic_count = 0
         self._image_count = 0
         self._file_count = 0
-        self._seen_times = set()  # 已见过的 create_time 集合
+        self.resumed_topics = 0  # 从断点恢复的 topics 计数，本次运行新增的 topics 为两者之差
+        self._seen_topic_ids = set()  # 本次运行已见过的 topic_id
+        self.latest_topic = None  # 本次运行见到的时间范围内最新的 (create_time, topic_id)，watch 模式据此前移高水位
         self._checked_files = set()  # 已检查过的文件路径
-
-        # 任务队列
-        self.topic_q = queue.Queue()
-        self.image_q = queue.Queue()
-        self.file_q = queue.Queue()
-
-    def log(self, msg):
-        self.on_log(msg)
-
-    def stop(self):
-        """请求停止爬取"""
+        self._resumed = False  # 是否从断点恢复（恢复时已有文件直接追加，不再询问）
+        self.checkpoint = Checkpoint(config.output_dir)
+        self.topic_index = TopicIndex(config.output_dir)
+        self.writer = MarkdownWriter(os.path.join(config.output_dir, 'topics'))
+        self.media_manifest = MediaManifest(config.output_dir)
+        self.raw_archive = RawArchive(config.output_dir) if config.archive_raw else None
+        self.sqlite_store = SqliteStore(config.output_dir) if config.enable_sqlite else None
+        self._skipped_media = 0  # 因已下载而跳过的图片/文件数
+        self._failed_media = 0  # 下载失败的图片/文件数，这些任务留在断点中，resume 时重试
+
+        self._create_queues()
+        self.url_cache = SignedUrlCache(config.url_ttl)
+        self._resume_media = []  # 断点中未完成的媒体任务，工作线程启动后再投递
+        self._queue_depths = {}  # 上次通过 on_progress 报告的各队列长度
+        self._windows_ready = False  # 分片与断点游标已确定，可以计算覆盖比例
+        self._coverage_start = None  # 开始翻页时的 (时间, 覆盖比例)，用于估算翻页剩余时间
+        self._rate_meter = RateMeter()
+
+    def _create_queues(self):
+        """创建流水线队列：翻页/解析 -> render_q -> 渲染 -> write_q -> 写入 -> image_q / file_q -> 下载
+
+        topic_q 中每个分片最多一个待翻页任务；其余队列有界，下游变慢时上游阻塞等待。
+        多星球模式下 SHARED_QUEUES 为 parent 中同名公平队列属于本星球的车道
+        """
+        config = self.config
+        if self.parent is not None:
+            for name in SHARED_QUEUES:
+                setattr(self, name, getattr(self.parent, name).lane(config.group))
+        else:
+            self.topic_q = queue.Queue()
+            self.image_q = queue.Queue(maxsize=max(1, config.media_queue_size))
+            # 已解析好下载链接、等待下载的文件；有界以免链接在排队中过期
+            self.download_q = queue.Queue(maxsize=max(4, 4 * self.file_limiter.maximum))
+        self.render_q = queue.Queue(maxsize=max(1, config.page_queue_size))
+        self.write_q = queue.Queue(maxsize=max(1, config.page_queue_size))
+        self.file_q = queue.Queue(maxsize=max(1, config.media_queue_size))
+
+    def _log_sink(self):
+        """后台日志线程调用的输出函数；异常堆栈只在 debug 级别的文本日志中输出"""
+        with_traceback = self.config.log_level == 'debug'
+        if self.on_event is not None:
+            sink = self.on_event
+        elif self.on_log is not None:
+            sink = lambda event: self.on_log(event.text(with_traceback))
+        else:
+            sink = logging_sink(logger, with_traceback)
+        if self.profiler is None:
+            return sink
+
+        def timed_sink(event):
+            # 性能剖析时统计日志输出（GUI 刷新、写文件等）的耗时，发生在后台日志线程中
+            with self._stage_seconds.time(stage='log'):
+                sink(event)
+        return timed_sink
+
+    def log(self, msg, *args, **fields):
+        """记录日志，级别按消息前缀推断（❌ 为 error，⚠️ 为 warn，其余为 info）
+
+        有 args / fields 时 msg 为 str.format 模板，在后台日志线程中才格式化
+        """
+        self.events.log(None, msg, *args, **fields)
+
+    def _on_limit_change(self, name, limit, reason):
+        self.log('{}下载并发调整为 {}（{}）'.format(name, limit, reason))
+
+    def _pool_size(self):
+        """连接池大小：每个翻页、下载与链接解析线程各一个连接"""
+        # topics 线程数等于分片数
+        pool_size = max(1, self.config.shards)
+        if self.config.enable_images:
+            pool_size += self.image_limiter.maximum
+        if self.config.enable_files:
+            # 另加一个下载链接解析线程
+            pool_size += self.file_limiter.maximum + 1
+        return pool_size
+
+    def _create_session(self):
+        """创建所有工作线程共享的 keep-alive 连接池"""
+        pool_size = self._pool_size()
+        session = requests.Session()
+        session.headers.update(self.headers)
+        # 记录连接池中的 socket，立即停止时逐个 shutdown 以打断阻塞的请求
+        self._adapter = CancellableAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        session.mount('https://', self._adapter)
+        session.mount('http://', self._adapter)
+        return session
+
+    def stop(self, mode=STOP_ABORT):
+        """请求停止爬取
+
+        drain: 不再翻页，已获取的页和已排队的媒体处理完后结束；
+        abort: 丢弃排队任务，并中断正在进行的请求（包括阻塞在网络读写上的请求）
+        """
+        if mode not in STOP_MODES:
+            raise ValueError('未知的停止方式: {}'.format(mode))
+        self._drain_event.set()
+        if mode == STOP_DRAIN:
+            self.log('正在停止翻页，等待已获取的内容写入、已排队的媒体下载完成...')
+            return
         self._stop_event.set()
         self.log('正在停止爬取...')
+        self._abort_workers()
+        self.writer.flush()
+
+    def _abort_workers(self):
+        """打断阻塞中的请求，清空各阶段队列并唤醒等待中的主线程"""
+        self._adapter.cancel_all()
+        self.workers.abort()
+        with self.topic_q.all_tasks_done:
+            self.topic_q.all_tasks_done.notify_all()
 
     @property
     def is_stopped(self):
+        """是否已立即停止（abort）"""
         return self._stop_event.is_set()
 
+    @property
+    def is_draining(self):
+        """是否已请求停止翻页（drain 或 abort）"""
+        return self._drain_event.is_set()
+
     # ---- 工具方法 ----
 
     @staticmethod
@@ -99,7 +325,8 @@ class Scraper:
 
     # ---- Markdown 转换 ----
 
-    def topic_to_markdown(self, topic):
+    @staticmethod
+    def topic_to_markdown(topic):
         lines = []
         topic_id = topic['topic_id']
         topic_type = topic['type']
@@ -198,44 +425,55 @@ class Scraper:
 
         return '\n'.join(lines)
 
-    def save_topic_as_markdown(self, topic):
-        create_time = topic.get('create_time', 'unknown')
+    @staticmethod
+    def topic_day(create_time):
+        """topic 所属日文件的日期（YYYY-MM-DD）"""
         if len(create_time) >= 10:
-            year_month = create_time[:10]
-        else:
-            year_month = 'unknown'
-
-        filename = '{}.md'.format(year_month)
-        topics_dir = os.path.join(self.config.output_dir, 'topics')
-        self.ensure_dir(topics_dir)
-
-        filepath = os.path.join(topics_dir, filename)
-
-        # 检查文件是否已存在（每个文件只提示一次）
-        if filepath not in self._checked_files:
-            self._checked_files.add(filepath)
-            if os.path.exists(filepath):
-                self.log('⚠️ 文件已存在: {}'.format(filepath))
-                overwrite = self.on_file_exists(filepath)
-                if overwrite:
-                    self.log('用户选择覆盖文件')
-                    with open(filepath, 'w', encoding='utf-8') as f:
-                        f.write('')  # 清空文件
-                else:
-                    self.log('用户选择追加内容')
-
-        md_content = self.topic_to_markdown(topic)
-
-        with open(filepath, 'a', encoding='utf-8') as f:
-            f.write(md_content)
-            f.write('\n---\n\n')
+            return create_time[:10]
+        return 'unknown'
+
+    def day_file_path(self, day):
+        return self.writer.path(day)
+
+    def _check_day_file(self, day):
+        """检查日文件是否已存在（每个文件只提示一次）；覆盖时同时清除该日的去重记录"""
+        filepath = self.day_file_path(day)
+        if filepath in self._checked_files:
+            return filepath
+        self._checked_files.add(filepath)
+        if os.path.exists(filepath) and not (self._resumed or self.config.append_existing):
+            self.log('⚠️ 文件已存在: {}'.format(filepath))
+            overwrite = self.on_file_exists(filepath)
+            if overwrite:
+                self.log('用户选择覆盖文件')
+                self.writer.truncate(day)
+                self.topic_index.forget_day(day)
+            else:
+                self.log('用户选择追加内容')
+        return filepath
 
-        self.log('已保存 topic 到: {}'.format(filepath))
+    def save_topic_as_markdown(self, topic):
+        self.save_topics_as_markdown([topic])
+
+    def save_topics_as_markdown(self, topics):
+        """将一页 topics 按日期分组写入日文件，每个日文件只写一次"""
+        for topic in topics:
+            self._check_day_file(self.topic_day(topic.get('create_time', 'unknown')))
+        self.write_entries(topics, self.render_page(TopicPage(None, None, topics)).entries)
+
+    def write_entries(self, topics, entries):
+        """写入已渲染的 (日期, Markdown) 列表并登记去重索引"""
+        written = self.writer.write_page(entries)
+        for topic in topics:
+            self.topic_index.add(topic['topic_id'], self.topic_day(topic.get('create_time', 'unknown')))
+        for day, count in written.items():
+            self.events.debug('已保存 {count} 条 topics 到: {path}', count=count, path=self.day_file_path(day))
 
     # ---- 时间过滤 ----
 
-    def is_in_time_range(self, create_time):
-        if self.config.start_time and create_time < self.config.start_time:
+    def is_in_time_range(self, create_time, start_time=None):
+        start_time = start_time or self.config.start_time
+        if start_time and create_time < start_time:
             return 'before'
         if self.config.end_time and create_time > self.config.end_time:
             return 'after'
@@ -243,8 +481,9 @@ class Scraper:
 
     # ---- API 请求 ----
 
-    def fetch_topics(self, end_time=None):
-        if self.is_stopped:
+    def fetch_topics(self, end_time=None, start_time=None):
+        """请求并解析一页 topics，交给渲染阶段；start_time 为所属分片窗口的下界（为空时使用配置的起始时间）"""
+        if self.is_draining:
             return 'done'
 
         params = {
@@ -255,42 +494,45 @@ class Scraper:
             params['end_time'] = end_time
 
         try:
-            r = requests.get(self.base_url, headers=self.headers, params=params, allow_redirects=False)
-            self.log('请求: {} [状态码:{}]'.format(r.url, r.status_code))
-        except Exception as e:
-            self.log('❌ 网络请求失败: {}'.format(e))
-            self.log(traceback.format_exc())
-            time.sleep(10)
-            if not self.is_stopped:
-                self.topic_q.put(end_time)
-            return
+            with self._stage_seconds.time(stage='fetch'):
+                d = self.scheduler.get_json('topics', self.base_url, params=params, cancel=self._drain_event,
+                                            allow_redirects=False, timeout=30)
+        except RequestFailed as e:
+            if not self.is_draining:
+                self._window_failed(start_time, e)
+            return 'done'
 
-        try:
-            d = r.json()
-        except Exception as e:
-            self.log('❌ 解析JSON失败: {}, 响应内容: {}'.format(e, r.text[:500]))
-            time.sleep(10)
-            if not self.is_stopped:
-                self.topic_q.put(end_time)
-            return
-        if not d['succeeded']:
-            self.log('获取 topics 失败: {}'.format(d))
-            time.sleep(15)
-            if not self.is_stopped:
-                self.topic_q.put(end_time)
-            return
+        with self._stage_seconds.time(stage='parse'):
+            page = self.parse_topics_page(d['resp_data']['topics'], start_time)
+        # 渲染队列已满时在此等待，翻页速度受写入速度约束
+        if page is None or not self._put_until_stopped(self.render_q, page):
+            return 'done'
+        if page.next_end_time is None:
+            return 'done'
+        self.topic_q.put((page.next_end_time, start_time))
+
+    def _window_failed(self, start_time, error):
+        """分片重试用尽后放弃，游标保留在断点中，可用 resume 继续"""
+        self._failed_windows += 1
+        self.log('❌ 获取 topics 失败，放弃分片 [{}, ...): {}'.format(start_time or '(无)', error))
 
-        if len(d['resp_data']['topics']) == 0:
+    def parse_topics_page(self, topics, start_time=None):
+        """过滤一页 topics（时间范围、重复内容、已保存内容），返回 TopicPage
+
+        因停止而中断时返回 None，该页不会被写入，游标也不会前进
+        """
+        if len(topics) == 0:
             self.log('所有 topics 已获取完毕！')
-            return 'done'
+            return TopicPage(start_time, None)
 
         reached_before_start = False
-        filtered_topics = []
-        for topic in d['resp_data']['topics']:
+        page = TopicPage(start_time, None)
+        skipped = 0
+        for topic in topics:
             if self.is_stopped:
-                return 'done'
+                return None
             create_time = topic.get('create_time', '')
-            status = self.is_in_time_range(create_time)
+            status = self.is_in_time_range(create_time, start_time)
             if status == 'before':
                 reached_before_start = True
                 self.log('Topic {} 创建时间 {} 早于起始时间，停止翻页'.format(
@@ -299,245 +541,805 @@ class Scraper:
             elif status == 'after':
                 continue
             else:
-                # 检查是否重复
-                if create_time in self._seen_times:
-                    self.log('⚠️ 发现重复内容，create_time={}'.format(create_time))
+                topic_id = str(topic['topic_id'])
+                # 本次运行中重复出现，说明翻页异常，交由用户决定
+                if topic_id in self._seen_topic_ids:
+                    self.log('⚠️ 发现重复内容，topic_id={}, create_time={}'.format(topic_id, create_time))
                     should_stop = self.on_duplicate(create_time)
                     if should_stop:
                         self.log('用户选择退出')
-                        return 'done'
+                        return TopicPage(start_time, None)
                     else:
                         self.log('跳过重复内容，继续爬取')
                         continue
-                self._seen_times.add(create_time)
-                filtered_topics.append(topic)
+                self._seen_topic_ids.add(topic_id)
+                if self.latest_topic is None or create_time > self.latest_topic[0]:
+                    self.latest_topic = (create_time, topic_id)
+                page.in_range.append(topic)
+                # 先处理日文件覆盖，再查询去重索引，覆盖的日期会被重新写入
+                self._check_day_file(self.topic_day(create_time))
+                if topic_id in self.topic_index:
+                    skipped += 1
+                    continue
+                page.topics.append(topic)
+
+        if skipped:
+            self.log('跳过 {} 条此前已保存的 topics'.format(skipped))
+
+        if reached_before_start:
+            self.log('已到达起始时间边界，停止爬取')
+        else:
+            page.next_end_time = self.next_end_time(topics[-1]['create_time'])
+        return page
+
+    def render_page(self, page):
+        """渲染阶段：把新 topics 转换为 (日期, Markdown) 列表"""
+        with self._stage_seconds.time(stage='render'):
+            page.entries = [(self.topic_day(topic.get('create_time', 'unknown')), self.topic_to_markdown(topic))
+                            for topic in page.topics]
+        return page
+
+    def write_page(self, page):
+        """写入阶段：归档、写入 SQLite 与日文件、登记媒体任务并更新断点
+
+        返回待投递的 [(队列, 媒体信息)]；媒体任务在投递前已全部记入断点，投递被停止打断也不会丢失
+        """
+        if self.raw_archive is not None and page.in_range:
+            try:
+                with self._stage_seconds.time(stage='archive'):
+                    self.raw_archive.append_page(page.in_range)
+            except Exception as e:
+                self.log('归档原始数据出错: {}'.format(e))
 
-        if filtered_topics:
+        if self.sqlite_store is not None and page.in_range:
             try:
-                for topic in filtered_topics:
-                    self.save_topic_as_markdown(topic)
-                    self._topic_count += 1
-                    self.on_progress('topics', self._topic_count)
-                self.log('本页 {} 条 topics 已保存'.format(len(filtered_topics)))
+                with self._stage_seconds.time(stage='sqlite'):
+                    self.sqlite_store.upsert_topics(page.in_range)
+            except Exception as e:
+                self.log('写入 SQLite 出错: {}'.format(e))
+
+        media = []
+        if page.topics:
+            try:
+                with self._stage_seconds.time(stage='write'):
+                    self.write_entries(page.topics, page.entries)
+                self._topic_count += len(page.topics)
+                self._items.inc(len(page.topics), kind='topics')
+                self.on_progress('topics', self._topic_count)
+                self.events.debug('本页 {count} 条 topics 已保存', count=len(page.topics))
             except Exception as e:
                 self.log('保存 Markdown 出错: {}'.format(e))
 
-            for topic in filtered_topics:
-                if self.is_stopped:
-                    return 'done'
-                if topic['type'] == 'talk':
-                    if 'talk' in topic:
-                        if self.config.enable_images:
-                            self._get_images(topic['talk'])
-                        if self.config.enable_files:
-                            self._get_files(topic['talk'])
-                elif topic['type'] == 'q&a':
-                    if 'question' in topic:
-                        if self.config.enable_images:
-                            self._get_images(topic['question'])
-                        if self.config.enable_files:
-                            self._get_files(topic['question'])
-                    if 'answer' in topic:
-                        if self.config.enable_images:
-                            self._get_images(topic['answer'])
-                        if self.config.enable_files:
-                            self._get_files(topic['answer'])
+        # 已在去重索引中的 topics 不再写入 Markdown，但媒体任务照常生成：
+        # 此前下载失败的图片/文件会被重新投递，已下载完成的由 media_manifest 过滤
+        for topic in page.in_range:
+            media.extend(self._media_jobs(topic))
 
-        if reached_before_start:
-            self.log('已到达起始时间边界，停止爬取')
+        self._page_done(page.start_time, page.next_end_time)
+        return media
+
+    def process_topics_page(self, topics, start_time=None):
+        """依次完成解析、渲染与写入，不经过流水线队列，返回 (下一页 end_time, 待投递的媒体任务)
+
+        无需继续翻页时 end_time 为 None
+        """
+        with self._stage_seconds.time(stage='parse'):
+            page = self.parse_topics_page(topics, start_time)
+        if page is None:
+            return None, []
+        return page.next_end_time, self.write_page(self.render_page(page))
+
+    @staticmethod
+    def next_end_time(create_time):
+        """将 create_time 减一毫秒（毫秒为 000 时向秒借位），作为下一页的 end_time 游标"""
+        t = datetime.strptime(create_time[:23], '%Y-%m-%dT%H:%M:%S.%f') - timedelta(milliseconds=1)
+        return t.strftime('%Y-%m-%dT%H:%M:%S.') + '{:03d}'.format(t.microsecond // 1000) + create_time[23:]
+
+    def _media_jobs(self, topic):
+        """返回 topic 中需要下载的 [(队列, 媒体信息)]，并记入断点"""
+        jobs = []
+        if topic['type'] == 'talk':
+            if 'talk' in topic:
+                jobs.extend(self._media_of(topic['talk']))
+        elif topic['type'] == 'q&a':
+            for role in ('question', 'answer'):
+                if role in topic:
+                    jobs.extend(self._media_of(topic[role]))
+        return jobs
+
+    def _media_of(self, talk):
+        if self.config.enable_images:
+            for img in talk.get('images', []):
+                if self.media_manifest.is_done('images', img['image_id'], self.image_path(img)):
+                    self._skipped_media += 1
+                    continue
+                self.checkpoint.add_media('images', img['image_id'], img)
+                yield self.image_q, img
+        if self.config.enable_files:
+            for file in talk.get('files', []):
+                if self.media_manifest.is_done('files', file['file_id'], self.file_path(file)):
+                    self._skipped_media += 1
+                    continue
+                self.checkpoint.add_media('files', file['file_id'], file)
+                yield self.file_q, file
+
+    def _counts(self):
+        return {'topics': self._topic_count, 'images': self._image_count, 'files': self._file_count}
+
+    def _page_done(self, start_time, next_end_time):
+        """一页处理完成后更新断点；因停止而中断的页保留当前游标以便继续"""
+        if next_end_time is None and self.is_stopped:
             return
+        self.checkpoint.page_done(start_time, next_end_time, self._counts())
 
-        end_time = d['resp_data']['topics'][-1]['create_time']
-        tmp = str(int(end_time[20:23]) - 1)
-        while len(tmp) < 3:
-            tmp = '0' + tmp
-        end_time = end_time.replace('.' + end_time[20:23] + '+', '.' + tmp + '+')
-        self.topic_q.put(end_time)
+    def image_path(self, img_info):
+        images_dir = os.path.join(self.config.output_dir, 'images')
+        self.ensure_dir(images_dir)
+        return os.path.join(images_dir, '{}.{}'.format(img_info['image_id'], img_info['type']))
 
-    def _get_images(self, talk):
-        if 'images' in talk:
-            for img in talk['images']:
-                self.image_q.put(img)
+    def file_path(self, file_info):
+        files_dir = os.path.join(self.config.output_dir, 'files')
+        self.ensure_dir(files_dir)
+        return os.path.join(files_dir, '{}_{}'.format(file_info['file_id'], file_info['name']))
 
-    def _get_files(self, talk):
-        if 'files' in talk:
-            for file in talk['files']:
-                self.file_q.put(file)
+    def file_download_url_api(self, file_info):
+        return '{}/v2/files/{}/download_url'.format(self.api_base, file_info['file_id'])
+
+    @staticmethod
+    def part_path(filepath):
+        """下载过程中使用的临时文件，完成后原子重命名为 filepath"""
+        return filepath + '.part'
+
+    @staticmethod
+    def discard_part(part_path):
+        try:
+            os.remove(part_path)
+        except OSError:
+            pass
+
+    @staticmethod
+    def file_sha256(filepath, chunk_size=1024 * 1024):
+        digest = hashlib.sha256()
+        with open(filepath, 'rb') as f:
+            for chunk in iter(lambda: f.read(chunk_size), b''):
+                digest.update(chunk)
+        return digest.hexdigest()
+
+    def part_offset(self, part_path, expected_size=None):
+        """已下载的 .part 字节数；超过预期大小的残留文件视为损坏并丢弃"""
+        try:
+            offset = os.path.getsize(part_path)
+        except OSError:
+            return 0
+        if expected_size and offset > expected_size:
+            self.log('⚠️ 断点文件大小 {} 超过预期 {}，重新下载: {}'.format(offset, expected_size, part_path))
+            self.discard_part(part_path)
+            return 0
+        return offset
+
+    @staticmethod
+    def range_complete(content_range, size, expected_size=None):
+        """Range 请求返回 416 时 .part 是否已经完整：预期大小或 Content-Range（bytes */总长度）与已下载字节数一致"""
+        if expected_size and size == expected_size:
+            return True
+        total = (content_range or '').rpartition('/')[2].strip()
+        return total.isdigit() and int(total) == size
+
+    @staticmethod
+    def part_digest(part_path, chunk_size=1024 * 1024):
+        """以 .part 中已下载的内容初始化 sha256，续传时只需继续 update 新的分块"""
+        digest = hashlib.sha256()
+        with open(part_path, 'rb') as f:
+            for chunk in iter(lambda: f.read(chunk_size), b''):
+                digest.update(chunk)
+        return digest
+
+    def finish_part(self, part_path, filepath, size, expected_size=None):
+        """校验大小后把 .part 原子重命名为正式文件"""
+        if expected_size and size != expected_size:
+            self.discard_part(part_path)
+            raise IOError('文件大小不符: 已下载 {} bytes, 预期 {} bytes'.format(size, expected_size))
+        os.replace(part_path, filepath)
+
+    def download_to_file(self, url, filepath, timeout, limiter=None, resume=False, expected_size=None,
+                         kind='files'):
+        """以流式分块下载到临时文件，完成后原子重命名，返回 (字节数, sha256)
+
+        kind（images / files）用于区分下载字节数、耗时等指标
+
+        传入 limiter 时下载占用其一个并发名额，并把状态码和首字节延迟反馈给它。
+        resume 为真时失败不删除 .part 文件，下次（或本次中途断开后）用 Range 请求从最后一个字节继续
+        """
+        part_path = self.part_path(filepath)
+        offset = self.part_offset(part_path, expected_size) if resume else 0
+        resumed = offset > 0
+        digest = hashlib.sha256()
+        size = offset
+        started = time.monotonic()
+        disk_seconds = 0.0
+        try:
+            with limiter.slot(self._stop_event) if limiter else nullcontext() as slot:
+                for attempt in range(1, self.scheduler.max_attempts + 1):
+                    headers = {'Range': 'bytes={}-'.format(size)} if size else {}
+                    try:
+                        with self.scheduler.get('cdn', url, observe=slot.observe if slot else None,
+                                                headers=headers, timeout=timeout, stream=True) as response:
+                            if size and response.status_code == 416:
+                                if self.range_complete(response.headers.get('Content-Range'), size, expected_size):
+                                    break  # .part 已经完整
+                                # .part 比服务器上的文件还大或无法确认是否完整，丢弃后从头下载
+                                self.log('⚠️ 断点文件与服务器上的文件不符（HTTP 416），重新下载: {}'.format(filepath))
+                                self.discard_part(part_path)
+                                size, resumed, digest = 0, False, hashlib.sha256()
+                                continue
+                            response.raise_for_status()
+                            if size and response.status_code != 206:
+                                self.log('⚠️ 服务器不支持断点续传，重新下载: {}'.format(filepath))
+                                size, resumed, digest = 0, False, hashlib.sha256()
+                            with open(part_path, 'ab' if size else 'wb') as file:
+                                for chunk in response.iter_content(chunk_size=self.config.chunk_size):
+                                    if self.is_stopped:
+                                        raise RuntimeError('下载已被停止')
+                                    write_start = time.monotonic()
+                                    file.write(chunk)
+                                    disk_seconds += time.monotonic() - write_start
+                                    self._downloaded_bytes.inc(len(chunk), kind=kind)
+                                    digest.update(chunk)
+                                    size += len(chunk)
+                        break
+                    except (requests.ConnectionError, requests.Timeout,
+                            requests.exceptions.ChunkedEncodingError) as e:
+                        # 传输中途断开：保留已下载部分，从断点继续
+                        if not resume or attempt == self.scheduler.max_attempts:
+                            raise
+                        size = self.part_offset(part_path, expected_size)
+                        resumed = resumed or size > 0
+                        delay = self.scheduler.backoff_delay(attempt)
+                        self.log('⚠️ 下载中断（{}），已下载 {} bytes，{:.1f} 秒后从断点继续: {}'.format(
+                            e, size, delay, filepath))
+                        if self._stop_event.wait(delay):
+                            raise RuntimeError('下载已被停止')
+            self.finish_part(part_path, filepath, size, expected_size)
+        except BaseException:
+            if not resume:
+                self.discard_part(part_path)
+            raise
+        finally:
+            self._disk_seconds.inc(disk_seconds, kind=kind)
+        self._download_seconds.observe(time.monotonic() - started, kind=kind)
+        sha256 = self.file_sha256(filepath) if resumed else digest.hexdigest()
+        return size, sha256
 
     def fetch_images(self, img_info):
         def download(url, image_id, type_, subfix):
-            images_dir = os.path.join(self.config.output_dir, 'images')
-            self.ensure_dir(images_dir)
-            filepath = os.path.join(images_dir, '{}.{}'.format(image_id, subfix))
+            filepath = self.image_path(img_info)
 
             try:
-                response = requests.get(url, headers=self.headers, timeout=60)
-                response.raise_for_status()
-                with open(filepath, "wb+") as file:
-                    file.write(response.content)
-                self.log('图片已保存: {} ({} bytes)'.format(filepath, len(response.content)))
+                size, sha256 = self.download_to_file(url, filepath, timeout=60, limiter=self.image_limiter,
+                                                     kind='images')
+                self.media_manifest.record('images', image_id, filepath, size, sha256)
+                self.events.debug('图片已保存: {path} ({size} bytes)', path=filepath, size=size)
+                return True
             except Exception as e:
-                self.log('❌ 图片下载失败 [image_id={}]: {}'.format(image_id, e))
-                self.log(traceback.format_exc())
+                self.events.error('❌ 图片下载失败 [image_id={image_id}]: {error}',
+                                  image_id=image_id, error=e, exc_info=True)
+                return False
 
         # if 'thumbnail' in img_info:
         #     download(img_info['thumbnail']['url'], img_info['image_id'], 'thumbnail', img_info['type'])
         # if 'large' in img_info:
         #     download(img_info['large']['url'], img_info['image_id'], 'large', img_info['type'])
+        if self.media_manifest.is_done('images', img_info['image_id'], self.image_path(img_info)):
+            self._skipped_media += 1
+            self.checkpoint.media_done('images', img_info['image_id'], self._counts())
+            return
+        ok = True
         if 'original' in img_info:
-            download(img_info['original']['url'], img_info['image_id'], 'original', img_info['type'])
+            ok = download(img_info['original']['url'], img_info['image_id'], 'original', img_info['type'])
+        if self.is_stopped:
+            return  # 被停止打断的下载保留在断点中，resume 时继续
+        if not ok:
+            self._media_failed('images')
+            return
 
         self._image_count += 1
+        self._items.inc(kind='images')
+        self.checkpoint.media_done('images', img_info['image_id'], self._counts())
         self.on_progress('images', self._image_count)
-        self.log('剩余图片: {}'.format(self.image_q.qsize()))
+        if self.events.enabled('debug'):
+            self.events.debug('剩余图片: {remaining}', remaining=self.image_q.qsize())
+
+    def resolve_download_url(self, file_info, refresh=False):
+        """获取文件的签名下载链接，优先使用未过期的缓存；失败时返回 None"""
+        file_id = file_info['file_id']
+        if refresh:
+            self.url_cache.invalidate(file_id)
+        else:
+            url = self.url_cache.get(file_id)
+            if url is not None:
+                return url
+
+        self.events.debug('获取文件下载链接: file_id={file_id}, name={name}', file_id=file_id,
+                          name=file_info.get('name', ''))
+        try:
+            d = self.scheduler.get_json('download_url', self.file_download_url_api(file_info), timeout=30)
+        except RequestFailed as e:
+            self.log('❌ 获取文件下载链接失败: {}'.format(e))
+            return None
+        url = d['resp_data']['download_url']
+        self.url_cache.put(file_id, url)
+        return url
+
+    def _file_done(self, file_info):
+        """已下载过的文件直接标记完成，不再请求下载链接"""
+        if self.media_manifest.is_done('files', file_info['file_id'], self.file_path(file_info)):
+            self._skipped_media += 1
+            self.checkpoint.media_done('files', file_info['file_id'], self._counts())
+            return True
+        return False
 
     def fetch_files(self, file_info):
         def download(url, filename):
-            files_dir = os.path.join(self.config.output_dir, 'files')
-            self.ensure_dir(files_dir)
-
-            try:
-                response = requests.get(url, headers=self.headers, timeout=120)
-                response.raise_for_status()
-                with open(filename, "wb+") as file:
-                    file.write(response.content)
-                self.log('文件已保存: {} ({} bytes)'.format(filename, len(response.content)))
-            except Exception as e:
-                self.log('❌ 文件下载失败 [{}]: {}'.format(filename, e))
-                self.log(traceback.format_exc())
+            size, sha256 = self.download_to_file(url, filename, timeout=120, limiter=self.file_limiter,
+                                                 resume=True, expected_size=file_info.get('size'))
+            self.media_manifest.record('files', file_info['file_id'], filename, size, sha256)
+            self.events.debug('文件已保存: {path} ({size} bytes)', path=filename, size=size)
 
-        self.log('获取文件下载链接: file_id={}, name={}'.format(file_info['file_id'], file_info.get('name', '')))
-        url = 'https://api.zsxq.com/v2/files/{}/download_url'.format(file_info['file_id'])
-        try:
-            r = requests.get(url, headers=self.headers, timeout=30)
-            d = r.json()
-        except Exception as e:
-            self.log('❌ 获取文件下载链接失败: {}'.format(e))
-            self.log(traceback.format_exc())
+        if self._file_done(file_info):
             return
 
-        if not d['succeeded']:
-            self.log('❌ 获取文件下载链接失败: {}'.format(d))
+        url = self.resolve_download_url(file_info)
+        if url is None:
+            if not self.is_stopped:
+                self._media_failed('files')
             return
 
-        files_dir = os.path.join(self.config.output_dir, 'files')
-        self.ensure_dir(files_dir)
-        filepath = os.path.join(files_dir, '{}_{}'.format(file_info['file_id'], file_info['name']))
-        download(d['resp_data']['download_url'], filepath)
+        filepath = self.file_path(file_info)
+        ok = False
+        try:
+            try:
+                download(url, filepath)
+            except requests.HTTPError as e:
+                # 签名过期时 CDN 返回 403/410，重新获取链接后再试一次
+                if e.response is None or e.response.status_code not in (403, 410):
+                    raise
+                self.log('⚠️ 下载链接已失效（HTTP {}），重新获取: file_id={}'.format(
+                    e.response.status_code, file_info['file_id']))
+                url = self.resolve_download_url(file_info, refresh=True)
+                if url is None:
+                    raise
+                download(url, filepath)
+            ok = True
+        except Exception as e:
+            self.events.error('❌ 文件下载失败 [{path}]: {error}', path=filepath, error=e, exc_info=True)
+        self.url_cache.invalidate(file_info['file_id'])
+        if self.is_stopped:
+            return  # 被停止打断的下载保留在断点中，resume 时继续
+        if not ok:
+            self._media_failed('files')
+            return
 
         self._file_count += 1
+        self._items.inc(kind='files')
+        self.checkpoint.media_done('files', file_info['file_id'], self._counts())
         self.on_progress('files', self._file_count)
-        self.log('剩余文件: {}'.format(self.file_q.qsize()))
+        if self.events.enabled('debug'):
+            self.events.debug('剩余文件: {remaining}', remaining=self.file_q.qsize() + self.download_q.qsize())
+
+    def _media_failed(self, kind):
+        """下载失败的图片/文件不计入完成数，也不从断点中移除，结束时报告未完成并保留断点"""
+        self._failed_media += 1
+        self._failed_items.inc(kind=kind)
 
     # ---- 线程方法 ----
 
-    def _topics_thread(self):
-        self.log('📡 Topics 线程已启动')
-        while not self.is_stopped:
-            try:
-                job = self.topic_q.get(timeout=1)
-            except queue.Empty:
-                continue
-            try:
-                result = self.fetch_topics(job)
-            except Exception as e:
-                self.log('❌ Topics 线程异常: {}'.format(e))
-                self.log(traceback.format_exc())
-                result = None
-            self.topic_q.task_done()
-            if result == 'done':
+    def _topics_job(self, job):
+        self.fetch_topics(*job)
+
+    def _render_stage(self, page):
+        self._put_until_stopped(self.write_q, self.render_page(page))
+
+    def _write_stage(self, page):
+        for q, info in self.write_page(page):
+            if not self._put_until_stopped(q, info):
                 break
-        self.log('📡 Topics 线程已结束')
 
-    def _images_thread(self):
-        self.log('🖼️ 图片下载线程已启动')
-        while not self.is_stopped:
-            try:
-                job = self.image_q.get(timeout=1)
-            except queue.Empty:
-                continue
-            try:
-                self.fetch_images(job)
-            except Exception as e:
-                self.log('❌ 图片线程异常: {}'.format(e))
-                self.log(traceback.format_exc())
-            self.image_q.task_done()
-        self.log('🖼️ 图片下载线程已结束')
+    def _resolve_stage(self, file_info):
+        """下载链接解析阶段：提前获取签名链接放入缓存，再交给下载线程"""
+        if self._file_done(file_info):
+            return
+        if self.resolve_download_url(file_info) is not None:
+            self._put_until_stopped(self.download_q, file_info)
+        elif not self.is_stopped:
+            self._media_failed('files')
 
-    def _files_thread(self):
-        self.log('📁 文件下载线程已启动')
+    def _put_until_stopped(self, q, item):
+        """向有界队列投递，队列满时等待，立即停止时放弃"""
         while not self.is_stopped:
             try:
-                job = self.file_q.get(timeout=1)
-            except queue.Empty:
+                q.put(item, timeout=0.5)
+                return True
+            except queue.Full:
                 continue
-            try:
-                self.fetch_files(job)
-            except Exception as e:
-                self.log('❌ 文件线程异常: {}'.format(e))
-                self.log(traceback.format_exc())
-            self.file_q.task_done()
-        self.log('📁 文件下载线程已结束')
+        return False
 
     # ---- 主入口 ----
 
+    def _log_start(self):
+        self.log('===== 开始爬取 =====')
+        self.log('配置: group={}, start_time={}, end_time={}'.format(
+            self.config.group, self.config.start_time or '(无)', self.config.end_time or '(无)'))
+        self.log('配置: 图片={}, 文件={}'.format(
+            '开启' if self.config.enable_images else '关闭',
+            '开启' if self.config.enable_files else '关闭'))
+        self.log('配置: 图片线程={}, 文件线程={}, 自适应并发={}'.format(
+            self.config.image_workers, self.config.file_workers,
+            '开启(上限 {})'.format(self.config.max_workers) if self.config.adaptive_concurrency else '关闭'))
+        self.ensure_dir(self.config.output_dir)
+        self.log('输出目录: {}'.format(os.path.abspath(self.config.output_dir)))
+
+    def _open_stores(self):
+        """打开 output_dir 中的持久化存储"""
+        count = self.topic_index.load()
+        if count:
+            self.log('去重索引中已有 {} 条 topics，已保存的内容将被跳过'.format(count))
+        if self.config.enable_images or self.config.enable_files:
+            count = self.media_manifest.load()
+            if count:
+                self.log('媒体清单中已有 {} 个已下载的图片/文件'.format(count))
+        if self.raw_archive is not None:
+            count = self.raw_archive.load()
+            self.log('原始数据归档: {}（已有 {} 条）'.format(self.raw_archive.dir, count))
+        if self.sqlite_store is not None:
+            count = self.sqlite_store.open()
+            self.log('SQLite 数据库: {}（已有 {} 条）'.format(self.sqlite_store.path, count))
+        if self.metrics_exporter is not None:
+            self.metrics_exporter.start()
+            self.log('运行指标: {}（每 {} 秒更新）'.format(self.metrics_exporter.path, self.metrics_exporter.interval))
+
+    def _close_stores(self):
+        if self.metrics_exporter is not None:
+            self.metrics_exporter.close()
+        if self.sqlite_store is not None:
+            self.sqlite_store.close()
+        if self.raw_archive is not None:
+            self.raw_archive.close()
+        self.media_manifest.close()
+        self.writer.close()
+        self.topic_index.close()
+
+    def _initial_end_time(self):
+        """根据配置的结束时间计算首次请求的 end_time"""
+        initial_end_time = None
+        if self.config.end_time:
+            initial_end_time = self.config.end_time.replace('.000+', '.001+')
+            self.log('使用结束时间作为 API 初始参数: {}'.format(initial_end_time))
+        return initial_end_time
+
+    def _time_windows(self):
+        """返回各分片的 (初始 end_time, 下界 start_time) 列表，从新到旧排列"""
+        initial_end_time = self._initial_end_time()
+        shards = max(1, self.config.shards)
+        if shards == 1 or not (self.config.start_time and self.config.end_time):
+            if shards > 1:
+                self.log('⚠️ 分片翻页需要同时设置起始和结束时间，已退化为单线程翻页')
+            return [(initial_end_time, None)]
+
+        boundaries = split_time_range(self.config.start_time, self.config.end_time, shards)
+        windows = []
+        upper = initial_end_time
+        for lower in boundaries:
+            windows.append((upper, lower))
+            # API 返回的 topics 包含 create_time 恰好等于 end_time 的一条，而分界点本身属于较新的窗口，
+            # 下一窗口从分界点前一毫秒开始，落在分界点上的 topic 不会被两个分片重复抓取
+            upper = self.next_end_time(lower)
+        windows.append((upper, self.config.start_time))
+        self.log('时间范围已拆分为 {} 个分片并行翻页'.format(len(windows)))
+        for window_end, window_start in windows:
+            self.log('  分片: [{}, {}]'.format(window_start, window_end))
+        return windows
+
+    def _prepare_windows(self):
+        """确定本次需要翻页的分片；resume 时从断点恢复游标、计数和未完成的媒体任务"""
+        if self.config.resume:
+            if not self.checkpoint.load():
+                self.log('⚠️ 未找到可用的断点文件，将重新开始爬取')
+            elif self.checkpoint.state['group'] != self.config.group:
+                self.log('⚠️ 断点属于星球 {}，与当前配置不符，将重新开始爬取'.format(
+                    self.checkpoint.state['group']))
+            else:
+                self._resumed = True
+                state = self.checkpoint.state
+                counts = state['counts']
+                self._topic_count = self.resumed_topics = counts.get('topics', 0)
+                self._image_count = counts.get('images', 0)
+                self._file_count = counts.get('files', 0)
+                for kind in ('topics', 'images', 'files'):
+                    self.on_progress(kind, counts.get(kind, 0))
+                if state['start_time'] != self.config.start_time or state['end_time'] != self.config.end_time:
+                    self.log('⚠️ 断点的时间范围为 [{}, {}]，按断点继续'.format(
+                        state['start_time'] or '(无)', state['end_time'] or '(无)'))
+                    self.config.start_time = state['start_time']
+                    self.config.end_time = state['end_time']
+                windows = self.checkpoint.windows()
+                images, files = self._pending_media()
+                self.log('从断点继续: 已完成 {} 页, 剩余 {} 个分片, {} 张图片, {} 个文件待下载'.format(
+                    state['pages'], len(windows), len(images), len(files)))
+                self._start_progress()
+                return windows
+
+        pending = None
+        if self.config.retry_pending_media and self.checkpoint.load() \
+                and self.checkpoint.state['group'] == self.config.group:
+            pending = self._pending_media()
+        windows = self._time_windows()
+        self.checkpoint.reset(self.config, windows)
+        if pending is not None and self._resume_media:
+            # 断点已按本次的时间范围重置，上次未完成的媒体任务重新登记，再次失败时仍会留在断点中
+            images, files = pending
+            for img in images:
+                self.checkpoint.add_media('images', img['image_id'], img)
+            for file in files:
+                self.checkpoint.add_media('files', file['file_id'], file)
+            self.checkpoint.save()
+            self.log('重试上次未完成的 {} 张图片, {} 个文件'.format(len(images), len(files)))
+        self._start_progress()
+        return windows
+
+    def _pending_media(self):
+        """把已载入的断点中未完成的媒体任务放入 _resume_media，返回 (图片列表, 文件列表)"""
+        images = self.checkpoint.pending_media('images') if self.config.enable_images else []
+        files = self.checkpoint.pending_media('files') if self.config.enable_files else []
+        self._resume_media = [(self.image_q, img) for img in images] + \
+                             [(self.file_q, file) for file in files]
+        return images, files
+
+    def _report_finished(self):
+        # drain 停止时若所有分片恰好都已翻页完毕、媒体也已下载完，按正常完成处理
+        interrupted = self.is_stopped or (self.is_draining and not self.checkpoint.is_complete())
+        if (self._failed_windows or self._failed_media) and not interrupted:
+            self.checkpoint.save()
+            if self._failed_windows:
+                self.log('⚠️ {} 个分片因请求持续失败未完成，断点已保存，可使用 resume 继续'.format(self._failed_windows))
+            if self._failed_media:
+                self.log('⚠️ {} 个图片/文件下载失败，已保留在断点中，可使用 resume 重试'.format(self._failed_media))
+            self.on_finished(False, '部分{}未完成，共爬取 {} 条 topics, {} 张图片, {} 个文件'.format(
+                '分片' if self._failed_windows else '图片/文件', self._topic_count, self._image_count,
+                self._file_count))
+        elif interrupted:
+            self.checkpoint.save()
+            self.log('爬取已被用户停止，断点已保存，可使用 resume 继续')
+            self.on_finished(False, '已停止')
+        else:
+            self.checkpoint.remove()
+            if self._skipped_media:
+                self.log('跳过 {} 个此前已下载的图片/文件'.format(self._skipped_media))
+            self.log('所有任务已完成！共爬取 {} 条 topics'.format(self._topic_count))
+            self.on_finished(True, '完成！共爬取 {} 条 topics, {} 张图片, {} 个文件'.format(
+                self._topic_count, self._image_count, self._file_count))
+
+    def _wait_topics(self):
+        """等待所有分片翻页结束（topic_q 中的任务由 topics 线程自己续上）；立即停止时直接返回"""
+        q = self.topic_q
+        with q.all_tasks_done:
+            while q.unfinished_tasks and not self.is_stopped:
+                q.all_tasks_done.wait()
+
+    def stage_queues(self):
+        """各流水线阶段的输入队列，用于报告排队长度"""
+        queues = [('render', self.render_q), ('write', self.write_q)]
+        if self.config.enable_images:
+            queues.append(('images', self.image_q))
+        if self.config.enable_files:
+            queues.append(('files', self.file_q))
+            queues.append(('downloads', self.download_q))
+        return queues
+
+    def _report_queue_depths(self):
+        """通过 on_progress('queue:<阶段>', 长度) 报告有变化的队列长度"""
+        for name, q in self.stage_queues():
+            depth = q.qsize()
+            if self._queue_depths.get(name) != depth:
+                self._queue_depths[name] = depth
+                self.on_progress('queue:' + name, depth)
+
+    def _refresh_metrics(self):
+        """刷新需要在读取时计算的指标：队列长度与 topics 平均速率"""
+        for name, q in self.stage_queues():
+            self._queue_depth.set(q.qsize(), queue=name)
+        uptime = self.metrics.uptime()
+        self._topics_rate.set(round(self._topic_count / uptime, 3) if uptime > 0 else 0)
+
+    def _start_progress(self):
+        """分片确定后记录进度估算的起点（resume 时覆盖比例从断点处开始）"""
+        self._windows_ready = True
+        self.progress_snapshot()
+
+    def progress_snapshot(self):
+        """返回当前进度，供界面按固定频率轮询（不要在每个事件中调用）
+
+        包含 coverage（已覆盖的时间范围比例，无法估算时为 None）、topics / images / files 计数、
+        最近 RATE_WINDOW 秒的 topics_per_sec 与 mb_per_sec、各队列积压 queues、待下载媒体数
+        pending_media，以及预计剩余秒数 eta（无法估算时为 None）
+        """
+        now = time.monotonic()
+        covered = None
+        if self._windows_ready:
+            covered = coverage(self.checkpoint.windows(), self.config.start_time, self.config.end_time)
+        if covered is not None and self._coverage_start is None:
+            self._coverage_start = (now, covered)
+        rates = self._rate_meter.update({'topics': self._topic_count,
+                                         'bytes': self._downloaded_bytes.total(),
+                                         'media': self._image_count + self._file_count}, now)
+        pending = self.checkpoint.pending_count()
+        return {
+            'coverage': covered,
+            'topics': self._topic_count,
+            'images': self._image_count,
+            'files': self._file_count,
+            'topics_per_sec': rates['topics'],
+            'mb_per_sec': rates['bytes'] / 1024 / 1024,
+            'queues': {name: q.qsize() for name, q in self.stage_queues()},
+            'pending_media': pending,
+            'eta': self._estimate_eta(covered, pending, rates['media'], now),
+        }
+
+    def _estimate_eta(self, covered, pending, media_rate, now):
+        """翻页剩余时间按本次运行的覆盖进度线性外推，媒体按最近的下载速率估算，取两者较大者"""
+        if covered is None:
+            return None
+        if covered >= 1.0:
+            paginate = 0.0
+        else:
+            started, start_coverage = self._coverage_start
+            if covered <= start_coverage or now <= started:
+                return None
+            paginate = (now - started) * (1.0 - covered) / (covered - start_coverage)
+        if not pending:
+            return paginate
+        if media_rate <= 0:
+            return None
+        return max(paginate, pending / media_rate)
+
+    def metrics_snapshot(self):
+        """返回当前运行指标的快照（dict，可直接 JSON 序列化）"""
+        self._refresh_metrics()
+        return self.metrics.snapshot()
+
+    def _save_checkpoint_quietly(self):
+        try:
+            self.checkpoint.save()
+        except Exception as e:
+            self.log('❌ 保存断点失败: {}'.format(e))
+
     def run(self):
-        """在当前线程/新线程中运行爬取任务"""
+        """在当前线程/新线程中运行爬取任务；开启 profile 时同时进行性能剖析"""
         try:
-            self.log('===== 开始爬取 =====')
-            self.log('配置: group={}, start_time={}, end_time={}'.format(
-                self.config.group, self.config.start_time or '(无)', self.config.end_time or '(无)'))
-            self.log('配置: 图片={}, 文件={}'.format(
-                '开启' if self.config.enable_images else '关闭',
-                '开启' if self.config.enable_files else '关闭'))
-            self.ensure_dir(self.config.output_dir)
-            self.log('输出目录: {}'.format(os.path.abspath(self.config.output_dir)))
-
-            # 开启线程
-            threads = []
-
-            t = threading.Thread(target=self._topics_thread, daemon=True)
-            t.start()
-            threads.append(t)
-
-            if self.config.enable_images:
-                for _ in range(2):
-                    t = threading.Thread(target=self._images_thread, daemon=True)
-                    t.start()
-                    threads.append(t)
-
-            if self.config.enable_files:
-                t = threading.Thread(target=self._files_thread, daemon=True)
-                t.start()
-                threads.append(t)
-
-            # 设置初始 end_time
-            initial_end_time = None
-            if self.config.end_time:
-                initial_end_time = self.config.end_time.replace('.000+', '.001+')
-                self.log('使用结束时间作为 API 初始参数: {}'.format(initial_end_time))
-
-            self.topic_q.put(initial_end_time)
-
-            # 等待完成
-            self.topic_q.join()
-            if self.config.enable_images:
-                self.image_q.join()
-            if self.config.enable_files:
-                self.file_q.join()
+            if self.profiler is None:
+                self._run()
+                return
+            self.profiler.start()
+            try:
+                self.profiler.call('main', self._run)
+            finally:
+                self.profiler.finish(self.metrics_snapshot())
+        finally:
+            self.events.close()
+
+    def _stage_handler(self, method):
+        """阶段线程处理任务的函数"""
+        return getattr(self, method)
+
+    def _start_stages(self, topic_threads):
+        """开启线程：各阶段线程阻塞等待任务，上游结束后以哨兵通知退出"""
+        workers = self.workers
+        workers.add_stage('topics', '📡 Topics ', self.topic_q, self._stage_handler('_topics_job'), topic_threads)
+        self._start_serial_stages()
+        if self.config.enable_images:
+            workers.add_stage('images', '🖼️ 图片下载', self.image_q, self._stage_handler('fetch_images'),
+                              self.image_limiter.maximum)
+        if self.config.enable_files:
+            workers.add_stage('files', '📁 文件下载', self.download_q, self._stage_handler('fetch_files'),
+                              self.file_limiter.maximum)
+
+    def _start_serial_stages(self, suffix=''):
+        """渲染、写入与下载链接解析各一个线程，保证同一分片的页按顺序写入、断点游标按顺序前进
+
+        suffix 附加在阶段名与日志标签后，多星球模式下区分各星球的线程
+        """
+        workers = self.workers
+        workers.add_stage('render' + suffix, '🧩 渲染' + suffix, self.render_q, self._stage_handler('_render_stage'), 1)
+        workers.add_stage('write' + suffix, '💾 写入' + suffix, self.write_q, self._stage_handler('_write_stage'), 1)
+        if self.config.enable_files:
+            workers.add_stage('resolve' + suffix, '🔗 下载链接解析' + suffix, self.file_q,
+                              self._stage_handler('_resolve_stage'), 1)
+
+    def _enqueue_start(self, windows):
+        """投递各分片的第一页与断点中未完成的媒体任务"""
+        for window_end, window_start in windows:
+            self.topic_q.put((window_end, window_start))
+        for q, info in self._resume_media:
+            if not self._put_until_stopped(q, info):
+                break
 
-            if self.is_stopped:
-                self.log('爬取已被用户停止')
-                self.on_finished(False, '已停止')
-            else:
-                self.log('所有任务已完成！共爬取 {} 条 topics'.format(self._topic_count))
-                self.on_finished(True, '完成！共爬取 {} 条 topics, {} 张图片, {} 个文件'.format(
-                    self._topic_count, self._image_count, self._file_count))
+    def _join_stages(self):
+        """按流水线顺序关闭各阶段：上游线程全部退出后，下游队列中已不会有新任务"""
+        workers = self.workers
+        self._wait_topics()
+        workers.close_and_join('topics')
+        self._join_serial_stages(('render', 'write'))
+        workers.close('images')
+        self._join_serial_stages(('resolve',))
+        workers.close_and_join('files')
+        workers.join('images')
+
+    def _join_serial_stages(self, names):
+        for name in names:
+            self.workers.close_and_join(name)
+
+    def _run(self):
+        try:
+            self._log_start()
+            self._open_stores()
+
+            windows = self._prepare_windows()
+            self._start_stages(len(windows))
+            self._enqueue_start(windows)
+            self._join_stages()
+
+            self._report_queue_depths()
+            self._report_finished()
 
         except Exception as e:
-            self.log('❌ 爬取出错: {}'.format(e))
-            self.log(traceback.format_exc())
+            self.events.error('❌ 爬取出错: {error}', error=e, exc_info=True)
+            self._save_checkpoint_quietly()
+            self.workers.abort()
             self.on_finished(False, str(e))
+        finally:
+            self._close_stores()
+            self.session.close()
+
+
+def split_time_range(start_time, end_time, n):
+    """将 [start_time, end_time] 按天对齐拆分为最多 n 段，返回从新到旧的内部分界点
+
+    分界点都落在某天 00:00:00.000，保证同一天的 topics 只属于一个分片，
+    各分片按顺序写入自己负责的日文件，合并后仍与串行翻页的顺序一致
+    """
+    suffix = start_time[23:]
+    first_day = datetime.strptime(start_time[:10], '%Y-%m-%d')
+    last_day = datetime.strptime(end_time[:10], '%Y-%m-%d')
+    days = (last_day - first_day).days + 1
+    n = max(1, min(n, days))
+    boundaries = []
+    for i in range(n - 1, 0, -1):
+        day = first_day + timedelta(days=days * i // n)
+        boundaries.append('{}T00:00:00.000{}'.format(day.strftime('%Y-%m-%d'), suffix))
+    return boundaries
+
+
+def create_scraper(config: ScraperConfig, **kwargs):
+    """根据 config.engine 创建对应的爬取器，回调参数与 Scraper 相同；config.groups 有多个星球时创建多星球爬取器"""
+    if len(config.groups) > 1:
+        from multi_group import MultiGroupScraper
+        return MultiGroupScraper(config, **kwargs)
+    if config.groups:
+        config = replace(config, group=parse_group(config.groups[0])[0], groups=[])
+    if config.engine == 'async':
+        from async_scraper import AsyncScraper
+        return AsyncScraper(config, **kwargs)
+    if config.engine != 'thread':
+        raise ValueError('不支持的爬取引擎: {}'.format(config.engine))
+    return Scraper(config, **kwargs)
+
+
+def parse_group(spec):
+    """解析 '星球ID' 或 '星球ID:权重'，返回 (星球ID, 权重)"""
+    group, _, weight = str(spec).strip().partition(':')
+    weight = weight or '1'
+    if not group or not weight.isdigit() or int(weight) < 1:
+        raise ValueError('星球格式应为 星球ID 或 星球ID:正整数权重: {}'.format(spec))
+    return group, int(weight)
 
 
 def parse_time_arg(time_str):
@@ -0,0 +1,232 @@
+"""
+SQLite 存储后端
+把 topics、作者、提问/回答与图片/文件引用写入 output_dir/topics.db（重复写入即更新），
+并为正文建立 FTS5 全文索引，供 main.py search 检索。
+中文没有空格分词，FTS5 使用 trigram 分词器（SQLite 3.34+）按子串匹配；
+trigram 索引不了少于三个字的关键词，另建 topics_bigram 索引正文的单字与相邻两字，
+一两个字的关键词（最常见的中文检索）先经它筛出候选，再用 LIKE 核对原文，不扫描全表
+"""
+import os
+import sqlite3
+import threading
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS topics (
+    topic_id INTEGER PRIMARY KEY,
+    type TEXT NOT NULL,
+    create_time TEXT NOT NULL,
+    day TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS topics_create_time ON topics (create_time);
+CREATE TABLE IF NOT EXISTS authors (
+    user_id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS posts (
+    topic_id INTEGER NOT NULL,
+    role TEXT NOT NULL,
+    author_id INTEGER,
+    author_name TEXT NOT NULL,
+    text TEXT NOT NULL,
+    PRIMARY KEY (topic_id, role)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS media (
+    kind TEXT NOT NULL,
+    media_id INTEGER NOT NULL,
+    topic_id INTEGER NOT NULL,
+    role TEXT NOT NULL,
+    name TEXT NOT NULL,
+    path TEXT NOT NULL,
+    PRIMARY KEY (kind, media_id)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS media_topic ON media (topic_id);
+'''
+
+# 全文索引的 rowid 即 topic_id，三列分别对应 talk / question / answer 正文
+FTS_SCHEMA = 'CREATE VIRTUAL TABLE IF NOT EXISTS topics_fts USING fts5(talk, question, answer{})'
+FTS_COLUMNS = ('talk', 'question', 'answer')
+# trigram 分词器能索引的最短关键词长度
+MIN_MATCH_LENGTH = 3
+# 单字与相邻两字的索引，只存词元不存内容（content=''），rowid 即 topic_id
+BIGRAM_SCHEMA = "CREATE VIRTUAL TABLE topics_bigram USING fts5(grams, content='')"
+
+
+def text_grams(*texts):
+    """把正文拆成单字与相邻两字的词元（空格分隔），供 topics_bigram 索引一两个字的关键词"""
+    grams = []
+    for text in texts:
+        for run in text.split():
+            grams.extend(run)
+            grams.extend(run[i:i + 2] for i in range(len(run) - 1))
+    return ' '.join(grams)
+
+
+def fts_phrase(term):
+    return '"{}"'.format(term.replace('"', '""'))
+
+
+def topic_posts(topic):
+    """拆出 topic 中的各段正文，返回 [(role, 内容 dict)]"""
+    if topic.get('type') == 'q&a':
+        return [(role, topic[role]) for role in ('question', 'answer') if role in topic]
+    if 'talk' in topic:
+        return [('talk', topic['talk'])]
+    return []
+
+
+class SqliteStore:
+    """线程安全的 SQLite 写入器，每页 topics 在一个事务中写入"""
+
+    FILENAME = 'topics.db'
+
+    def __init__(self, output_dir):
+        self.path = os.path.join(output_dir, self.FILENAME)
+        self._lock = threading.Lock()
+        self._conn = None
+        self.trigram = False
+
+    def open(self):
+        """打开数据库并建表，返回已有的 topic 数"""
+        with self._lock:
+            self._conn = sqlite3.connect(self.path, check_same_thread=False)
+            self._conn.execute('PRAGMA journal_mode=WAL')
+            self._conn.execute('PRAGMA synchronous=NORMAL')
+            self._conn.executescript(SCHEMA)
+            try:
+                self._conn.execute(FTS_SCHEMA.format(", tokenize='trigram'"))
+            except sqlite3.OperationalError:
+                # 旧版 SQLite 不支持 trigram，退回默认分词器（中文只能整句匹配）
+                self._conn.execute(FTS_SCHEMA.format(''))
+            sql = self._conn.execute("SELECT sql FROM sqlite_master WHERE name = 'topics_fts'").fetchone()[0]
+            self.trigram = 'trigram' in sql
+            if self._conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'topics_bigram'").fetchone() is None:
+                # 新建或由旧版本创建的数据库：按已有正文补建单字/两字索引
+                self._conn.execute(BIGRAM_SCHEMA)
+                rows = self._conn.execute('SELECT rowid, talk, question, answer FROM topics_fts')
+                self._conn.executemany('INSERT INTO topics_bigram (rowid, grams) VALUES (?, ?)',
+                                       ((row[0], text_grams(*row[1:])) for row in rows))
+            self._conn.commit()
+            return self._conn.execute('SELECT COUNT(*) FROM topics').fetchone()[0]
+
+    def upsert_topics(self, topics):
+        """写入或更新一页 topics 及其作者、正文、媒体引用和全文索引"""
+        with self._lock, self._conn:
+            for topic in topics:
+                self._upsert_topic(topic)
+
+    def _upsert_topic(self, topic):
+        topic_id = int(topic['topic_id'])
+        create_time = topic.get('create_time', '')
+        conn = self._conn
+        conn.execute('INSERT OR REPLACE INTO topics (topic_id, type, create_time, day) VALUES (?, ?, ?, ?)',
+                     (topic_id, topic.get('type', ''), create_time, create_time[:10] or 'unknown'))
+        conn.execute('DELETE FROM posts WHERE topic_id = ?', (topic_id,))
+        conn.execute('DELETE FROM media WHERE topic_id = ?', (topic_id,))
+
+        texts = dict.fromkeys(FTS_COLUMNS, '')
+        for role, post in topic_posts(topic):
+            owner = post.get('owner', {})
+            author_id = owner.get('user_id')
+            author_name = owner.get('name', '未知')
+            if author_id is not None:
+                conn.execute('INSERT OR REPLACE INTO authors (user_id, name) VALUES (?, ?)',
+                             (author_id, author_name))
+            text = post.get('text', '')
+            texts[role] = text
+            conn.execute('INSERT INTO posts (topic_id, role, author_id, author_name, text) VALUES (?, ?, ?, ?, ?)',
+                         (topic_id, role, author_id, author_name, text))
+            for img in post.get('images', []):
+                img_type = img.get('type', 'jpg')
+                conn.execute('INSERT OR REPLACE INTO media (kind, media_id, topic_id, role, name, path) '
+                             'VALUES (?, ?, ?, ?, ?, ?)',
+                             ('image', img['image_id'], topic_id, role, '',
+                              'images/{}.{}'.format(img['image_id'], img_type)))
+            for f in post.get('files', []):
+                name = f.get('name', 'unknown')
+                conn.execute('INSERT OR REPLACE INTO media (kind, media_id, topic_id, role, name, path) '
+                             'VALUES (?, ?, ?, ?, ?, ?)',
+                             ('file', f['file_id'], topic_id, role, name,
+                              'files/{}_{}'.format(f['file_id'], name)))
+
+        # 不存内容的 topics_bigram 删除时需要提供原来的词元
+        old = conn.execute('SELECT talk, question, answer FROM topics_fts WHERE rowid = ?', (topic_id,)).fetchone()
+        if old is not None:
+            conn.execute("INSERT INTO topics_bigram (topics_bigram, rowid, grams) VALUES ('delete', ?, ?)",
+                         (topic_id, text_grams(*old)))
+        conn.execute('DELETE FROM topics_fts WHERE rowid = ?', (topic_id,))
+        conn.execute('INSERT INTO topics_fts (rowid, talk, question, answer) VALUES (?, ?, ?, ?)',
+                     (topic_id, texts['talk'], texts['question'], texts['answer']))
+        conn.execute('INSERT INTO topics_bigram (rowid, grams) VALUES (?, ?)',
+                     (topic_id, text_grams(*(texts[c] for c in FTS_COLUMNS))))
+
+    def search(self, query, limit=20, start_time=None, end_time=None):
+        """按关键词（空格分隔，需全部命中）检索，返回 dict 列表，有 trigram 关键词时按相关度排序，否则按时间倒序
+
+        每条结果包含 topic_id、create_time、day、author、snippet
+        """
+        sql, params = self.search_sql(query, limit, start_time, end_time)
+        if sql is None:
+            return []
+        with self._lock:
+            rows = self._conn.execute(sql, params).fetchall()
+        return [{'topic_id': row[0], 'create_time': row[1], 'day': row[2], 'author': row[3] or '未知',
+                 'snippet': ' '.join(row[4].split())} for row in rows]
+
+    def search_sql(self, query, limit=20, start_time=None, end_time=None):
+        """生成检索用的 (SQL, 参数)，没有关键词时返回 (None, None)
+
+        三个字及以上的关键词走 trigram 索引；一两个字的走 topics_bigram 筛出候选再用 LIKE 核对原文；
+        都没有索引可用时（旧版 SQLite 不支持 trigram 的长关键词）才用 LIKE 扫描
+        """
+        terms = query.split()
+        if not terms:
+            return None, None
+        long_terms = [term for term in terms if self.trigram and len(term) >= MIN_MATCH_LENGTH]
+        # 只含标点的关键词分不出词元，只能 LIKE 扫描
+        short_terms = [term for term in terms
+                       if len(term) < MIN_MATCH_LENGTH and any(c.isalnum() for c in term)]
+        like_terms = [term for term in terms if term not in long_terms]
+        where = []
+        params = []
+        if long_terms:
+            where.append('topics_fts MATCH ?')
+            params.append(' '.join(fts_phrase(term) for term in long_terms))
+            order = 'bm25(topics_fts)'
+            snippet = "snippet(topics_fts, -1, '【', '】', '…', 16)"
+        else:
+            order = 't.create_time DESC'
+            snippet = "substr(topics_fts.talk || topics_fts.question || topics_fts.answer, 1, 64)"
+        if short_terms:
+            where.append('topics_fts.rowid IN (SELECT rowid FROM topics_bigram WHERE topics_bigram MATCH ?)')
+            params.append(' '.join(fts_phrase(term) for term in short_terms))
+        for term in like_terms:
+            pattern = '%{}%'.format(term.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_'))
+            where.append('(' + ' OR '.join("{} LIKE ? ESCAPE '\\'".format(c) for c in FTS_COLUMNS) + ')')
+            params.extend([pattern] * len(FTS_COLUMNS))
+        if start_time:
+            where.append('t.create_time >= ?')
+            params.append(start_time)
+        if end_time:
+            where.append('t.create_time <= ?')
+            params.append(end_time)
+        # 作者取 talk 或 question 的发布者（role 倒序时 talk > question > answer）
+        sql = ('SELECT t.topic_id, t.create_time, t.day, '
+               "(SELECT author_name FROM posts p WHERE p.topic_id = t.topic_id ORDER BY p.role DESC LIMIT 1), "
+               '{} FROM topics_fts JOIN topics t ON t.topic_id = topics_fts.rowid '
+               'WHERE {} ORDER BY {} LIMIT ?').format(snippet, ' AND '.join(where), order)
+        params.append(limit)
+        return sql, params
+
+    def explain(self, query, **kwargs):
+        """返回检索的 EXPLAIN QUERY PLAN 各行的说明，用于确认关键词走了哪个索引"""
+        sql, params = self.search_sql(query, **kwargs)
+        if sql is None:
+            return []
+        with self._lock:
+            return [row[-1] for row in self._conn.execute('EXPLAIN QUERY PLAN ' + sql, params)]
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
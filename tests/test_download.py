@@ -0,0 +1,97 @@
+"""
+媒体下载的断点续传
+.part 已完整或比服务器上的文件更大时服务器对 Range 请求返回 416，
+两种引擎都只在 Content-Range 的总长度（或预期大小）与 .part 一致时视为已完成，否则从头重新下载
+"""
+import asyncio
+import hashlib
+import os
+import shutil
+import tempfile
+import unittest
+
+from mock_server import MockConfig, MockServer
+from scraper import Scraper, ScraperConfig
+
+try:
+    import aiohttp
+    from async_scraper import AsyncScraper
+except ImportError:
+    aiohttp = None
+
+FILE_SIZE = 50000
+
+
+class DownloadResumeTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.server = MockServer(MockConfig(topics=1, file_size=FILE_SIZE))
+        cls.api_base = cls.server.start()
+        cls.url = '{}/blobs/files/1'.format(cls.api_base)
+        cls.content = cls.server.data.blob(FILE_SIZE)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.stop()
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp(prefix='zsxq-test-')
+        self.addCleanup(shutil.rmtree, self.tmp, True)
+        self.config = ScraperConfig(group='1', output_dir=self.tmp, api_base=self.api_base, max_attempts=2)
+        self.filepath = os.path.join(self.tmp, 'file.bin')
+
+    def write_part(self, data):
+        with open(Scraper.part_path(self.filepath), 'wb') as f:
+            f.write(data)
+
+    def thread_download(self):
+        scraper = Scraper(self.config, on_log=lambda msg: None)
+        try:
+            return scraper.download_to_file(self.url, self.filepath, timeout=10, resume=True)
+        finally:
+            scraper.session.close()
+
+    def async_download(self):
+        scraper = AsyncScraper(self.config, on_log=lambda msg: None)
+
+        async def download():
+            scraper._semaphore = asyncio.Semaphore(1)
+            async with aiohttp.ClientSession() as session:
+                scraper._aio_session = session
+                return await scraper._download(self.url, self.filepath, timeout=10, resume=True)
+        return asyncio.run(download())
+
+    def check(self, download, part):
+        self.write_part(part)
+        size, sha256 = download()
+        self.assertEqual(size, FILE_SIZE)
+        self.assertEqual(sha256, hashlib.sha256(self.content).hexdigest())
+        with open(self.filepath, 'rb') as f:
+            self.assertEqual(f.read(), self.content)
+        self.assertFalse(os.path.exists(Scraper.part_path(self.filepath)))
+
+    def test_complete_part_unknown_size(self):
+        self.check(self.thread_download, self.content)
+
+    def test_oversized_part_unknown_size(self):
+        self.check(self.thread_download, self.content + b'x' * 100)
+
+    def test_partial_part(self):
+        self.check(self.thread_download, self.content[:12345])
+
+    @unittest.skipIf(aiohttp is None, 'async 引擎需要安装 aiohttp')
+    def test_async_complete_part_unknown_size(self):
+        self.check(self.async_download, self.content)
+
+    @unittest.skipIf(aiohttp is None, 'async 引擎需要安装 aiohttp')
+    def test_async_oversized_part_unknown_size(self):
+        self.check(self.async_download, self.content + b'x' * 100)
+
+    @unittest.skipIf(aiohttp is None, 'async 引擎需要安装 aiohttp')
+    def test_async_partial_part(self):
+        self.check(self.async_download, self.content[:12345])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,122 @@
+"""
+多线程引擎与 async 引擎的对比测试
+启动本地 mock_server，用两种引擎爬取同一批 topics，比较生成的 markdown 与下载的媒体文件：
+
+    python -m unittest discover -s tests -t .
+"""
+import os
+import shutil
+import tempfile
+import unittest
+
+from mock_server import MockConfig, MockServer
+from scraper import ScraperConfig, create_scraper
+
+try:
+    import aiohttp
+except ImportError:
+    aiohttp = None
+
+
+def read_tree(root):
+    """返回 {相对路径: 文件内容}，跳过断点、索引等以 . 开头的内部文件"""
+    tree = {}
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames[:] = [d for d in dirnames if not d.startswith('.')]
+        for name in filenames:
+            if name.startswith('.'):
+                continue
+            path = os.path.join(dirpath, name)
+            with open(path, 'rb') as f:
+                tree[os.path.relpath(path, root)] = f.read()
+    return tree
+
+
+class EngineTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.server = MockServer(MockConfig(topics=120, images_per_topic=2, files_per_topic=1,
+                                           image_size=4096, file_size=20000))
+        cls.api_base = cls.server.start()
+        cls.start_time, cls.end_time = cls.server.data.time_range()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.stop()
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp(prefix='zsxq-test-')
+        self.addCleanup(shutil.rmtree, self.tmp, True)
+
+    def crawl(self, engine, **fields):
+        """用指定引擎爬取全部 topics，返回 (是否成功, 消息, 输出目录)"""
+        output_dir = os.path.join(self.tmp, engine)
+        config = ScraperConfig(group='1', start_time=self.start_time, end_time=self.end_time,
+                               enable_images=True, enable_files=True, output_dir=output_dir,
+                               api_base=self.api_base, engine=engine, **fields)
+        finished = {}
+        scraper = create_scraper(config, on_log=lambda msg: None,
+                                 on_finished=lambda success, msg: finished.update(success=success, msg=msg))
+        scraper.run()
+        return finished.get('success'), finished.get('msg'), output_dir
+
+    def assert_complete(self, tree):
+        topics = [path for path in tree if path.startswith('topics' + os.sep)]
+        self.assertTrue(topics)
+        self.assertEqual(sum(tree[path].count(b'\n## ') + tree[path].startswith(b'## ') for path in topics),
+                         120)
+        self.assertEqual(len([path for path in tree if path.startswith('images' + os.sep)]), 240)
+        files = [path for path in tree if path.startswith('files' + os.sep)]
+        self.assertEqual(len(files), 120)
+        self.assertTrue(all(len(tree[path]) == 20000 for path in files))
+
+    def test_thread_engine(self):
+        success, msg, output_dir = self.crawl('thread')
+        self.assertTrue(success, msg)
+        self.assert_complete(read_tree(output_dir))
+
+    @unittest.skipIf(aiohttp is None, 'async 引擎需要安装 aiohttp')
+    def test_async_matches_thread(self):
+        thread_ok, thread_msg, thread_dir = self.crawl('thread')
+        async_ok, async_msg, async_dir = self.crawl('async')
+        self.assertTrue(thread_ok, thread_msg)
+        self.assertTrue(async_ok, async_msg)
+        thread_tree, async_tree = read_tree(thread_dir), read_tree(async_dir)
+        self.assertEqual(sorted(thread_tree), sorted(async_tree))
+        for path in thread_tree:
+            self.assertEqual(thread_tree[path], async_tree[path], path)
+        self.assert_complete(async_tree)
+
+
+
+class ShardBoundaryTest(unittest.TestCase):
+    """create_time 恰好落在分片分界点（某天 00:00:00.000）上的 topic 只被抓取一次"""
+
+    def setUp(self):
+        self.server = MockServer(MockConfig(topics=120, images_per_topic=0))
+        data = self.server.data
+        for i, create_time in enumerate(data.create_times):
+            if create_time[11:19] == '00:00:00':
+                data.create_times[i] = create_time[:20] + '000' + create_time[23:]
+        self.api_base = self.server.start()
+        self.addCleanup(self.server.stop)
+        self.tmp = tempfile.mkdtemp(prefix='zsxq-test-')
+        self.addCleanup(shutil.rmtree, self.tmp, True)
+
+    def test_boundary_topic_fetched_once(self):
+        start_time, end_time = self.server.data.time_range()
+        logs = []
+        finished = {}
+        config = ScraperConfig(group='1', start_time=start_time, end_time=end_time, shards=3,
+                               output_dir=self.tmp, api_base=self.api_base)
+        scraper = create_scraper(config, on_log=logs.append,
+                                 on_finished=lambda success, msg: finished.update(success=success, msg=msg))
+        scraper.run()
+        self.assertTrue(finished.get('success'), finished.get('msg'))
+        self.assertEqual(scraper.progress_snapshot()['topics'], 120)
+        self.assertFalse([msg for msg in logs if '重复' in msg])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,91 @@
+"""
+媒体下载失败后的重试
+CDN 对所有图片/文件返回 404 时，爬取应报告未完成并保留断点；CDN 恢复后 resume 或重新运行都能补齐全部媒体
+"""
+import os
+import shutil
+import tempfile
+import unittest
+
+from checkpoint import Checkpoint
+from mock_server import MockConfig, MockHandler, MockServer
+from scraper import ScraperConfig, create_scraper
+
+try:
+    import aiohttp
+except ImportError:
+    aiohttp = None
+
+
+class MissingBlobHandler(MockHandler):
+    """topics 与下载链接接口正常，图片/文件内容一律返回 404"""
+
+    def _blob(self, kind):
+        self._send(404, b'')
+
+
+class MediaRetryTest(unittest.TestCase):
+
+    def setUp(self):
+        self.server = MockServer(MockConfig(topics=40, images_per_topic=1, files_per_topic=1,
+                                            image_size=2048, file_size=4096))
+        self.api_base = self.server.start()
+        self.addCleanup(self.server.stop)
+        self.tmp = tempfile.mkdtemp(prefix='zsxq-test-')
+        self.addCleanup(shutil.rmtree, self.tmp, True)
+
+    def crawl(self, output_dir, engine, resume=False):
+        start_time, end_time = self.server.data.time_range()
+        config = ScraperConfig(group='1', start_time=start_time, end_time=end_time, enable_images=True,
+                               enable_files=True, output_dir=output_dir, api_base=self.api_base,
+                               engine=engine, max_attempts=1, resume=resume)
+        finished = {}
+        scraper = create_scraper(config, on_log=lambda msg: None,
+                                 on_finished=lambda success, msg: finished.update(success=success, msg=msg))
+        scraper.run()
+        return finished.get('success'), finished.get('msg')
+
+    def media_count(self, output_dir):
+        return sum(len([name for name in os.listdir(os.path.join(output_dir, kind)) if not name.endswith('.part')])
+                   for kind in ('images', 'files') if os.path.isdir(os.path.join(output_dir, kind)))
+
+    def check_engine(self, engine):
+        output_dir = os.path.join(self.tmp, engine)
+        self.server.RequestHandlerClass = MissingBlobHandler
+        success, msg = self.crawl(output_dir, engine)
+        self.assertFalse(success, msg)
+        checkpoint = Checkpoint(output_dir)
+        self.assertTrue(checkpoint.load())
+        self.assertEqual(checkpoint.pending_count(), 80)
+
+        self.server.RequestHandlerClass = MockHandler
+        success, msg = self.crawl(output_dir, engine, resume=True)
+        self.assertTrue(success, msg)
+        self.assertFalse(checkpoint.exists())
+        self.assertEqual(self.media_count(output_dir), 80)
+
+    def test_thread_engine(self):
+        self.check_engine('thread')
+
+    def test_rerun_downloads_missing_media(self):
+        """不使用 resume 重新运行时，已在去重索引中的 topics 不再写入，但缺失的媒体会重新下载"""
+        output_dir = os.path.join(self.tmp, 'rerun')
+        self.server.RequestHandlerClass = MissingBlobHandler
+        self.assertFalse(self.crawl(output_dir, 'thread')[0])
+        with open(os.path.join(output_dir, 'topics', '2024-01-31.md'), 'rb') as f:
+            day_file = f.read()
+
+        self.server.RequestHandlerClass = MockHandler
+        success, msg = self.crawl(output_dir, 'thread')
+        self.assertTrue(success, msg)
+        self.assertEqual(self.media_count(output_dir), 80)
+        with open(os.path.join(output_dir, 'topics', '2024-01-31.md'), 'rb') as f:
+            self.assertEqual(f.read(), day_file)
+
+    @unittest.skipIf(aiohttp is None, 'async 引擎需要安装 aiohttp')
+    def test_async_engine(self):
+        self.check_engine('async')
+
+
+if __name__ == '__main__':
+    unittest.main()
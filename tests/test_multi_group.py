@@ -0,0 +1,50 @@
+"""
+多星球公平调度
+一个星球的媒体下载很慢、图片车道已排满时，其他星球的页仍应照常写入
+"""
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+
+from mock_server import MockConfig, MockServer
+from scraper import ScraperConfig, create_scraper
+from workers import STOP_ABORT
+
+
+class SlowMediaLaneTest(unittest.TestCase):
+
+    def setUp(self):
+        self.server = MockServer(MockConfig(topics=100, images_per_topic=1, image_size=1024, cdn_latency=0.5))
+        self.api_base = self.server.start()
+        self.addCleanup(self.server.stop)
+        self.tmp = tempfile.mkdtemp(prefix='zsxq-test-')
+        self.addCleanup(shutil.rmtree, self.tmp, True)
+
+    def test_small_group_not_blocked_by_slow_media(self):
+        start_time, end_time = self.server.data.time_range()
+        config = ScraperConfig(group='', groups=['big', 'small'], start_time=start_time, end_time=end_time,
+                               enable_images=True, image_workers=1, media_queue_size=1,
+                               output_dir=self.tmp, api_base=self.api_base)
+        # 只有 big 下载图片：每张 0.5 秒、车道只能排一张，写入阶段很快就会等待图片车道
+        scraper = create_scraper(config, on_log=lambda msg: None,
+                                 group_overrides={'small': {'enable_images': False}})
+        worker = threading.Thread(target=scraper.run, daemon=True)
+        worker.start()
+        try:
+            small = scraper.scrapers['small']
+            deadline = time.monotonic() + 10
+            while small.progress_snapshot()['topics'] < 100 and time.monotonic() < deadline:
+                time.sleep(0.05)
+            self.assertEqual(small.progress_snapshot()['topics'], 100)
+            self.assertTrue(worker.is_alive())
+            self.assertLess(scraper.scrapers['big'].progress_snapshot()['images'], 100)
+        finally:
+            scraper.stop(STOP_ABORT)
+            worker.join(10)
+        self.assertFalse(worker.is_alive())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,57 @@
+"""
+离线重新渲染
+从原始数据归档重新生成的日文件应与爬取时写入的完全一致，--since / --until 只选择日期、不截断日文件
+"""
+import os
+import shutil
+import tempfile
+import unittest
+
+from mock_server import MockConfig, MockServer
+from renderer import render_archive
+from scraper import ScraperConfig, create_scraper
+
+
+class RenderArchiveTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.tmp = tempfile.mkdtemp(prefix='zsxq-test-')
+        server = MockServer(MockConfig(topics=120, images_per_topic=0))
+        api_base = server.start()
+        try:
+            start_time, end_time = server.data.time_range()
+            config = ScraperConfig(group='1', start_time=start_time, end_time=end_time, archive_raw=True,
+                                   output_dir=cls.tmp, api_base=api_base)
+            create_scraper(config, on_log=lambda msg: None).run()
+        finally:
+            server.stop()
+        cls.crawled = cls.read_days()
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.tmp, True)
+
+    @classmethod
+    def read_days(cls):
+        topics_dir = os.path.join(cls.tmp, 'topics')
+        days = {}
+        for name in sorted(os.listdir(topics_dir)):
+            with open(os.path.join(topics_dir, name), 'rb') as f:
+                days[name] = f.read()
+        return days
+
+    def test_render_all(self):
+        days, topics = render_archive(self.tmp, workers=2)
+        self.assertEqual((days, topics), (3, 120))
+        self.assertEqual(self.read_days(), self.crawled)
+
+    def test_bounds_with_time_render_whole_days(self):
+        days, topics = render_archive(self.tmp, workers=1, start_time='2024-01-30T12:00:00.000+0800',
+                                      end_time='2024-01-30T18:00:00.000+0800')
+        self.assertEqual((days, topics), (1, 48))
+        self.assertEqual(self.read_days(), self.crawled)
+
+
+if __name__ == '__main__':
+    unittest.main()
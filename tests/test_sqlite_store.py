@@ -0,0 +1,74 @@
+"""
+SQLite 全文检索
+三个字及以上的关键词走 trigram 索引，一两个字的关键词走 topics_bigram 索引，都不扫描全表
+"""
+import shutil
+import sqlite3
+import tempfile
+import unittest
+
+from sqlite_store import SqliteStore
+
+TEXTS = ['我爱中文 hello world', '今天天气不错，中文', 'AI 改变世界', '股票 基金 投资']
+
+
+def topic(topic_id, text):
+    return {'topic_id': topic_id, 'type': 'talk', 'create_time': '2024-01-0{}T08:00:00.000+0800'.format(topic_id + 1),
+            'talk': {'owner': {'user_id': 1, 'name': '星主'}, 'text': text}}
+
+
+class SqliteSearchTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp(prefix='zsxq-test-')
+        self.addCleanup(shutil.rmtree, self.tmp, True)
+        self.store = SqliteStore(self.tmp)
+        self.store.open()
+        self.addCleanup(self.store.close)
+        self.store.upsert_topics([topic(i, text) for i, text in enumerate(TEXTS)])
+
+    def search(self, query):
+        return [row['topic_id'] for row in self.store.search(query)]
+
+    def assert_indexed(self, query):
+        plan = self.store.explain(query)
+        # topics_fts 只按 rowid 或 MATCH 访问，没有不带约束的全表扫描
+        self.assertNotIn('SCAN topics_fts VIRTUAL TABLE INDEX 0:', plan)
+        return plan
+
+    def test_two_character_term_uses_bigram_index(self):
+        self.assertEqual(self.search('中文'), [1, 0])
+        plan = self.assert_indexed('中文')
+        self.assertTrue(any('topics_bigram' in line and ':M' in line for line in plan), plan)
+
+    def test_single_character_and_mixed_terms(self):
+        self.assertEqual(self.search('中'), [1, 0])
+        self.assertEqual(self.search('ai'), [2])
+        self.assertEqual(self.search('世界 AI 改变世界'), [2])
+        self.assertEqual(self.search('中文 天气'), [1])
+        self.assert_indexed('中')
+        self.assert_indexed('世界 AI 改变世界')
+
+    def test_long_term_uses_trigram_index(self):
+        if not self.store.trigram:
+            self.skipTest('SQLite 不支持 trigram 分词器')
+        self.assertEqual(self.search('天气不错'), [1])
+        self.assertNotIn('topics_bigram', ' '.join(self.assert_indexed('天气不错')))
+
+    def test_update_replaces_bigrams(self):
+        self.store.upsert_topics([topic(3, '基金定投')])
+        self.assertEqual(self.search('股票'), [])
+        self.assertEqual(self.search('定投'), [3])
+
+    def test_backfill_existing_database(self):
+        self.store.close()
+        conn = sqlite3.connect(self.store.path)
+        conn.execute('DROP TABLE topics_bigram')
+        conn.commit()
+        conn.close()
+        self.store.open()
+        self.assertEqual(self.search('基金'), [3])
+
+
+if __name__ == '__main__':
+    unittest.main()
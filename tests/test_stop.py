@@ -0,0 +1,62 @@
+"""
+停止翻页（drain）
+topics 接口持续失败、正在退避重试时请求停止翻页，两种引擎都应不再重试，尽快结束并保留断点
+"""
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+
+from checkpoint import Checkpoint
+from mock_server import MockConfig, MockServer
+from scraper import ScraperConfig, create_scraper
+from workers import STOP_DRAIN
+
+try:
+    import aiohttp
+except ImportError:
+    aiohttp = None
+
+
+class DrainDuringRetryTest(unittest.TestCase):
+
+    def setUp(self):
+        self.server = MockServer(MockConfig(topics=10, images_per_topic=0, error_rate=1.0))
+        self.api_base = self.server.start()
+        self.addCleanup(self.server.stop)
+        self.tmp = tempfile.mkdtemp(prefix='zsxq-test-')
+        self.addCleanup(shutil.rmtree, self.tmp, True)
+
+    def check_engine(self, engine):
+        start_time, end_time = self.server.data.time_range()
+        config = ScraperConfig(group='1', start_time=start_time, end_time=end_time, output_dir=self.tmp,
+                               api_base=self.api_base, engine=engine, max_attempts=20)
+        logs = []
+        finished = {}
+        scraper = create_scraper(config, on_log=logs.append,
+                                 on_finished=lambda success, msg: finished.update(success=success, msg=msg))
+        worker = threading.Thread(target=scraper.run, daemon=True)
+        worker.start()
+        deadline = time.monotonic() + 10
+        while not scraper.metrics.counter('zsxq_retries_total').total() and time.monotonic() < deadline:
+            time.sleep(0.05)
+        requests = self.server.requests
+        scraper.stop(STOP_DRAIN)
+        worker.join(5)
+        self.assertFalse(worker.is_alive())
+        self.assertLessEqual(self.server.requests, requests + 1)
+        self.assertFalse(finished.get('success'))
+        self.assertFalse([msg for msg in logs if '放弃分片' in msg])
+        self.assertTrue(Checkpoint(self.tmp).exists())
+
+    def test_thread_engine(self):
+        self.check_engine('thread')
+
+    @unittest.skipIf(aiohttp is None, 'async 引擎需要安装 aiohttp')
+    def test_async_engine(self):
+        self.check_engine('async')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,80 @@
+"""
+watch 模式的轮询
+某张图片一直下载失败时，之后发布的 topics 仍应在下一轮被抓取，失败的图片随每轮翻页一起重试
+"""
+import os
+import re
+import shutil
+import tempfile
+import unittest
+
+from checkpoint import Checkpoint
+from mock_server import MockConfig, MockHandler, MockServer
+from scraper import ScraperConfig
+from watch import Watcher
+from watermark import Watermark
+
+# 最新一条 topic 的图片
+BROKEN_IMAGE = '/blobs/images/{}'.format(10000000 * 100)
+
+
+class BrokenImageHandler(MockHandler):
+    """只有 BROKEN_IMAGE 一直返回 404，其他请求正常"""
+
+    def _blob(self, kind):
+        if self.path == BROKEN_IMAGE:
+            self._send(404, b'')
+        else:
+            super()._blob(kind)
+
+
+class WatchTest(unittest.TestCase):
+
+    def setUp(self):
+        self.server = MockServer(MockConfig(topics=10, images_per_topic=1, image_size=512))
+        self.server.RequestHandlerClass = BrokenImageHandler
+        api_base = self.server.start()
+        self.addCleanup(self.server.stop)
+        self.tmp = tempfile.mkdtemp(prefix='zsxq-test-')
+        self.addCleanup(shutil.rmtree, self.tmp, True)
+        self.logs = []
+        start_time = self.server.data.time_range()[0]
+        config = ScraperConfig(group='1', start_time=start_time, enable_images=True, output_dir=self.tmp,
+                               api_base=api_base, max_attempts=1)
+        self.watcher = Watcher(config, on_log=self.logs.append)
+
+    def poll(self):
+        """运行一轮，返回日志中的新增 topics 数"""
+        self.watcher.poll()
+        match = re.search(r'新增 (\d+) 条 topics', self.logs[-1])
+        self.assertIsNotNone(match, self.logs[-1])
+        return int(match.group(1))
+
+    def assert_state(self, latest_index, images):
+        data = self.server.data
+        watermark = Watermark(self.tmp)
+        self.assertTrue(watermark.load('1'))
+        self.assertEqual(watermark.state['topic_id'], str(10000000 + latest_index))
+        self.assertEqual(watermark.create_time, data.create_times[0])
+        checkpoint = Checkpoint(self.tmp)
+        self.assertTrue(checkpoint.load())
+        self.assertEqual(list(checkpoint.state['images']), [str(10000000 * 100)])
+        self.assertEqual(checkpoint.state['cursors'], {})
+        names = [name for name in os.listdir(os.path.join(self.tmp, 'images')) if not name.endswith('.part')]
+        self.assertEqual(len(names), images)
+
+    def test_new_topics_after_media_failure(self):
+        self.assertEqual(self.poll(), 10)
+        self.assert_state(0, 9)
+
+        self.server.data.prepend(3)
+        self.assertEqual(self.poll(), 3)
+        self.assert_state(-3, 12)
+        self.assertTrue(any('重试上次未完成的 1 张图片' in msg for msg in self.logs))
+
+        self.assertEqual(self.poll(), 0)
+        self.assert_state(-3, 12)
+
+
+if __name__ == '__main__':
+    unittest.main()
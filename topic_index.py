@@ -0,0 +1,72 @@
+"""
+已保存 topic 的持久化去重索引
+以追加写入的文本文件保存在 output_dir 中，每行一条 "topic_id<TAB>日期"，
+启动时整体载入内存字典，查询为 O(1)
+"""
+import os
+import threading
+
+
+class TopicIndex:
+    """按 topic_id 记录已写入 Markdown 的 topics，跨多次运行有效"""
+
+    FILENAME = '.topic_index'
+
+    def __init__(self, output_dir):
+        self.path = os.path.join(output_dir, self.FILENAME)
+        self._lock = threading.Lock()
+        self._days = {}  # topic_id -> 所在日文件的日期
+        self._file = None
+
+    def load(self):
+        """载入索引并打开追加句柄，返回已记录的 topic 数"""
+        with self._lock:
+            self._days = {}
+            if os.path.exists(self.path):
+                with open(self.path, 'r', encoding='utf-8') as f:
+                    for line in f:
+                        topic_id, _, day = line.rstrip('\n').partition('\t')
+                        if topic_id:
+                            self._days[topic_id] = day
+            self._file = open(self.path, 'a', encoding='utf-8')
+            return len(self._days)
+
+    def __contains__(self, topic_id):
+        return str(topic_id) in self._days
+
+    def __len__(self):
+        return len(self._days)
+
+    def add(self, topic_id, day):
+        with self._lock:
+            topic_id = str(topic_id)
+            if topic_id in self._days:
+                return
+            self._days[topic_id] = day
+            if self._file is not None:
+                self._file.write('{}\t{}\n'.format(topic_id, day))
+                self._file.flush()
+
+    def forget_day(self, day):
+        """日文件被覆盖时移除该日的全部记录，并重写索引文件"""
+        with self._lock:
+            removed = [topic_id for topic_id, d in self._days.items() if d == day]
+            if not removed:
+                return 0
+            for topic_id in removed:
+                del self._days[topic_id]
+            if self._file is not None:
+                self._file.close()
+            tmp_path = self.path + '.tmp'
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                for topic_id, d in self._days.items():
+                    f.write('{}\t{}\n'.format(topic_id, d))
+            os.replace(tmp_path, self.path)
+            self._file = open(self.path, 'a', encoding='utf-8')
+            return len(removed)
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
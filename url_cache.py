@@ -0,0 +1,35 @@
+"""
+文件签名下载链接缓存
+download_url 接口返回的链接带有时效签名，缓存一段时间供下载阶段直接使用，过期后需重新获取
+"""
+import threading
+import time
+
+
+class SignedUrlCache:
+    """线程安全的 file_id -> 下载链接 TTL 缓存"""
+
+    def __init__(self, ttl):
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._urls = {}  # file_id -> (url, 获取时间)
+
+    def get(self, file_id):
+        """返回未过期的链接，过期或不存在时返回 None"""
+        with self._lock:
+            item = self._urls.get(str(file_id))
+            if item is None:
+                return None
+            url, fetched_at = item
+            if time.monotonic() - fetched_at >= self.ttl:
+                del self._urls[str(file_id)]
+                return None
+            return url
+
+    def put(self, file_id, url):
+        with self._lock:
+            self._urls[str(file_id)] = (url, time.monotonic())
+
+    def invalidate(self, file_id):
+        with self._lock:
+            self._urls.pop(str(file_id), None)
@@ -0,0 +1,122 @@
+"""
+watch 模式（main.py watch）
+常驻运行，每隔 interval 秒从最新一页开始翻页，到高水位（上一轮已完整抓取到的最新 topic）为止，
+新 topics 照常经过渲染、写入和媒体下载；通常每轮只需请求一页。
+高水位按星球保存在输出目录的 .watermark.json 中，首次运行时以 config.start_time 为起点；
+某一轮翻页未完成时高水位不前移，下一轮从断点中的翻页游标继续；
+翻页完成但部分图片/文件下载失败时高水位照常前移，失败的媒体留在断点中，随下一轮的翻页一起重试
+"""
+import logging
+import os
+import threading
+from dataclasses import replace
+
+from checkpoint import Checkpoint
+from scraper import create_scraper, parse_group
+from watermark import Watermark
+from workers import STOP_ABORT
+
+logger = logging.getLogger('scraper')
+
+
+class Watcher:
+    """按固定间隔轮询新 topics 的常驻爬取器；回调参数与 Scraper 相同，on_finished 在每轮结束时调用"""
+
+    def __init__(self, config, interval=300, **callbacks):
+        self.config = config
+        self.interval = max(1.0, interval)
+        self.callbacks = callbacks
+        self.on_log = callbacks.get('on_log') or logger.info
+        self.groups = [parse_group(spec)[0] for spec in config.groups] or [config.group]
+        self.multi = len(self.groups) > 1
+        self.watermarks = {group: Watermark(self.group_dir(group)) for group in self.groups}
+        self._stop_event = threading.Event()
+        self._scraper = None
+        self.polls = 0
+
+    def group_dir(self, group):
+        return os.path.join(self.config.output_dir, group) if self.multi else self.config.output_dir
+
+    def stop(self, mode=STOP_ABORT):
+        """不再开始新的一轮；drain 时等当前一轮处理完，abort 时立即停止当前一轮"""
+        self._stop_event.set()
+        self.on_log('正在停止 watch...')
+        scraper = self._scraper
+        if scraper is not None:
+            scraper.stop(mode)
+
+    def progress_snapshot(self):
+        """当前一轮的进度，两轮之间返回 None"""
+        scraper = self._scraper
+        return scraper.progress_snapshot() if scraper is not None else None
+
+    def run(self):
+        for group, watermark in self.watermarks.items():
+            if watermark.load(group):
+                self.on_log('星球 {} 的高水位: {} (topic_id={})'.format(
+                    group, watermark.create_time, watermark.state['topic_id']))
+            else:
+                self.on_log('星球 {} 没有高水位记录，从 {} 开始'.format(group, self.config.start_time or '(最早)'))
+        self.on_log('watch 已启动，每 {:.0f} 秒检查一次新 topics'.format(self.interval))
+        while not self._stop_event.is_set():
+            try:
+                self.poll()
+            except Exception as e:
+                # 常驻运行，单轮出错不退出，下一轮再试
+                self.on_log('❌ 第 {} 轮轮询出错: {}'.format(self.polls, e))
+            self._stop_event.wait(self.interval)
+        self.on_log('watch 已停止，共轮询 {} 次'.format(self.polls))
+
+    def _start_time(self, group):
+        return self.watermarks[group].create_time or self.config.start_time
+
+    def _has_unfinished_pages(self, group):
+        """断点中是否还有该星球未翻完的分片；只剩媒体任务时不从断点继续，以免跳过最新一页"""
+        checkpoint = Checkpoint(self.group_dir(group))
+        return checkpoint.load() and checkpoint.state['group'] == group and bool(checkpoint.state['cursors'])
+
+    def poll(self):
+        """运行一轮：各星球从最新一页翻到高水位为止，成功的星球前移高水位"""
+        self.polls += 1
+        results = {}
+        config = replace(self.config, end_time='', shards=1, resume=False, append_existing=True,
+                         retry_pending_media=True)
+        if self.multi:
+            overrides = {group: {'start_time': self._start_time(group),
+                                 'resume': self._has_unfinished_pages(group)}
+                         for group in self.groups}
+            scraper = create_scraper(config, group_overrides=overrides, **self.callbacks)
+            scrapers = scraper.scrapers
+        else:
+            group = self.groups[0]
+            config = replace(config, group=group, groups=[], start_time=self._start_time(group),
+                             resume=self._has_unfinished_pages(group))
+            on_finished = self.callbacks.get('on_finished')
+
+            def finished(success, msg):
+                results[group] = (success, msg)
+                if on_finished is not None:
+                    on_finished(success, msg)
+            scraper = create_scraper(config, **dict(self.callbacks, on_finished=finished))
+            scrapers = {group: scraper}
+
+        self._scraper = scraper
+        if self._stop_event.is_set():
+            self._scraper = None
+            return
+        try:
+            scraper.run()
+        finally:
+            self._scraper = None
+        if self.multi:
+            results = scraper.results
+
+        new_topics = 0
+        for group, group_scraper in scrapers.items():
+            new_topics += group_scraper.progress_snapshot()['topics'] - group_scraper.resumed_topics
+            # 翻页全部完成（没有失败或被停止的分片）即可前移高水位，失败的媒体在断点中等下一轮重试
+            paged = group in results and not group_scraper.checkpoint.windows()
+            latest = group_scraper.latest_topic
+            if paged and latest is not None and self.watermarks[group].advance(group, *latest):
+                self.on_log('星球 {} 的高水位前移到: {} (topic_id={})'.format(group, latest[0], latest[1]))
+        self.on_log('第 {} 轮轮询结束，新增 {} 条 topics'.format(self.polls, new_topics))
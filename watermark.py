@@ -0,0 +1,63 @@
+"""
+watch 模式的高水位记录
+在 output_dir 中持久化已完整抓取到的最新 topic（create_time 与 topic_id），
+下一轮轮询只需翻页到这一位置，更早的内容都已保存
+"""
+import json
+import os
+import threading
+import time
+
+
+class Watermark:
+    """线程安全的高水位文件，以原子替换的方式写入 JSON"""
+
+    FILENAME = '.watermark.json'
+
+    def __init__(self, output_dir):
+        self.path = os.path.join(output_dir, self.FILENAME)
+        self._lock = threading.Lock()
+        self.state = self._empty_state()
+
+    @staticmethod
+    def _empty_state():
+        return {
+            'group': '',
+            'create_time': '',  # 为空表示还没有完成过一轮轮询
+            'topic_id': '',
+            'updated': '',
+        }
+
+    @property
+    def create_time(self):
+        with self._lock:
+            return self.state['create_time']
+
+    def load(self, group):
+        """读取高水位文件，文件不存在、损坏或属于其他星球时返回 False"""
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                state = json.load(f)
+        except (OSError, ValueError):
+            return False
+        if state.get('group') != group:
+            return False
+        with self._lock:
+            self.state = self._empty_state()
+            self.state.update(state)
+        return True
+
+    def advance(self, group, create_time, topic_id):
+        """前移到更新的 topic 并写入文件；不比当前高水位新时不变，返回是否前移"""
+        with self._lock:
+            if self.state['group'] == group and create_time <= self.state['create_time']:
+                return False
+            self.state.update(group=group, create_time=create_time, topic_id=str(topic_id),
+                              updated=time.strftime('%Y-%m-%d %H:%M:%S'))
+            data = json.dumps(self.state, ensure_ascii=False)
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            tmp_path = self.path + '.tmp'
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                f.write(data)
+            os.replace(tmp_path, self.path)
+        return True
@@ -0,0 +1,308 @@
+"""
+工作线程生命周期
+WorkerManager 按流水线阶段管理线程：空闲线程阻塞在 queue.get() 上，不做定时轮询；
+上游结束后向队列投递哨兵，线程处理完排在前面的任务后退出（drain），
+立即停止时清空队列再投递哨兵（abort）。
+FairQueue 供多个星球共用一组工作线程：每个星球一条车道，按权重轮转出队。
+CancellableAdapter 记录连接池创建的 socket，停止时将其 shutdown，正在阻塞的请求会立即出错返回
+"""
+import queue
+import socket
+import threading
+import weakref
+from collections import deque
+
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+
+# 投递到任务队列中、通知工作线程退出的哨兵
+SENTINEL = object()
+
+# 停止方式：drain 停止翻页但处理完已排队的页和媒体；abort 丢弃排队任务并中断进行中的请求
+STOP_DRAIN = 'drain'
+STOP_ABORT = 'abort'
+STOP_MODES = (STOP_DRAIN, STOP_ABORT)
+
+
+class _Stage:
+    def __init__(self, name, label, q, handler):
+        self.name = name
+        self.label = label
+        self.q = q
+        self.handler = handler
+        self.threads = []
+        self.signalled = 0  # 已投递（或已预留）的哨兵数
+
+
+class WorkerManager:
+    """按阶段启动工作线程，并用哨兵有序关闭"""
+
+    def __init__(self, events, should_skip=None, after_job=None, profiler=None):
+        self.events = events  # events.EventLogger
+        # 返回 True 时工作线程直接丢弃取到的任务（abort 之后仍可能有少量任务进入队列）
+        self.should_skip = should_skip or (lambda: False)
+        # 每处理完一个任务后调用（用于报告队列长度）
+        self.after_job = after_job or (lambda: None)
+        # 性能剖析模式下，各线程在 profiler 中按阶段名记录 cProfile 数据
+        self.profiler = profiler
+        self._lock = threading.Lock()
+        self._stages = {}
+
+    def add_stage(self, name, label, q, handler, count):
+        """启动 count 个线程处理 q 中的任务，label 用于日志"""
+        stage = _Stage(name, label, q, handler)
+        self._stages[name] = stage
+        target = self._worker if self.profiler is None else self.profiler.wrap(name, self._worker)
+        for _ in range(max(1, count)):
+            t = threading.Thread(target=target, args=(stage,), daemon=True)
+            t.start()
+            stage.threads.append(t)
+        return stage
+
+    def _worker(self, stage):
+        self.events.debug('{stage}线程已启动', stage=stage.label)
+        while True:
+            job = stage.q.get()
+            try:
+                if job is SENTINEL:
+                    break
+                if not self.should_skip():
+                    stage.handler(job)
+            except Exception as e:
+                self.events.error('❌ {stage}线程异常: {error}', stage=stage.label, error=e, exc_info=True)
+            finally:
+                stage.q.task_done()
+            self.after_job()
+        self.events.debug('{stage}线程已结束', stage=stage.label)
+
+    def close(self, name):
+        """在队尾为该阶段每个线程投递一个哨兵，排在前面的任务仍会被处理"""
+        stage = self._stages.get(name)
+        if stage is None:
+            return
+        with self._lock:
+            count = len(stage.threads) - stage.signalled
+            stage.signalled += count
+        # 队列满时阻塞到工作线程腾出位置，不持有锁以免阻塞 abort
+        for _ in range(count):
+            stage.q.put(SENTINEL)
+
+    def join(self, name):
+        stage = self._stages.get(name)
+        if stage is not None:
+            for t in stage.threads:
+                t.join()
+
+    def close_and_join(self, name):
+        self.close(name)
+        self.join(name)
+
+    def abort(self):
+        """丢弃所有阶段中排队的任务并通知全部线程退出"""
+        for stage in list(self._stages.values()):
+            discard(stage.q)
+            self.close(stage.name)
+
+
+def discard(q):
+    """清空队列中的任务，被丢弃的任务视为已完成，返回丢弃数
+
+    已投递的哨兵保留：主线程按流水线顺序 close 时可能先于 abort 投递了哨兵，丢掉会让线程永远等待
+    """
+    with q.mutex:
+        sentinels = [item for item in q.queue if item is SENTINEL]
+        count = len(q.queue) - len(sentinels)
+        q.queue.clear()
+        for item in sentinels:
+            q.queue.append(item)
+        q.unfinished_tasks -= count
+        if q.unfinished_tasks <= 0:
+            q.all_tasks_done.notify_all()
+        q.not_full.notify_all()
+    return count
+
+
+class _Lanes:
+    """FairQueue 的底层存储，元素为 (车道, 任务)；哨兵单独存放，所有车道为空后才取出"""
+
+    def __init__(self):
+        self.lanes = {}  # 车道 -> deque
+        self.weights = {}
+        self.current = {}  # 平滑加权轮转的当前值
+        self.sentinels = deque()
+        self.size = 0
+
+    def __len__(self):
+        return self.size + len(self.sentinels)
+
+    def __iter__(self):
+        for lane in self.lanes.values():
+            yield from lane
+        yield from self.sentinels
+
+    def lane_size(self, key):
+        lane = self.lanes.get(key)
+        return len(lane) if lane else 0
+
+    def append(self, item):
+        if item is SENTINEL:
+            self.sentinels.append(item)
+            return
+        self.lanes.setdefault(item[0], deque()).append(item)
+        self.size += 1
+
+    def popleft(self):
+        """平滑加权轮转：非空车道的当前值各加上权重，取最大者出队并减去权重总和"""
+        best = None
+        total = 0
+        for key, lane in self.lanes.items():
+            if not lane:
+                continue
+            weight = self.weights.get(key, 1)
+            total += weight
+            self.current[key] = self.current.get(key, 0) + weight
+            if best is None or self.current[key] > self.current[best]:
+                best = key
+        if best is None:
+            return self.sentinels.popleft()
+        self.current[best] -= total
+        self.size -= 1
+        return self.lanes[best].popleft()
+
+    def clear(self):
+        for lane in self.lanes.values():
+            lane.clear()
+        self.sentinels.clear()
+        self.size = 0
+
+
+class FairQueue(queue.Queue):
+    """按车道加权轮转出队的队列，元素为 (车道, 任务)，每条车道单独限长
+
+    车道内先进先出；一条车道积压再多，其他车道的任务也能按权重比例及时出队。
+    可直接用作 WorkerManager 的阶段队列，discard() 同样适用
+    """
+
+    def __init__(self, lane_maxsize=0):
+        self.lane_maxsize = lane_maxsize
+        super().__init__()
+
+    def _init(self, maxsize):
+        self.queue = _Lanes()
+
+    def _qsize(self):
+        return len(self.queue)
+
+    def _put(self, item):
+        self.queue.append(item)
+
+    def _get(self):
+        item = self.queue.popleft()
+        # 等待的可能是另一条车道，全部唤醒后各自重新检查
+        self.not_full.notify_all()
+        return item
+
+    def set_weight(self, key, weight):
+        with self.mutex:
+            self.queue.weights[key] = max(1, weight)
+
+    def lane(self, key):
+        return Lane(self, key)
+
+    def lane_size(self, key):
+        with self.mutex:
+            return self.queue.lane_size(key)
+
+    def put(self, item, block=True, timeout=None):
+        """与 queue.Queue.put 相同，只是按 item 所属车道判断是否已满；哨兵不受限"""
+        with self.not_full:
+            if self.lane_maxsize > 0 and item is not SENTINEL:
+                def full():
+                    return self.queue.lane_size(item[0]) >= self.lane_maxsize
+                if not block:
+                    if full():
+                        raise queue.Full
+                elif timeout is None:
+                    while full():
+                        self.not_full.wait()
+                elif timeout < 0:
+                    raise ValueError("'timeout' must be a non-negative number")
+                else:
+                    if not self.not_full.wait_for(lambda: not full(), timeout):
+                        raise queue.Full
+            self._put(item)
+            self.unfinished_tasks += 1
+            self.not_empty.notify()
+
+
+class Lane:
+    """FairQueue 中一条车道的视图，put / qsize 接口与 queue.Queue 相同"""
+
+    def __init__(self, fair_queue, key):
+        self.fair_queue = fair_queue
+        self.key = key
+
+    def put(self, item, block=True, timeout=None):
+        self.fair_queue.put((self.key, item), block, timeout)
+
+    def put_nowait(self, item):
+        self.put(item, block=False)
+
+    def qsize(self):
+        return self.fair_queue.lane_size(self.key)
+
+    @property
+    def all_tasks_done(self):
+        return self.fair_queue.all_tasks_done
+
+
+class CancellableAdapter(HTTPAdapter):
+    """记录连接池中所有 socket 的 HTTPAdapter，cancel_all() 可打断其他线程中阻塞的请求"""
+
+    def __init__(self, *args, **kwargs):
+        self._sockets = weakref.WeakSet()
+        self._sockets_lock = threading.Lock()
+        super().__init__(*args, **kwargs)
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        adapter = self
+
+        class TrackedHTTPConnection(HTTPConnection):
+            def connect(self):
+                super().connect()
+                adapter._track(self.sock)
+
+        class TrackedHTTPSConnection(HTTPSConnection):
+            def connect(self):
+                super().connect()
+                adapter._track(self.sock)
+
+        class TrackedHTTPConnectionPool(HTTPConnectionPool):
+            ConnectionCls = TrackedHTTPConnection
+
+        class TrackedHTTPSConnectionPool(HTTPSConnectionPool):
+            ConnectionCls = TrackedHTTPSConnection
+
+        self.poolmanager.pool_classes_by_scheme = {
+            'http': TrackedHTTPConnectionPool,
+            'https': TrackedHTTPSConnectionPool,
+        }
+
+    def _track(self, sock):
+        if sock is not None:
+            with self._sockets_lock:
+                self._sockets.add(sock)
+
+    def cancel_all(self):
+        """shutdown 所有已建立的连接，返回处理的 socket 数"""
+        with self._sockets_lock:
+            sockets = list(self._sockets)
+            self._sockets = weakref.WeakSet()
+        for sock in sockets:
+            try:
+                sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass  # 已关闭
+        return len(sockets)